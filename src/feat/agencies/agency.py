@@ -41,12 +41,14 @@ from feat import applications
 
 from feat.common import log, defer, fiber, serialization, journal, time
 from feat.common import manhole, text_helper, container, first, error, enum
+from feat.common import reflect
 
 # Internal to register serialization adapters
 from feat.common.serialization import adapters
 
 # Internal imports for agency
 from feat.agencies import contracts, requests, tasks, notifications
+from feat.agencies import periodic
 
 # Import interfaces
 from interface import (AgencyRoles, IAgencyAgentInternal,
@@ -91,6 +93,8 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
         self.journal_keeper = self
         self.agency = IAgency(agency)
         self._descriptor = descriptor
+        # Index of the partners of the descriptor, rebuilt when replaced
+        self._partners_index = None
         # Our instance id. It is used to tell the difference between the
         # journal entries comming from different agencies running the same
         # agent. Our value will be stored in descriptor before calling anything
@@ -291,6 +295,16 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
     def get_descriptor(self):
         return copy.deepcopy(self._descriptor)
 
+    @replay.named_side_effect('AgencyAgent.find_descriptor_partners')
+    def find_descriptor_partners(self, key):
+        index = self._get_partners_index()
+        return copy.deepcopy(index.find(key))
+
+    @replay.named_side_effect('AgencyAgent.query_descriptor_partners')
+    def query_descriptor_partners(self, factory, role=None, with_role=False):
+        index = self._get_partners_index()
+        return copy.deepcopy(index.query(factory, role, with_role))
+
     @manhole.expose()
     @replay.named_side_effect('AgencyAgent.get_configuration')
     def get_configuration(self):
@@ -389,10 +403,10 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
         done = medium.notify_finish()
         done.addErrback(Failure.trap, ProtocolFailed)
 
-        # if IAgencyProtocolInternal.providedBy(medium):
-        #     self.register_protocol(medium)
-        #     # self.journal_protocol_created(factory, medium, args, kwargs)
-        #     done.addBoth(defer.drop_param, self.unregister_protocol, medium)
+        if IAgencyProtocolInternal.providedBy(medium):
+            self.register_protocol(medium)
+            # self.journal_protocol_created(factory, medium, args, kwargs)
+            done.addBoth(defer.drop_param, self.unregister_protocol, medium)
 
         if ILongRunningProtocol.providedBy(medium):
             # This interface is implemented by the simpler protocols
@@ -407,6 +421,10 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
     def save_document(self, document):
         return self._database.save_document(document)
 
+    @serialization.freeze_tag('AgencyAgency.save_documents')
+    def save_documents(self, documents):
+        return self._database.save_documents(documents)
+
     @serialization.freeze_tag('AgencyAgency.get_document')
     def get_document(self, document_id):
         return self._database.get_document(document_id)
@@ -479,11 +497,34 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
         d.addCallback(self._call, *args, **kwargs)
         d.addBoth(defer.bridge_param, self.cancel_delayed_call,
                   call_id)
-        call = time.callLater(time_left, d.callback, method)
+        if time_left > 0:
+            # delayed calls of the agents and of their tasks and retrying
+            # protocols are mostly timeouts cancelled before they fire
+            call = time.call_timeout(time_left, d.callback, method)
+        else:
+            call = time.call_next(d.callback, method)
 
         self._store_delayed_call(call_id, call, busy)
         return call_id
 
+    @replay.named_side_effect('AgencyAgent.schedule_periodic')
+    def schedule_periodic(self, period, method, name=None, jitter=0,
+                          aligned=True, busy=False):
+        call_id = str(uuid.uuid1())
+
+        def run():
+            # the failures are left to the scheduler which logs and counts them
+            d = self._call_unhandled(method)
+            d.addBoth(defer.bridge_param, self.cancel_delayed_call, call_id)
+            return d
+
+        name = name or reflect.canonical_name(method)
+        call = self.agency._periodic.call_later(period, run, name=name,
+                                                jitter=jitter,
+                                                aligned=aligned)
+        self._store_delayed_call(call_id, call, busy)
+        return call_id
+
     @replay.named_side_effect('AgencyAgent.cancel_delayed_call')
     def cancel_delayed_call(self, call_id):
         try:
@@ -524,6 +565,10 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
 
     ### IJournalKeeper Methods ###
 
+    @property
+    def journaling(self):
+        return self.agency.journaling
+
     def register(self, recorder):
         self.agency.register(recorder)
 
@@ -726,6 +771,14 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
                       self._call, self.agent.on_agent_configuration_change)
         return d
 
+    def _get_partners_index(self):
+        # The descriptor is replaced on every update and reload
+        index = self._partners_index
+        if index is None or index.descriptor is not self._descriptor:
+            index = PartnersIndex(self._descriptor)
+            self._partners_index = index
+        return index
+
     def _reload_descriptor(self):
 
         def setter(value):
@@ -949,6 +1002,13 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
         self._delayed_calls.clear()
 
     def _call(self, method, *args, **kwargs):
+        d = self._call_unhandled(method, *args, **kwargs)
+        d.addErrback(defer.inject_param, 1, error.handle_failure, self,
+                     'Failure calling method %r, with args: %r, kwargs: %r',
+                     method, args, kwargs)
+        return d
+
+    def _call_unhandled(self, method, *args, **kwargs):
 
         def raise_on_fiber(res):
             if isinstance(res, fiber.Fiber):
@@ -960,12 +1020,38 @@ class AgencyAgent(log.LogProxy, log.Logger, manhole.Manhole,
                  args, kwargs)
         d = defer.maybeDeferred(method, *args, **kwargs)
         d.addCallback(raise_on_fiber)
-        d.addErrback(defer.inject_param, 1, error.handle_failure, self,
-                     'Failure calling method %r, with args: %r, kwargs: %r',
-                     method, args, kwargs)
         return d
 
 
+class PartnersIndex(object):
+    """
+    Index of the partners stored in a descriptor, by the key of their
+    recipient and by their class and role. The results of the queries are
+    cached, the index is only valid as long as the descriptor is not changed.
+    """
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self._partners = list(descriptor.partners)
+        self._by_key = dict() # recipient key -> [partner]
+        self._by_class = dict() # (factory, role, with_role) -> [partner]
+        for partner in self._partners:
+            key = partner.recipient.key
+            self._by_key.setdefault(key, []).append(partner)
+
+    def find(self, key):
+        return self._by_key.get(key, [])
+
+    def query(self, factory, role=None, with_role=False):
+        cache_key = (factory, role, with_role)
+        match = self._by_class.get(cache_key)
+        if match is None:
+            match = [x for x in self._partners if isinstance(x, factory)
+                     and (not with_role or x.role == role)]
+            self._by_class[cache_key] = match
+        return match
+
+
 class ShutdownStage(enum.Enum):
 
     initiated, slaves, agents, internals, process = range(5)
@@ -1060,6 +1146,10 @@ class Agency(log.LogProxy, log.Logger, manhole.Manhole,
 
     start_host_agent = False
 
+    # If False the agents calls are not journaled, their recorded methods
+    # do not have to look up the side-effects boundaries in the frames.
+    journaling = True
+
     def __init__(self):
         log.LogProxy.__init__(self, log.get_default() or log.FluLogKeeper())
         log.Logger.__init__(self, self)
@@ -1110,6 +1200,9 @@ class Agency(log.LogProxy, log.Logger, manhole.Manhole,
         # static agents, list of tuples (initial_descriptor, kwargs, name)
         self.static_agents = list()
 
+        # periodic jobs of the agents sharing the ticks
+        self._periodic = periodic.PeriodicScheduler(self)
+
     ### Public Methods ###
 
     def initiate(self, database=None, journaler=None, *backends):
@@ -1354,6 +1447,24 @@ class Agency(log.LogProxy, log.Logger, manhole.Manhole,
                          a._get_machine_state().name)
                         for a in self._agents)
 
+    @manhole.expose()
+    def get_periodic_stats(self):
+        '''Get the statistics of the periodic jobs of the agents.'''
+        return self._periodic.get_stats()
+
+    @manhole.expose()
+    def list_periodic(self):
+        '''List the statistics of the periodic jobs of the agents.'''
+        t = text_helper.Table(fields=("Name", "Period", "Runs", "Overruns",
+                                      "Failures", "Mean", "Max"),
+                              lengths=(50, 10, 8, 10, 10, 10, 10))
+
+        stats = self._periodic.get_stats()
+        return t.render((name, "%.1f" % s["period"], s["runs"],
+                         s["overruns"], s["failures"], "%.3f" % s["mean"],
+                         "%.3f" % s["max"])
+                        for name, s in sorted(stats.iteritems()))
+
     @manhole.expose()
     def get_nth_agent(self, n):
         '''Get the agent by his index in the list.'''
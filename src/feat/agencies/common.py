@@ -283,7 +283,7 @@ class AgencyMiddleBase(log.LogProxy, log.Logger, StateMachineMixin):
     def set_timeout(self, expiration_time, state, callback, *args, **kwargs):
         self.cancel_timeout()
         eta = max([0, time.left(expiration_time)])
-        self._timeout_call = time.call_later(
+        self._timeout_call = time.call_timeout(
             eta, self._timeout_target, state, callback, args, kwargs)
 
     @replay.side_effect
@@ -66,17 +66,19 @@ class EntriesCache(object):
     def append(self, entry):
         self._cache.append(entry)
 
-    def fetch(self):
+    def fetch(self, limit=None):
         '''
-        Gives all the data it has stored, and remembers what it has given.
-        Later we need to call commit() to actually remove the data from the
-        cache.
+        Gives all the data it has stored, or at most limit entries,
+        and remembers what it has given. Later we need to call commit()
+        to actually remove the data from the cache.
         '''
         if self._fetched is not None:
             raise RuntimeError('fetch() was called but the previous one has '
                                'not yet been applied. Not supported')
         if self._cache:
             self._fetched = len(self._cache)
+            if limit is not None:
+                self._fetched = min(limit, self._fetched)
         return self._cache[0:self._fetched]
 
     def commit(self):
@@ -496,13 +498,26 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
 
     implements(IJournalWriter, IJournalReader)
 
+    # Maximum number of entries inserted in a single transaction
+    flush_size = 1000
+    # Seconds to wait for more entries before writing them, if 0
+    # the entries are written as soon as possible
+    flush_interval = 0
+
+    insert_entry_sql = ("INSERT INTO entries "
+                        "VALUES (null, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    insert_log_sql = "INSERT INTO logs VALUES (null, ?, ?, ?, ?, ?, ?, ?)"
+
     def __init__(self, logger, filename=":memory:", encoding=None,
-                 hostname=None):
+                 hostname=None, flush_size=None, flush_interval=None):
         '''
         @param encoding: Optional encoding to be used for blob fields.
         @type encoding: Should be a valid parameter for str.encode() method.
         @param filename: File to use for entries. Defaults to :memory:
         @param logger: ILogger to use
+        @param flush_size: Maximum number of entries written per transaction.
+        @param flush_interval: Seconds to wait for more entries before
+                               writing them; 0 to write them right away.
         '''
         log.Logger.__init__(self, logger)
         log.LogProxy.__init__(self, logger)
@@ -518,6 +533,12 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
         # .perform_instert() method
         self._semaphore = defer.DeferredSemaphore(1)
 
+        self._flush_size = flush_size or type(self).flush_size
+        if flush_interval is None:
+            flush_interval = type(self).flush_interval
+        self._flush_interval = flush_interval
+        self._flush_call = None
+
         self._sighup_installed = False
 
         self._journaler = None
@@ -526,6 +547,7 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
         self.debug("Initiating sqlite journal writer.")
         self._db = adbapi.ConnectionPool('sqlite3', self._filename,
                                          cp_min=1, cp_max=1, cp_noisy=True,
+                                         cp_openfun=self._setup_connection,
                                          check_same_thread=False,
                                          timeout=10)
         self._install_sighup()
@@ -536,6 +558,7 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
         if self._cmp_state(State.disconnected):
             self.debug("Writer is already disconnected.")
             return d
+        self._cancel_delayed_flush()
         if flush:
             self.debug("Flusing SQL writer before closign")
             d.addCallback(defer.drop_param, self._flush_next)
@@ -747,7 +770,13 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
     def insert_entries(self, entries):
         for data in entries:
             self._cache.append(data)
-        return self._flush_next()
+        if not self._flush_interval or len(self._cache) >= self._flush_size:
+            self._cancel_delayed_flush()
+            return self._flush_next()
+        if self._flush_call is None:
+            self._flush_call = time.call_later(self._flush_interval,
+                                               self._delayed_flush)
+        return self._notifier.wait('flushed')
 
     def is_idle(self):
         if len(self._cache) > 0:
@@ -756,6 +785,23 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
 
     ### Private ###
 
+    def _setup_connection(self, connection):
+        # Writing ahead let readers work while we are writing and only
+        # syncing at checkpoints is safe with WAL, only the last
+        # transactions may be lost on power failure.
+        # For in-memory databases the journal mode stays "memory".
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+    def _delayed_flush(self):
+        self._flush_call = None
+        self._flush_next()
+
+    def _cancel_delayed_flush(self):
+        if self._flush_call is not None:
+            self._flush_call.cancel()
+            self._flush_call = None
+
     def _add_timestamp_condition_sql(self, query, start_date, end_date):
         if start_date is not None:
             query += "  AND logs.timestamp >= %d\n" % (int(start_date), )
@@ -771,8 +817,10 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
         self.debug("Received SIGHUP, reopening the journal.")
         if self._journaler:
             time.call_next(self._journaler.on_rotate)
-        self.close()
-        self.initiate()
+        # The write-ahead log of the previous file has to be checkpointed
+        # and removed before opening a new file with the same name
+        d = self.close()
+        d.addCallback(defer.drop_param, self.initiate)
 
     def _install_sighup(self):
         if self._sighup_installed:
@@ -988,41 +1036,41 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
 
     def _perform_inserts(self, cache):
 
-        def do_insert_entry(connection, history_id, data):
-            command = text_helper.format_block("""
-            INSERT INTO entries VALUES (null, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """)
-            connection.execute(
-                command, (history_id,
-                          data['journal_id'], data['function_id'],
-                          data['fiber_id'], data['fiber_depth'],
-                          data['args'], data['kwargs'],
-                          data['side_effects'], data['result'],
-                          int(data['timestamp'])))
-
-        def do_insert_log(connection, data):
-            command = text_helper.format_block("""
-            INSERT INTO logs VALUES (null, ?, ?, ?, ?, ?, ?, ?)
-            """)
-            connection.execute(
-                command, (data['message'], int(data['level']),
-                          data['category'], data['log_name'],
-                          data['file_path'], data['line_num'],
-                          int(data['timestamp'])))
+        def entry_row(connection, data):
+            history_id = self._get_history_id(
+                connection, data['agent_id'], data['instance_id'])
+            return (history_id,
+                    data['journal_id'], data['function_id'],
+                    data['fiber_id'], data['fiber_depth'],
+                    data['args'], data['kwargs'],
+                    data['side_effects'], data['result'],
+                    int(data['timestamp']))
+
+        def log_row(data):
+            return (data['message'], int(data['level']),
+                    data['category'], data['log_name'],
+                    data['file_path'], data['line_num'],
+                    int(data['timestamp']))
 
         def transaction(connection, cache):
-            entries = cache.fetch()
+            entries = cache.fetch(self._flush_size)
             if not entries:
                 return
             try:
-                entries = map(self._encode, entries)
+                entry_rows = []
+                log_rows = []
                 for data in entries:
+                    data = self._encode(data)
                     if data['entry_type'] == 'journal':
-                        history_id = self._get_history_id(
-                            connection, data['agent_id'], data['instance_id'])
-                        do_insert_entry(connection, history_id, data)
+                        entry_rows.append(entry_row(connection, data))
                     elif data['entry_type'] == 'log':
-                        do_insert_log(connection, data)
+                        log_rows.append(log_row(data))
+                # The statements are kept prepared by the connection
+                # statement cache, executemany() binds all the rows at once
+                if entry_rows:
+                    connection.executemany(self.insert_entry_sql, entry_rows)
+                if log_rows:
+                    connection.executemany(self.insert_log_sql, log_rows)
                 cache.commit()
             except Exception:
                 cache.rollback()
@@ -1063,6 +1111,7 @@ class SqliteWriter(log.Logger, log.LogProxy, common.StateMachineMixin):
     @in_state(State.connected)
     def _flush_next(self):
         if len(self._cache) == 0:
+            self._notifier.callback('flushed', None)
             return defer.succeed(None)
         else:
             d = self._semaphore.run(self._perform_inserts, self._cache)
@@ -25,6 +25,7 @@
 
 import copy
 import operator
+import types
 
 from zope.interface import implements
 
@@ -33,6 +34,10 @@ from feat.common import serialization, formatable
 from feat.agencies.interface import *
 
 
+# values of the fields which don't have to be copied by BaseMessage.clone()
+IMMUTABLE_TYPES = (types.NoneType, str, unicode, int, long, float, bool)
+
+
 class FirstMessageMixin(formatable.Formatable):
 
     implements(IFirstMessage)
@@ -56,13 +61,33 @@ class BaseMessage(formatable.Formatable):
     def clone(self):
         """Returns an exact copy of the message.
         KNOW WAT YOU ARE DOING, some special fields
-        SHOULD NOT be the same in different messages."""
-        return copy.deepcopy(self)
+        SHOULD NOT be the same in different messages.
+
+        The copy is lazy. The mutable values of the fields are moved to
+        the dictionary shared by the message and its copies, and each of
+        them gets its own deep copy of the value the first time it is
+        accessed. Setting the field doesn't copy anything."""
+        shared = self.__dict__.get('_shared')
+        own = self.__dict__
+        for field in self._fields:
+            name = field.name
+            if name in own and not isinstance(own[name], IMMUTABLE_TYPES):
+                if shared is self.__dict__.get('_shared'):
+                    # never modify the dictionary which is already shared
+                    shared = dict(shared or ())
+                shared[name] = own.pop(name)
+        if shared is not None:
+            own['_shared'] = shared
+
+        cls = type(self)
+        msg = cls.__new__(cls)
+        msg.__dict__.update(own)
+        return msg
 
     def duplicate(self):
         """Returns a duplicate of the message safe to modify
         and use for another message."""
-        msg = self.clone()
+        msg = copy.deepcopy(self)
         msg.message_id = None
         return msg
 
@@ -84,9 +109,51 @@ class BaseMessage(formatable.Formatable):
     def __repr__(self):
         d = dict()
         for field in self._fields:
-            d[field.name] = getattr(self, field.name)
+            d[field.name] = self._get_raw(field.name)
         return "<%r, %r>" % (type(self), d)
 
+    def __getattr__(self, name):
+        # called only for the attributes missing from the __dict__,
+        # these are the fields still shared with the other copies
+        shared = self.__dict__.get('_shared')
+        if shared is None or name not in shared:
+            raise AttributeError(name)
+        value = copy.deepcopy(shared[name])
+        self.__dict__[name] = value
+        return value
+
+    def __deepcopy__(self, memo):
+        cls = type(self)
+        msg = cls.__new__(cls)
+        memo[id(self)] = msg
+        shared = self.__dict__.get('_shared', ())
+        for name in shared:
+            if name not in self.__dict__:
+                msg.__dict__[name] = copy.deepcopy(shared[name], memo)
+        for name, value in self.__dict__.iteritems():
+            if name != '_shared':
+                msg.__dict__[name] = copy.deepcopy(value, memo)
+        return msg
+
+    ### ISerializable ###
+
+    def snapshot(self):
+        # serializing doesn't modify the values, there is no need to
+        # copy the shared ones
+        res = dict()
+        for field in self._fields:
+            value = self._get_raw(field.name)
+            if value is not None:
+                res[field.serialize_as] = value
+        return res
+
+    ### private ###
+
+    def _get_raw(self, name):
+        if name in self.__dict__:
+            return self.__dict__[name]
+        return self.__dict__['_shared'][name]
+
 
 @serialization.register
 class DialogMessage(BaseMessage):
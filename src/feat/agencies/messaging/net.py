@@ -169,7 +169,7 @@ class RabbitMQ(ConnectionManager, log.Logger, log.LogProxy):
     log_category = "net-rabbitmq"
 
     def __init__(self, host, port, user='guest', password='guest',
-                 timeout=5):
+                 timeout=5, publish_batch_size=1, publish_batch_delay=0):
         ConnectionManager.__init__(self)
         log.LogProxy.__init__(self, log.get_default() or log.FluLogKeeper())
         log.Logger.__init__(self, self)
@@ -179,6 +179,11 @@ class RabbitMQ(ConnectionManager, log.Logger, log.LogProxy):
         self._host = host
         self._port = port
         self._timeout_connecting = timeout
+        # Messages are committed in batches of this size, or after the
+        # delay if there is not enough of them. Size 1 means that each
+        # message is committed on its own.
+        self._publish_batch_size = publish_batch_size
+        self._publish_batch_delay = publish_batch_delay
 
         self._factory = AMQFactory(self, TwistedDelegate(),
                                    self._user, self._password,
@@ -217,7 +222,9 @@ class RabbitMQ(ConnectionManager, log.Logger, log.LogProxy):
 
     def new_channel(self, agent, queue_name=None):
         d = self._factory.get_client()
-        channel_wrapped = Channel(self, d, self._factory)
+        channel_wrapped = Channel(self, d, self._factory,
+                                  self._publish_batch_size,
+                                  self._publish_batch_delay)
 
         return Connection(channel_wrapped, agent, queue_name)
 
@@ -272,7 +279,8 @@ class Channel(log.Logger, log.LogProxy, StateMachineMixin):
 
     channel_type = "default"
 
-    def __init__(self, messaging, client_defer, factory):
+    def __init__(self, messaging, client_defer, factory,
+                 publish_batch_size=1, publish_batch_delay=0):
         StateMachineMixin.__init__(self, ChannelState.recording)
         log.Logger.__init__(self, messaging)
         log.LogProxy.__init__(self, messaging)
@@ -297,7 +305,15 @@ class Channel(log.Logger, log.LogProxy, StateMachineMixin):
         # the binding only when there is no more agents using it
         self._bindings_count = dict()
 
-        self.serializer = banana.Serializer()
+        # Messages published in the current transaction which wait for
+        # the commit, list of (key, shard, message, Deferred)
+        self._batch = list()
+        self._batch_call = None
+        self._publish_batch_size = publish_batch_size
+        self._publish_batch_delay = publish_batch_delay
+
+        # Messages are trees, try without the reference bookkeeping
+        self.serializer = banana.Serializer(tree_mode=True)
         self.unserializer = banana.Unserializer()
 
         client_defer.addCallback(self._setup_with_client)
@@ -339,6 +355,15 @@ class Channel(log.Logger, log.LogProxy, StateMachineMixin):
         else:
             return self._publish(key, shard, message)
 
+    def flush(self):
+        '''
+        Commits the messages published in the current transaction without
+        waiting for the batch to fill up.
+        '''
+        if self._cmp_state(ChannelState.performing):
+            return self._commit_batch()
+        return defer.succeed(None)
+
     def disconnect(self):
         return self._call_on_channel(self._disconnect,
                                      only_when_connected=True)
@@ -417,10 +442,67 @@ class Channel(log.Logger, log.LogProxy, StateMachineMixin):
 
         d = self.channel.basic_publish(exchange=shard, content=content,
                                        routing_key=key, immediate=False)
-        d.addCallback(defer.drop_param, self.channel.tx_commit)
-        d.addCallback(defer.override_result, message)
+        if self._publish_batch_size <= 1:
+            d.addCallback(defer.drop_param, self.channel.tx_commit)
+            d.addCallback(defer.override_result, message)
+            return d
+
+        # The message is not visible to the broker until the transaction
+        # is committed, the commit is shared by the whole batch.
+        entry = (key, shard, message, defer.Deferred())
+        self._batch.append(entry)
+        d.addErrback(self._publish_failed, entry)
+        if len(self._batch) >= self._publish_batch_size:
+            self._commit_batch()
+        elif self._batch_call is None:
+            self._batch_call = time.call_later(self._publish_batch_delay,
+                                               self._commit_batch)
+        return entry[3]
+
+    def _commit_batch(self):
+        self._cancel_batch_call()
+        batch, self._batch = self._batch, list()
+        if not batch:
+            return defer.succeed(None)
+        self.log('Committing batch of %d messages.', len(batch))
+        d = self.channel.tx_commit()
+        d.addCallbacks(self._batch_committed, self._batch_failed,
+                       callbackArgs=(batch, ), errbackArgs=(batch, ))
         return d
 
+    def _batch_committed(self, _, batch):
+        for _key, _shard, message, d in batch:
+            d.callback(message)
+
+    def _batch_failed(self, fail, batch):
+        self.log('Committing the batch of %d messages failed: %s',
+                 len(batch), error.get_failure_message(fail))
+        for _key, _shard, _message, d in batch:
+            d.errback(fail)
+
+    def _publish_failed(self, fail, entry):
+        if entry in self._batch:
+            self._batch.remove(entry)
+            entry[3].errback(fail)
+
+    def _cancel_batch_call(self):
+        if self._batch_call is not None:
+            if self._batch_call.active():
+                self._batch_call.cancel()
+            self._batch_call = None
+
+    def _requeue_batch(self):
+        # The transaction which was not committed is lost together with
+        # the connection, the messages are sent again after reconnecting.
+        self._cancel_batch_call()
+        batch, self._batch = self._batch, list()
+        for key, shard, message, d in batch:
+            if message.expiration_time is None:
+                d.callback(None)
+                continue
+            self._to_send.add((key, shard, message, d),
+                              message.expiration_time)
+
     def _disconnect(self):
         # Both methods needs to be called. Closes channel locally the other
         # one sends channel close. Yes, it is very bizzare.
@@ -590,6 +672,7 @@ class Channel(log.Logger, log.LogProxy, StateMachineMixin):
     def _on_connection_lost(self):
         self.info("Connection lost")
         self._set_state(ChannelState.recording)
+        self._requeue_batch()
 
         self.client = None
         self.channel = None
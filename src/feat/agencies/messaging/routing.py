@@ -1,4 +1,4 @@
-import operator
+import bisect
 
 from zope.interface import implements
 
@@ -31,10 +31,7 @@ class Route(object):
         return Route(**new_params)
 
     def match(self, message):
-        if not isinstance(message, BaseMessage):
-            raise AttributeError("Expected BaseMessage got %r" % (message, ))
-        msg_key = (message.recipient.key, message.recipient.route)
-        return msg_key == self.key
+        return message_key(message) == self.key
 
     def __repr__(self):
         return ("<Route: key=%s, priority=%d, final=%r, sink=%s>" %
@@ -62,7 +59,10 @@ class Table(log.Logger):
     def __init__(self, logger, time_provider=None):
         log.Logger.__init__(self, logger)
 
-        self._routes = list()
+        # (key, shard) -> list of routes ordered by priority, the lists
+        # are replaced instead of being modified, so that dispatch() can
+        # iterate over them without making a copy
+        self._index = dict()
         self._outgoing_sink = None
 
         self._time_provider = time_provider and ITimeProvider(time_provider)
@@ -97,33 +97,40 @@ class Table(log.Logger):
         for message in to_deliver:
                 self._send_to_route(message, route)
 
-        self._routes.append(route)
-        self._fix_order()
+        # the route goes after the routes of the same priority
+        bucket = list(self._index.get(route.key, ()))
+        priorities = [x.priority for x in bucket]
+        bucket.insert(bisect.bisect_right(priorities, route.priority), route)
+        self._index[route.key] = bucket
 
     def remove_route(self, route):
+        bucket = list(self._index.get(route.key, ()))
         try:
-            self._routes.remove(route)
+            bucket.remove(route)
         except ValueError:
             self.warning("Trying to remove nonexisting route: %r", route)
+            return
+        if bucket:
+            self._index[route.key] = bucket
+        else:
+            del self._index[route.key]
 
     def remove_sink(self, sink):
-        for route in self._routes:
-            if route.owner == sink:
-                self.remove_route(route)
+        routes = [route for bucket in self._index.values()
+                  for route in bucket if route.owner == sink]
+        for route in routes:
+            self.remove_route(route)
 
         if self._outgoing_sink == sink:
             self.info("Outgoing sink removed, setting to None.")
             self._outgoing_sink = None
 
     def dispatch(self, message, outgoing=True):
-
-        for route in self._routes:
-            self.log("Analizing route %r, matching=%r", route,
-                     route.match(message))
-            if route.match(message):
-                self._send_to_route(message, route)
-                if route.final:
-                    return
+        for route in self._index.get(message_key(message), ()):
+            self.log("Analizing route %r, matching=True", route)
+            self._send_to_route(message, route)
+            if route.final:
+                return
 
         self._message_store.insert(message)
 
@@ -134,10 +141,6 @@ class Table(log.Logger):
 
     ### private ###
 
-    def _fix_order(self):
-        self._routes = sorted(self._routes,
-                              key=operator.attrgetter('priority'))
-
     def _send_to_route(self, message, route):
         message = message.clone()
         route.owner.on_message(message)
@@ -146,11 +149,16 @@ class Table(log.Logger):
 class MessageStore(object):
     """
     I'm a class responsible for holding the message until they expiration
-    time and match them to correct routes.
+    time and match them to correct routes. The messages are kept in the
+    separate expiration dictionaries per (key, shard) of their recipient.
     """
 
     def __init__(self, time_provider):
-        self._store = container.ExpDict(time_provider)
+        self._time_provider = time_provider
+        # (key, shard) -> ExpDict of message_id -> message
+        self._store = dict()
+        # number of the keys after the last removal of the empty buckets
+        self._swept_size = 0
 
     def insert(self, message):
         if not isinstance(message, BaseMessage):
@@ -158,20 +166,55 @@ class MessageStore(object):
 
         # ignore messages without expiration time (would leak)
         if message.expiration_time is not None:
-            self._store.set(message.message_id, message,
-                            message.expiration_time)
+            key = message_key(message)
+            bucket = self._store.get(key)
+            if bucket is None:
+                self._sweep()
+                bucket = container.ExpDict(self._time_provider)
+                self._store[key] = bucket
+            bucket.set(message.message_id, message,
+                       message.expiration_time)
 
     def remove(self, message):
         if not isinstance(message, BaseMessage):
             raise TypeError('Expected BaseMessage got %r' % (message, ))
 
-        self._store.pop(message.message_id, None)
+        key = message_key(message)
+        bucket = self._store.get(key)
+        if bucket is not None:
+            bucket.pop(message.message_id, None)
 
     def match_to_route(self, route):
         if not isinstance(route, Route):
             raise TypeError('Expected Route got %r' % (route, ))
 
-        matching = [x for x in self._store.itervalues() if route.match(x)]
+        bucket = self._store.get(route.key)
+        if bucket is None:
+            return []
+        matching = bucket.values()
         if route.final:
-            [self.remove(x) for x in matching]
+            del self._store[route.key]
         return matching
+
+    def __len__(self):
+        return sum(len(x) for x in self._store.itervalues())
+
+    ### private ###
+
+    def _sweep(self):
+        # The buckets of the keys which never get the route would stay
+        # forever after their messages expire. They are removed each time
+        # the number of keys doubles, which keeps the insert O(1).
+        if len(self._store) < max(2 * self._swept_size, 16):
+            return
+        for key, bucket in self._store.items():
+            bucket.pack()
+            if not bucket.size():
+                del self._store[key]
+        self._swept_size = len(self._store)
+
+
+def message_key(message):
+    if not isinstance(message, BaseMessage):
+        raise AttributeError("Expected BaseMessage got %r" % (message, ))
+    return (message.recipient.key, message.recipient.route)
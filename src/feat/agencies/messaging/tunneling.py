@@ -282,8 +282,9 @@ class EmuBackend(_BaseTunnelBackend):
     ### protected used by Bridge ###
 
     def _create_serializer(self, to_version):
+        # Messages are trees, try without the reference bookkeeping
         return pytree.Serializer(source_ver=self._version,
-                                 target_ver=to_version)
+                                 target_ver=to_version, tree_mode=True)
 
     def _create_unserializer(self, from_version):
         return pytree.Unserializer(source_ver=from_version,
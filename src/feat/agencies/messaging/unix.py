@@ -31,7 +31,8 @@ class Master(log.Logger, log.LogProxy, common.ConnectionManager,
         self._slaves = dict()
 
         # We do banana over banana ...
-        self._serializer = banana.Serializer()
+        # Messages are trees, try without the reference bookkeeping
+        self._serializer = banana.Serializer(tree_mode=True)
         self._unserializer = banana.Unserializer()
 
     ### IBackend ###
@@ -193,7 +194,8 @@ class Slave(log.Logger, log.LogProxy, common.ConnectionManager,
         self._master = None
 
         # We do banana over banana ...
-        self._serializer = banana.Serializer()
+        # Messages are trees, try without the reference bookkeeping
+        self._serializer = banana.Serializer(tree_mode=True)
         self._unserializer = banana.Unserializer()
 
     ### IBackend ###
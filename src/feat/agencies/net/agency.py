@@ -72,7 +72,10 @@ class Startup(agency.Startup):
         assert isinstance(dbc, config.DbConfig), str(type(dbc))
         self._db = driver.Database(dbc.host, int(dbc.port), dbc.name,
                                    dbc.username, dbc.password,
-                                   https=dbc.https)
+                                   https=dbc.https,
+                                   cache_size=dbc.cache_size,
+                                   cache_policy=dbc.cache_policy,
+                                   write_delay=dbc.write_delay)
         # self._journaler = journaler.Journaler(
         #     on_rotate_cb=self.friend._force_snapshot_agents,
         #     on_switch_writer_cb=self.friend._on_journal_writer_switch,
@@ -189,6 +192,8 @@ class Agency(agency.Agency):
         self._broker = None
         self._gateway = None
         self._snapshot_task = None
+        # utils.locate.LocationCache, created when first needed
+        self._locations = None
 
         # this is default mode for the dependency modules
         self._set_default_mode(ExecMode.production)
@@ -258,6 +263,10 @@ class Agency(agency.Agency):
         self._create_pid_file()
         self.link_log_file(options.MASTER_LOG_LINK)
 
+        # The previous master is gone, and the slaves still running will
+        # resolve their locations again
+        self._get_locations().forget_other_owners()
+
         signal.signal(signal.SIGUSR1, self._sigusr1_handler)
         signal.signal(signal.SIGUSR2, self._sigusr2_handler)
         # Add signal handlers for SIGINT and SIGTERM
@@ -282,7 +291,9 @@ class Agency(agency.Agency):
         d.addCallback(defer.drop_param, self._start_host_agent)
         return d
 
-    def on_remove_slave(self):
+    def on_remove_slave(self, agency_id):
+        # Nobody listens for the changes of the locations it resolved
+        self._get_locations().forget_owner(agency_id)
         return self._spawn_backup_agency()
 
     def on_master_missing(self):
@@ -439,11 +450,13 @@ class Agency(agency.Agency):
 
     def register_agent(self, medium):
         agency.Agency.register_agent(self, medium)
+        self._invalidate_location(medium.get_agent_id())
         self._broker.register_agent(medium)
 
     def unregister_agent(self, medium):
         agency.Agency.unregister_agent(self, medium)
         agent_id = medium.get_agent_id()
+        self._invalidate_location(agent_id)
         self._broker.push_event(agent_id, 'unregistered')
         self._broker.unregister_agent(medium)
         self._start_host_agent()
@@ -503,10 +516,7 @@ class Agency(agency.Agency):
             port = yield found.reference.callRemote('get_gateway_port')
             defer.returnValue((host, port, True, ))
         else: # None
-            # lazy import not to load descriptor before feat is loaded
-            from feat.utils import locate
-            db = self._database.get_connection()
-            host = yield locate.locate(db, agent_id)
+            host = yield self._get_locations().locate(agent_id)
             port = self.config.gateway.port
             if host is None or (self._broker.is_master() and
                                 host == self.get_hostname()):
@@ -517,6 +527,15 @@ class Agency(agency.Agency):
             else:
                 defer.returnValue((host, port, True, ))
 
+    @manhole.expose()
+    def show_location_cache(self):
+        t = text_helper.Table(fields=("Hits", "Misses", "Invalidations",
+                                      "Watched documents"),
+                              lengths=(10, 10, 15, 20))
+        stats = self._get_locations().get_stats()
+        return t.render([(stats['hits'], stats['misses'],
+                          stats['invalidations'], stats['watched'])])
+
     @manhole.expose()
     def reconfigure_messaging(self, msg_host, msg_port):
         '''force messaging reconnector to the connect to the (host, port)'''
@@ -535,7 +554,38 @@ class Agency(agency.Agency):
             lengths=(20, 15, 30, 10, 15))
         connections = [self._database, self._messaging]
         iterator = (x.show_connection_status() for x in connections)
-        return t.render(iterator)
+        result = t.render(iterator)
+
+        t = text_helper.Table(
+            fields=("Database clients", "Known revisions", "Evictions"),
+            lengths=(20, 20, 15))
+        stats = self._database.show_revision_status()
+        return "\n\n".join([result, t.render([(stats['connections'],
+                                                 stats['size'],
+                                                 stats['evictions'])])])
+
+    @manhole.expose()
+    def show_database_cache(self):
+        t = text_helper.Table(fields=("Statistic", "Value"),
+                              lengths=(20, 20))
+        stats = self._database.show_cache_status()
+        return t.render(sorted(stats.iteritems()))
+
+    @manhole.expose()
+    def show_database_feeds(self):
+        t = text_helper.Table(
+            fields=("Feed", "Active", "Last seq", "Lag", "Received",
+                    "Restarts"),
+            lengths=(40, 8, 12, 8, 10, 10))
+
+        def render(stats):
+            return t.render((name, s['active'], s['last_seq'], s['lag'],
+                             s['received'], s['restarts'])
+                            for name, s in sorted(stats.iteritems()))
+
+        d = self._database.show_notifier_status()
+        d.addCallback(render)
+        return d
 
     @manhole.expose()
     def show_locked_db_documents(self):
@@ -682,6 +732,19 @@ class Agency(agency.Agency):
             self._snapshot_task.cancel()
         self._snapshot_task = None
 
+    def _get_locations(self):
+        if self._locations is None:
+            # lazy import not to load descriptor before feat is loaded
+            from feat.utils import locate
+            # the entries are shared by the master and the slave agencies
+            self._locations = locate.LocationCache(
+                self, self._database.get_connection(),
+                store=self._broker.shared_state, owner=self.agency_id)
+        return self._locations
+
+    def _invalidate_location(self, agent_id):
+        self._get_locations().invalidate(agent_id)
+
     def _create_gateway(self, gconfig):
         assert isinstance(gconfig, config.GatewayConfig), str(type(gconfig))
         try:
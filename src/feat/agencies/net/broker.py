@@ -327,7 +327,7 @@ class Broker(log.Logger, log.LogProxy, common.StateMachineMixin,
             try:
                 del(self.slaves[slave_id])
                 if callable(self.on_remove_slave_cb):
-                    return self.on_remove_slave_cb()
+                    return self.on_remove_slave_cb(slave_id)
             except ValueError:
                 self.error("Slave %r not found. ID: %r, Slaves: %r",
                            slave, slave_id, self.slaves)
@@ -45,6 +45,9 @@ class DbConfig(formatable.Formatable):
     formatable.field('username', None)
     formatable.field('password', None)
     formatable.field('https', False)
+    formatable.field('cache_size', options.DEFAULT_DB_CACHE_SIZE)
+    formatable.field('cache_policy', options.DEFAULT_DB_CACHE_POLICY)
+    formatable.field('write_delay', options.DEFAULT_DB_WRITE_DELAY)
 
 
 @register
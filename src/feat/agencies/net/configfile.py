@@ -211,6 +211,9 @@ name: dbname
 username: dbusername
 password: dbpassword
 https: dbhttps
+cache_size: dbcachesize
+cache_policy: dbcachepolicy
+write_delay: dbwritedelay
 
 [manhole]
 public_key: pubkey
@@ -29,7 +29,12 @@ from feat.agencies.net import configfile
 from feat.configure import configure
 from feat.agencies.net.broker import DEFAULT_SOCKET_PATH
 from feat.database.driver import DEFAULT_DB_HOST, DEFAULT_DB_PORT
-from feat.database.driver import DEFAULT_DB_NAME
+from feat.database.driver import DEFAULT_DB_NAME, Cache
+
+DEFAULT_DB_CACHE_SIZE = Cache.DEFAULT_DESIRED_SIZE
+DEFAULT_DB_CACHE_POLICY = Cache.DEFAULT_POLICY
+# 0 means that every document is saved with a separate request
+DEFAULT_DB_WRITE_DELAY = 0
 
 DEFAULT_MSG_HOST = "localhost"
 DEFAULT_MSG_PORT = 5672
@@ -217,6 +222,20 @@ def add_db_options(parser):
     group.add_option('--dbhttps', dest="db_https",
                      help="Use SSL connection",
                      default=False, action="store_true")
+    group.add_option('--dbcachesize', dest="db_cache_size",
+                     help=("size in bytes of the view results cache "
+                           "(default: %s)" % DEFAULT_DB_CACHE_SIZE),
+                     metavar="BYTES", type="int")
+    group.add_option('--dbcachepolicy', dest="db_cache_policy",
+                     help=("eviction policy of the view results cache, "
+                           "one of: lru, arc (default: %s)"
+                           % DEFAULT_DB_CACHE_POLICY),
+                     metavar="POLICY")
+    group.add_option('--dbwritedelay', dest="db_write_delay",
+                     help=("group the documents saved in this many seconds "
+                           "into a single bulk request, 0 disables it "
+                           "(default: %s)" % DEFAULT_DB_WRITE_DELAY),
+                     metavar="SECONDS", type="float")
     parser.add_option_group(group)
 
 
@@ -0,0 +1,248 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+import math
+import random
+
+from zope.interface import implements
+from twisted.internet.error import AlreadyCalled, AlreadyCancelled
+from twisted.internet.interfaces import IDelayedCall
+
+from feat.common import log, defer, error, time
+
+# Steps of the grids the periodic calls are aligned to. Each step divides
+# the next one, so the ticks of a coarser grid are also ticks of the finer
+# ones and the calls with different periods still meet.
+ALIGNMENT_STEPS = (0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+# Maximum part of the period a call can be postponed by the alignment
+ALIGNMENT_RATIO = 0.1
+
+# Resolution of the tick times used to group the calls, in seconds
+TICK_PRECISION = 1e3
+
+
+def alignment_step(period):
+    '''Returns the step of the grid the calls of the given period are
+    aligned to, the coarsest one not postponing them by more than
+    L{ALIGNMENT_RATIO} of the period.'''
+    limit = period * ALIGNMENT_RATIO
+    step = None
+    for candidate in ALIGNMENT_STEPS:
+        if candidate > limit:
+            break
+        step = candidate
+    return step
+
+
+class PeriodicScheduler(log.Logger):
+    '''
+    Agency-wide scheduler of the periodic jobs of the agents. Instead of
+    every job keeping its own delayed call at a random phase, the calls are
+    aligned to the ticks of a grid chosen from their period, the calls
+    expiring on the same tick share a single delayed call and are run
+    together. It also keeps per-name statistics of the runs.
+    '''
+
+    def __init__(self, logger=None, reactor=None, seed=None):
+        log.Logger.__init__(self, logger)
+        # If not given the time and the delayed calls are taken
+        # from feat.common.time, aware of the time scaling
+        self._reactor = reactor
+        self._random = random.Random(seed)
+        self._ticks = {} # {TICK: [PeriodicCall]}
+        self._tick_calls = {} # {TICK: IDelayedCall}
+        self._stats = {} # {NAME: PeriodicStats}
+
+    def __len__(self):
+        return sum(len(calls) for calls in self._ticks.itervalues())
+
+    def call_later(self, period, func, name=None, jitter=0, aligned=True):
+        '''
+        Schedules the next run of a periodic job. If the function returns
+        a Deferred the duration of the run is measured until it fires.
+        @param period: the period of the job in seconds
+        @param name: the name the statistics of the run are kept under
+        @param jitter: maximum random delay added to the period
+        @param aligned: if the call should be aligned to the shared ticks
+        @returns: L{IDelayedCall}
+        '''
+        now = self._seconds()
+        when = now + period
+        if jitter:
+            when += self._random.uniform(0, jitter)
+        step = aligned and alignment_step(period)
+        if step:
+            # Tolerate the rounding of the floats, a call scheduled
+            # from a tick would otherwise skip the next one
+            when = math.ceil(when / step - 1e-6) * step
+        tick = int(math.ceil(when * TICK_PRECISION))
+
+        call = PeriodicCall(self, tick, period, func, name)
+        calls = self._ticks.get(tick)
+        if calls is None:
+            calls = self._ticks[tick] = []
+            delay = max(float(tick) / TICK_PRECISION - now, 0)
+            self._tick_calls[tick] = self._call_later(delay, self._tick, tick)
+        calls.append(call)
+        return call
+
+    def get_stats(self):
+        '''Returns the statistics of the runs as a dictionary
+        {NAME: {"period", "runs", "overruns", "failures", "last",
+        "mean", "max"}}, with the durations in seconds.'''
+        return dict((name, stats.get_values())
+                    for name, stats in self._stats.iteritems())
+
+    def clear_stats(self):
+        self._stats.clear()
+
+    ### protected, used by PeriodicCall ###
+
+    def _remove(self, call):
+        calls = self._ticks.get(call.tick)
+        if calls is None:
+            # cancelled by one of the calls run on the same tick
+            return
+        calls.remove(call)
+        if not calls:
+            del self._ticks[call.tick]
+            tick_call = self._tick_calls.pop(call.tick)
+            if tick_call.active():
+                tick_call.cancel()
+
+    ### private ###
+
+    def _tick(self, tick):
+        del self._tick_calls[tick]
+        calls = self._ticks.pop(tick, [])
+        self.log("Running %d periodic calls", len(calls))
+        for call in calls:
+            if not call.cancelled:
+                call.called = True
+                self._run(call)
+
+    def _run(self, call):
+        stats = self._stats.get(call.name)
+        if stats is None:
+            stats = self._stats[call.name] = PeriodicStats(call.period)
+        stats.period = call.period
+        started = self._seconds()
+        d = defer.maybeDeferred(call.func)
+        d.addCallbacks(self._run_done, self._run_failed,
+                       callbackArgs=(stats, started),
+                       errbackArgs=(stats, started, call))
+
+    def _run_done(self, _, stats, started):
+        stats.add_run(self._seconds() - started)
+
+    def _run_failed(self, failure, stats, started, call):
+        stats.add_run(self._seconds() - started, failed=True)
+        error.handle_failure(self, failure,
+                             "Failure running periodic call %r", call.name)
+
+    def _seconds(self):
+        if self._reactor is None:
+            return time.time()
+        return self._reactor.seconds()
+
+    def _call_later(self, delay, func, *args):
+        if self._reactor is None:
+            return time.call_later(delay, func, *args)
+        return self._reactor.callLater(delay, func, *args)
+
+
+class PeriodicCall(object):
+
+    implements(IDelayedCall)
+
+    __slots__ = ("tick", "period", "func", "name",
+                 "called", "cancelled", "_scheduler")
+
+    def __init__(self, scheduler, tick, period, func, name=None):
+        self.tick = tick
+        self.period = period
+        self.func = func
+        self.name = name or getattr(func, "__name__", repr(func))
+        self.called = False
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    ### IDelayedCall ###
+
+    def getTime(self):
+        return float(self.tick) / TICK_PRECISION
+
+    def cancel(self):
+        self._check_active()
+        self.cancelled = True
+        self._scheduler._remove(self)
+
+    def delay(self, secondsLater):
+        raise NotImplementedError("Periodic calls cannot be delayed")
+
+    def reset(self, secondsFromNow):
+        raise NotImplementedError("Periodic calls cannot be reset")
+
+    def active(self):
+        return not (self.called or self.cancelled)
+
+    ### private ###
+
+    def _check_active(self):
+        if self.cancelled:
+            raise AlreadyCancelled()
+        if self.called:
+            raise AlreadyCalled()
+
+
+class PeriodicStats(object):
+    '''Statistics of the runs of the periodic calls with the same name.
+    A run lasting longer than the period is counted as an overrun,
+    the next run of the job started later than it was meant to.'''
+
+    __slots__ = ("period", "runs", "overruns", "failures",
+                 "last", "total", "max")
+
+    def __init__(self, period):
+        self.period = period
+        self.runs = 0
+        self.overruns = 0
+        self.failures = 0
+        self.last = 0
+        self.total = 0
+        self.max = 0
+
+    def add_run(self, duration, failed=False):
+        self.runs += 1
+        if failed:
+            self.failures += 1
+        if duration > self.period:
+            self.overruns += 1
+        self.last = duration
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def get_values(self):
+        return dict(period=self.period, runs=self.runs,
+                    overruns=self.overruns, failures=self.failures,
+                    last=self.last, mean=self.total / (self.runs or 1),
+                    max=self.max)
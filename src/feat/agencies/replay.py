@@ -712,6 +712,10 @@ class Connection(BaseReplayDummy):
     def save_document(self, doc):
         raise RuntimeError('save_document() should never be called!')
 
+    @serialization.freeze_tag('IDatabaseClient.save_documents')
+    def save_documents(self, docs):
+        raise RuntimeError('save_documents() should never be called!')
+
     @serialization.freeze_tag('IDatabaseClient.get_attachment_body')
     def get_attachment_body(self, attachment):
         raise RuntimeError('get_attachment_body() should never be called!')
@@ -833,6 +837,14 @@ class AgencyAgent(BaseReplayDummy):
     def get_descriptor(self):
         pass
 
+    @replay.named_side_effect('AgencyAgent.find_descriptor_partners')
+    def find_descriptor_partners(self, key):
+        pass
+
+    @replay.named_side_effect('AgencyAgent.query_descriptor_partners')
+    def query_descriptor_partners(self, factory, role=None, with_role=False):
+        pass
+
     @replay.named_side_effect('AgencyAgent.get_configuration')
     def get_configuration(self):
         pass
@@ -887,6 +899,10 @@ class AgencyAgent(BaseReplayDummy):
     def save_document(self, document):
         raise RuntimeError('This should never be called!')
 
+    @serialization.freeze_tag('AgencyAgency.save_documents')
+    def save_documents(self, documents):
+        raise RuntimeError('This should never be called!')
+
     @serialization.freeze_tag('AgencyAgency.reload_document')
     def reload_document(self, document):
         raise RuntimeError('This should never be called!')
@@ -933,6 +949,11 @@ class AgencyAgent(BaseReplayDummy):
     def call_later_ex(self, time_left, method, args, kwargs, busy=True):
         pass
 
+    @replay.named_side_effect('AgencyAgent.schedule_periodic')
+    def schedule_periodic(self, period, method, name=None, jitter=0,
+                          aligned=True, busy=False):
+        pass
+
     @replay.named_side_effect('AgencyAgent.cancel_delayed_call')
     def cancel_delayed_call(self, call_id):
         pass
@@ -1135,6 +1156,11 @@ class AgencyTask(AgencyProtocol, StateMachineSpecific):
     def finished(self):
         pass
 
+    @replay.named_side_effect('AgencyAgent.schedule_periodic')
+    def schedule_periodic(self, period, method, name=None, jitter=0,
+                          aligned=True, busy=False):
+        pass
+
     @property
     def agent(self):
         return self.replay.medium
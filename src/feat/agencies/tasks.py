@@ -68,6 +68,9 @@ class AgencyTask(common.AgencyMiddleBase):
     def call_later_ex(self, *args, **kwargs):
         return self.agent.call_later_ex(*args, **kwargs)
 
+    def schedule_periodic(self, *args, **kwargs):
+        return self.agent.schedule_periodic(*args, **kwargs)
+
     def cancel_delayed_call(self, call_id):
         return self.agent.cancel_delayed_call(call_id)
 
@@ -220,6 +220,20 @@ class BaseAgent(mro.FiberMroMixin, log.Logger, log.LogProxy, replay.Replayable,
         '''Returns a copy of the agent descriptos.'''
         return state.medium.get_descriptor()
 
+    @replay.immutable
+    def find_descriptor_partners(self, state, key):
+        '''Returns copies of the partners of the descriptor
+        with the specified recipient key.'''
+        return state.medium.find_descriptor_partners(key)
+
+    @replay.immutable
+    def query_descriptor_partners(self, state, factory,
+                                  role=None, with_role=False):
+        '''Returns copies of the partners of the descriptor of the specified
+        class and, if with_role is True, with the specified role.'''
+        return state.medium.query_descriptor_partners(factory, role,
+                                                      with_role)
+
     @replay.immutable
     def get_configuration(self, state):
         '''Returns a copy of the agent config.'''
@@ -479,6 +493,10 @@ class BaseAgent(mro.FiberMroMixin, log.Logger, log.LogProxy, replay.Replayable,
     def save_document(self, state, doc):
         return fiber.wrap_defer(state.medium.save_document, doc)
 
+    @replay.immutable
+    def save_documents(self, state, docs):
+        return fiber.wrap_defer(state.medium.save_documents, docs)
+
     @replay.immutable
     def update_document(self, state, doc_or_id, *args, **kwargs):
         db = state.medium.get_database()
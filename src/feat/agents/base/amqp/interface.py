@@ -28,7 +28,7 @@ __all__ = ['IAMQPClientFactory', 'IAMQPClient']
 class IAMQPClientFactory(Interface):
 
     def __call__(logger, exchange, exchange_type, host, port, vhost, user,
-                 password):
+                 password, publish_batch_size, publish_batch_delay):
         '''
         Consctructs a labour class that provides sending messages to
         external AMQP exchange.
@@ -42,6 +42,12 @@ class IAMQPClientFactory(Interface):
         @param exchange: name of the exchange (required)
         @param exchange_type: type of exchange to create (default "fanout"),
                               other possible values: direct, topic
+        @param publish_batch_size: number of messages committed in a single
+                                   transaction (default 1)
+        @param publish_batch_delay: maximum time the published message
+                                    waits for the commit of its batch
+                                    (default 0, the end of the reactor
+                                    iteration)
         '''
 
 
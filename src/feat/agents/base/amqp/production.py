@@ -37,9 +37,13 @@ class AMQPClient(serialization.Serializable, log.Logger, log.LogProxy):
     classProvides(IAMQPClientFactory)
     implements(IAMQPClient, ISink)
 
+    publish_batch_size = 1
+    publish_batch_delay = 0
+
     def __init__(self, logger, exchange, exchange_type='fanout',
                  host='localhost', port=5672, vhost='/',
-                 user='guest', password='guest'):
+                 user='guest', password='guest',
+                 publish_batch_size=1, publish_batch_delay=0):
         log.Logger.__init__(self, logger)
         log.LogProxy.__init__(self, logger)
         self._backend = None
@@ -52,13 +56,17 @@ class AMQPClient(serialization.Serializable, log.Logger, log.LogProxy):
         self.vhost = vhost
         self.user = user
         self.password = password
+        self.publish_batch_size = publish_batch_size
+        self.publish_batch_delay = publish_batch_delay
 
     ### IAMQPClient methods ###
 
     def connect(self):
         assert self._connection is None
-        self._backend = net.RabbitMQ(self.host, self.port,
-                                     self.user, self.password)
+        self._backend = net.RabbitMQ(
+            self.host, self.port, self.user, self.password,
+            publish_batch_size=self.publish_batch_size,
+            publish_batch_delay=self.publish_batch_delay)
         self._backend.connect()
 
         self._channel = self._backend.new_channel(self)
@@ -103,7 +111,9 @@ class AMQPClient(serialization.Serializable, log.Logger, log.LogProxy):
                self.port == other.port and\
                self.vhost == other.vhost and\
                self.user == other.user and\
-               self.password == other.password
+               self.password == other.password and\
+               self.publish_batch_size == other.publish_batch_size and\
+               self.publish_batch_delay == other.publish_batch_delay
 
     def __ne__(self, other):
         if not isinstance(other, type(self)):
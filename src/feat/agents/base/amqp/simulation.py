@@ -35,7 +35,8 @@ class AMQPClient(serialization.Serializable, log.Logger, log.LogProxy):
 
     def __init__(self, logger, exchange, exchange_type='fanout',
                  host='localhost', port=5672, vhost='/',
-                 user='guest', password='guest'):
+                 user='guest', password='guest',
+                 publish_batch_size=1, publish_batch_delay=0):
         log.Logger.__init__(self, logger)
         log.LogProxy.__init__(self, logger)
         self._server = None
@@ -329,18 +329,20 @@ class Partners(log.Logger, log.LogProxy, replay.Replayable):
 
     @replay.immutable
     def query(self, state, name_or_class):
-        partners = state.agent.get_descriptor().partners
         if (isinstance(name_or_class, types.TypeType) and
             IPartner.implementedBy(name_or_class)):
-            return filter(lambda x: isinstance(x, name_or_class), partners)
+            return state.agent.query_descriptor_partners(name_or_class)
         else:
             relation = self._get_relation(name_or_class)
+            partners = state.agent.query_descriptor_partners(
+                relation.factory)
             return relation.query(partners)
 
     @replay.immutable
     def query_with_role(self, state, name, role):
-        partners = state.agent.get_descriptor().partners
         relation = self._get_relation(name)
+        partners = state.agent.query_descriptor_partners(
+            relation.factory, role, with_role=True)
         return relation.query_with_role(partners, role)
 
     @replay.immutable
@@ -351,8 +353,7 @@ class Partners(log.Logger, log.LogProxy, replay.Replayable):
             agent_id = recipient.IRecipient(recp).key
         else:
             agent_id = recp
-        desc = state.agent.get_descriptor()
-        match = [x for x in desc.partners if x.recipient.key == agent_id]
+        match = state.agent.find_descriptor_partners(agent_id)
         if len(match) == 0:
             return None
         elif len(match) > 1:
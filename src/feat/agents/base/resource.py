@@ -22,6 +22,9 @@
 # -*- Mode: Python -*-
 # vi:si:et:sw=4:sts=4:ts=4
 
+import bisect
+import copy
+import heapq
 import sys
 
 from pprint import pformat
@@ -91,6 +94,33 @@ class IResourceDefinition(Interface):
         element of the group.
         """
 
+    def usage(allocations):
+        """
+        Optional. Build the aggregation of the allocated resources to be
+        maintained as they change. It can be passed to allocate(), modify()
+        and reduce() instead of the list of allocations.
+
+        @param allocations: [L{IAllocatedResource}]
+        @return: L{IResourceUsage}
+        """
+
+
+class IResourceUsage(Interface):
+    """
+    Aggregation of the resources allocated from a definition.
+    """
+
+    def add(allocated):
+        """
+        Account the L{IAllocatedResource}. The releases of a modification
+        are not taken into account until it is applied.
+        """
+
+    def remove(allocated):
+        """
+        Stop accounting the L{IAllocatedResource}.
+        """
+
 
 class IAllocatedResource(Interface):
 
@@ -144,7 +174,8 @@ class Range(serialization.Serializable):
     ### IResourceDefinition ###
 
     def allocate(self, allocations, number):
-        values = self._find_free_values(allocations, number)
+        usage = self._get_usage(allocations)
+        values = self._find_free_values(usage, number)
         return AllocatedRange(values)
 
     def modify(self, allocations, resource, *args):
@@ -156,6 +187,7 @@ class Range(serialization.Serializable):
          - add_specific - allocate specific value
          - release - release allocated specific value
         '''
+        usage = self._get_usage(allocations)
         res = RangeModification()
         last_cmd = None
         for param in args:
@@ -164,11 +196,11 @@ class Range(serialization.Serializable):
             elif last_cmd is None:
                 raise DeclarationError("First parameter should be a command")
             elif last_cmd == 'add':
-                values = self._find_free_values(allocations, param)
+                values = self._find_free_values(usage, param, res.values)
                 for p in values:
                     res.add_value(p)
             elif last_cmd == 'add_specific':
-                if not self._value_free(allocations, param):
+                if param in usage:
                     raise NotEnoughResource(
                         'Value %r of resource %s is allocated' %
                         (param, self.name, ))
@@ -188,8 +220,7 @@ class Range(serialization.Serializable):
 
     def reduce(self, allocations):
         # gives list of allocated values
-        return [x for x in range(self.first, self.last + 1)
-                if not self._value_free(allocations, x)]
+        return list(self._get_usage(allocations).iter_used())
 
     def get_total(self):
         return (self.first, self.last)
@@ -198,29 +229,35 @@ class Range(serialization.Serializable):
     def zero():
         return AllocatedRange()
 
+    def usage(self, allocations):
+        usage = RangeUsage(self.first, self.last)
+        for allocated in allocations:
+            usage.add(allocated)
+        return usage
+
     ### private ####
 
-    def _find_free_values(self, allocations, number):
-        to_allocate = number
+    def _get_usage(self, allocations):
+        if IResourceUsage.providedBy(allocations):
+            return allocations
+        return self.usage(allocations)
+
+    def _find_free_values(self, usage, number, skip=()):
         res = list()
-        for x in range(self.first, self.last + 1):
-            if number < 1:
-                break
-            if self._value_free(allocations, x):
+        if number > 0:
+            for x in usage.iter_free():
+                if x in skip:
+                    continue
                 res.append(x)
-                number -= 1
+                if len(res) == number:
+                    break
 
-        if number > 0:
-            total_allocated = self.last - self.first - to_allocate + number
+        if len(res) < number:
             raise NotEnoughResource('Not enough %s. Allocated already: %d '
                                     'Tried to allocate: %d' %
-                                    (self.name, total_allocated, to_allocate))
+                                    (self.name, len(usage), number))
         return res
 
-    def _value_free(self, allocations, value):
-        included = any(map(lambda x: value in x.values, allocations))
-        return not included
-
     def __eq__(self, other):
         if not isinstance(other, type(self)):
             return NotImplemented
@@ -234,6 +271,157 @@ class Range(serialization.Serializable):
         return not self.__eq__(other)
 
 
+@feat.register_restorator
+class RangeUsage(serialization.Serializable):
+    '''
+    Values of a range in use. They are kept as disjoint intervals in two
+    sorted lists searched by bisection, so finding the free values does
+    not require checking every value of the range.
+    '''
+    implements(IResourceUsage)
+
+    type_name = 'range_usage'
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        # value -> number of allocated resources including it
+        self._counts = dict()
+        self._starts = list()
+        self._ends = list()
+
+    ### IResourceUsage ###
+
+    def add(self, allocated):
+        for value in allocated.values:
+            if value >= 0:
+                self._use(value)
+
+    def remove(self, allocated):
+        for value in allocated.values:
+            if value >= 0:
+                self._free(value)
+
+    ### public ###
+
+    def iter_free(self):
+        current = self.first
+        index = bisect.bisect_left(self._ends, current)
+        while current <= self.last:
+            if index < len(self._starts) and self._starts[index] <= current:
+                current = self._ends[index] + 1
+                index += 1
+                continue
+            limit = self.last
+            if index < len(self._starts):
+                limit = min(limit, self._starts[index] - 1)
+            for value in xrange(current, limit + 1):
+                yield value
+            current = limit + 1
+
+    def iter_used(self):
+        index = bisect.bisect_left(self._ends, self.first)
+        for start, end in zip(self._starts[index:], self._ends[index:]):
+            if start > self.last:
+                break
+            for value in xrange(max(start, self.first),
+                                min(end, self.last) + 1):
+                yield value
+
+    ### private ###
+
+    def _use(self, value):
+        count = self._counts.get(value, 0)
+        self._counts[value] = count + 1
+        if count:
+            return
+        index = bisect.bisect_right(self._starts, value)
+        left = index > 0 and self._ends[index - 1] == value - 1
+        right = (index < len(self._starts)
+                 and self._starts[index] == value + 1)
+        if left and right:
+            self._ends[index - 1] = self._ends[index]
+            del self._starts[index]
+            del self._ends[index]
+        elif left:
+            self._ends[index - 1] = value
+        elif right:
+            self._starts[index] = value
+        else:
+            self._starts.insert(index, value)
+            self._ends.insert(index, value)
+
+    def _free(self, value):
+        count = self._counts.get(value, 0)
+        if count > 1:
+            self._counts[value] = count - 1
+            return
+        if not count:
+            return
+        del self._counts[value]
+        index = bisect.bisect_right(self._starts, value) - 1
+        start, end = self._starts[index], self._ends[index]
+        if start == end:
+            del self._starts[index]
+            del self._ends[index]
+        elif start == value:
+            self._starts[index] = value + 1
+        elif end == value:
+            self._ends[index] = value - 1
+        else:
+            self._ends[index] = value - 1
+            self._starts.insert(index + 1, value + 1)
+            self._ends.insert(index + 1, end)
+
+    ### ISerializable ###
+
+    def snapshot(self):
+        return self.first, self.last, self._counts.items()
+
+    def recover(self, snapshot):
+        first, last, counts = snapshot
+        self.__init__(first, last)
+        for value, count in sorted(counts):
+            self._use(value)
+            self._counts[value] = count
+
+    ### python specific ###
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, value):
+        return value in self._counts
+
+    def __repr__(self):
+        return "<RangeUsage %s>" % (", ".join(
+            "%d-%d" % x for x in zip(self._starts, self._ends)), )
+
+
+@feat.register_restorator
+class ScalarUsage(serialization.Serializable):
+    '''
+    Running total of a scalar resource in use.
+    '''
+    implements(IResourceUsage)
+
+    type_name = 'scalar_usage'
+
+    def __init__(self, value=0):
+        self.value = value
+
+    ### IResourceUsage ###
+
+    def add(self, allocated):
+        self.value += max(allocated.value, 0)
+
+    def remove(self, allocated):
+        self.value -= max(allocated.value, 0)
+
+    def __repr__(self):
+        return "<ScalarUsage %d>" % (self.value, )
+
+
 @feat.register_restorator
 class Scalar(serialization.Serializable):
     implements(IResourceDefinition)
@@ -287,6 +475,8 @@ class Scalar(serialization.Serializable):
         return ScalarModification(value)
 
     def reduce(self, allocations):
+        if IResourceUsage.providedBy(allocations):
+            return allocations.value
         return sum([max([x.value, 0]) for x in allocations])
 
     def get_total(self):
@@ -296,6 +486,12 @@ class Scalar(serialization.Serializable):
     def zero():
         return AllocatedScalar(0)
 
+    def usage(self, allocations):
+        usage = ScalarUsage()
+        for allocated in allocations:
+            usage.add(allocated)
+        return usage
+
     ### private ####
 
     def __eq__(self, other):
@@ -511,6 +707,88 @@ class AllocationChange(serialization.Serializable):
                (self.id, self.allocation_id, pformat(self.deltas), )
 
 
+@feat.register_restorator
+class AllocationsUsage(serialization.Serializable):
+    '''
+    Usage of the resources by the confirmed and pending allocations,
+    maintained as they are done, confirmed, released and expire instead
+    of being aggregated from all the allocations every time. Only the
+    resources with a definition providing usage() are aggregated.
+    '''
+
+    type_name = 'allocations_usage'
+
+    def __init__(self, definitions=None):
+        # name -> IResourceUsage of all the allocations
+        self.usages = dict()
+        # name -> IResourceUsage of the ones not confirmed yet
+        self.pending_usages = dict()
+        # id -> accounted Allocation or AllocationChange
+        self.allocations = dict()
+        # id -> expiration time of the ones not confirmed yet
+        self.pending = dict()
+        # heap of (expiration time, id) of the pending ones
+        self.expirations = list()
+        for name, definition in (definitions or {}).iteritems():
+            factory = getattr(definition, 'usage', None)
+            if factory is not None:
+                self.usages[name] = factory([])
+                self.pending_usages[name] = factory([])
+
+    def get(self, name):
+        return self.usages.get(name, None)
+
+    def get_pending(self, name):
+        return self.pending_usages.get(name, None)
+
+    def add(self, allocation, pending=False, expiration=None):
+        allocation = copy.deepcopy(allocation)
+        self.allocations[allocation.id] = allocation
+        self._account(self.usages, allocation, 'add')
+        if pending:
+            self._account(self.pending_usages, allocation, 'add')
+            self.pending[allocation.id] = expiration
+            if expiration is not None:
+                heapq.heappush(self.expirations,
+                               (expiration, allocation.id))
+
+    def confirm(self, allocation_id):
+        if self.pending.pop(allocation_id, False) is False:
+            return
+        change = self.allocations[allocation_id]
+        self._account(self.pending_usages, change, 'remove')
+        if not isinstance(change, AllocationChange):
+            return
+        self.remove(allocation_id)
+        alloc = self.allocations.get(change.allocation_id, None)
+        if alloc is not None:
+            self._account(self.usages, alloc, 'remove')
+            alloc.apply(change)
+            self._account(self.usages, alloc, 'add')
+
+    def remove(self, allocation_id):
+        allocation = self.allocations.pop(allocation_id, None)
+        if allocation is None:
+            return
+        self._account(self.usages, allocation, 'remove')
+        if self.pending.pop(allocation_id, False) is not False:
+            self._account(self.pending_usages, allocation, 'remove')
+
+    def expire(self, now):
+        while self.expirations and self.expirations[0][0] <= now:
+            expiration, allocation_id = heapq.heappop(self.expirations)
+            if self.pending.get(allocation_id, None) == expiration:
+                self.remove(allocation_id)
+
+    ### private ###
+
+    def _account(self, usages, allocation, method):
+        for name, usage in usages.iteritems():
+            allocated = allocation.allocated_for(name)
+            if allocated is not None:
+                getattr(usage, method)(allocated)
+
+
 class AgentMixin(object):
 
     @replay.mutable
@@ -602,12 +880,16 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
         state.id_autoincrement = 1
         # id -> temporal_objects (Allocation)
         state.modifications = ExpDict(agent)
+        # AllocationsUsage, built when first needed
+        state.usage = None
 
     @replay.immutable
     def restored(self, state):
         log.Logger.__init__(self, state.agent)
         log.LogProxy.__init__(self, state.agent)
         replay.Replayable.restored(self)
+        if not hasattr(state, 'usage'):
+            state.usage = None
 
     # Public API
 
@@ -620,6 +902,7 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
         if name in state.definitions:
             self.log("Overwriting old definition.")
         state.definitions[name] = definition
+        state.usage = None
 
     @replay.mutable
     def preallocate(self, state, **params):
@@ -632,6 +915,7 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
             state.modifications.set(alloc.id, alloc,
                                     expiration=self.preallocation_timeout,
                                     relative=True)
+            self._add_pending(alloc)
             return alloc
         except NotEnoughResource:
             return None
@@ -648,11 +932,15 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
 
             raise AllocationNotFound("Allocation with id=%s not found" %
                                      allocation_id)
+        if state.usage is not None:
+            state.usage.confirm(allocation_id)
         return self._append_to_descriptor(alloc)
 
     @replay.mutable
     def allocate(self, state, **params):
         alloc = self._generate_allocation(**params)
+        if state.usage is not None:
+            state.usage.add(alloc)
         return self._append_to_descriptor(alloc)
 
     @replay.mutable
@@ -667,6 +955,7 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
             state.modifications.set(change.id, change,
                                     expiration=ALLOCATION_TIMEOUT,
                                     relative=True)
+            self._add_pending(change)
             return change
         except NotEnoughResource:
             return None
@@ -723,6 +1012,8 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
         confirmed = self.check_allocated(allocation_id)
         transient = allocation_id in state.modifications
 
+        if (confirmed or transient) and state.usage is not None:
+            state.usage.remove(allocation_id)
         if confirmed:
             to_remove = self._get_confirmed()[allocation_id]
             return self._remove_allocation_from_descriptor(to_remove)
@@ -865,11 +1156,40 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
         state.id_autoincrement += 1
         return str(ret)
 
+    @replay.mutable
+    def _add_pending(self, state, allocation):
+        if state.usage is None:
+            return
+        try:
+            expiration = state.modifications.get_expiration(allocation.id)
+        except KeyError:
+            # already expired
+            return
+        state.usage.add(allocation, pending=True, expiration=expiration)
+
+    @replay.immutable
+    def _get_usage(self, state):
+        # only the usage derived from the allocations is updated here
+        if state.usage is None:
+            usage = AllocationsUsage(state.definitions)
+            for alloc in self._get_confirmed().itervalues():
+                usage.add(alloc)
+            for key in state.modifications.iterkeys():
+                usage.add(state.modifications.get(key), pending=True,
+                          expiration=state.modifications.get_expiration(key))
+            state.usage = usage
+        state.usage.expire(state.agent.get_time())
+        return state.usage
+
     @replay.immutable
     def _get_allocated(self, state, name):
         '''
-        Gives list of IAllocatedResource objects for the given resource name.
+        Gives the IResourceUsage of the given resource name if its
+        definition provides one, the list of IAllocatedResource otherwise.
         '''
+        usage = self._get_usage().get(name)
+        if usage is not None:
+            return usage
         resp = list()
         allocations = self._get_confirmed().values() + \
                       state.modifications.values()
@@ -879,6 +1199,9 @@ class Resources(log.Logger, log.LogProxy, replay.Replayable):
 
     @replay.immutable
     def _get_modified(self, state, name):
+        usage = self._get_usage().get_pending(name)
+        if usage is not None:
+            return usage
         allocs = [a.allocated_for(name)
                   for a in state.modifications.itervalues()]
         return filter(None, allocs)
@@ -71,6 +71,12 @@ class StealthPeriodicTask(BaseTask):
     busy = False
     timeout = None
 
+    # Maximum random delay added to the period, in seconds
+    jitter = 0
+    # If the runs should be aligned to the ticks shared
+    # with the other periodic tasks of the agency
+    aligned = True
+
     def initiate(self, period):
         """
         @param period: the periodicity of the task, in seconds
@@ -100,10 +106,16 @@ class StealthPeriodicTask(BaseTask):
     ### Private Methods ###
 
     def _run(self):
-        d = defer.maybeDeferred(self.run)
+        d = self._run_periodic()
         d.addErrback(defer.inject_param, 1, error.handle_failure, self,
                      "Failure during stealth task execution")
-        d.addCallback(self._schedule)
+        return d
+
+    def _run_periodic(self):
+        # The failures are passed on to the periodic scheduler of the
+        # agency which logs them and counts them in its statistics
+        d = defer.maybeDeferred(self.run)
+        d.addBoth(defer.bridge_param, self._schedule)
         return d
 
     @replay.immutable
@@ -117,9 +129,11 @@ class StealthPeriodicTask(BaseTask):
         if self._canceled:
             return
         self._cancel()
-        self._call = state.medium.call_later_ex(self._period,
-                                                self._run,
-                                                busy=False)
+        self._call = state.medium.schedule_periodic(self._period,
+                                                    self._run_periodic,
+                                                    name=self.type_name,
+                                                    jitter=self.jitter,
+                                                    aligned=self.aligned)
 
 
 class LoopingCall(StealthPeriodicTask):
@@ -111,16 +111,20 @@ class SpawnServer(action.Action):
     action.param('minimum', value.Integer(300),
                  desc="Minimum TTL",
                  is_required=False)
+    action.param('window', value.Integer(1),
+                 desc=("Number of seconds the zone updates are batched "
+                       "before notifying the slaves"),
+                 is_required=False)
     action.result(value.Response())
     action.effect(call.action_perform('spawn_agent'))
     action.effect(call.action_filter('render_reference'))
     action.effect(response.created('Server spawned'))
 
     def spawn_agent(self, suffix, slaves=None, ns=None, refresh=None,
-                    retry=None, expire=None, minimum=None):
+                    retry=None, expire=None, minimum=None, window=None):
         notify = dns_agent.NotifyConfiguration(
             slaves=slaves, refresh=refresh,
-            expire=expire, minimum=minimum, retry=retry)
+            expire=expire, minimum=minimum, retry=retry, window=window)
         desc = dns_agent.Descriptor(ns=ns, notify=notify, suffix=suffix)
         d = self.model.source.host_agent_call(
             'initiate_protocol', start_agent.GloballyStartAgent, desc)
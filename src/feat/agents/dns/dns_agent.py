@@ -56,6 +56,8 @@ class NotifyConfiguration(formatable.Formatable):
     formatable.field('minimum', u'300')
     # list of slaves bind servers to notify
     formatable.field('slaves', [(u'127.0.0.1', 53)])
+    # seconds the zone updates are batched before notifying the slaves
+    formatable.field('window', 1)
 
 
 @feat.register_restorator
@@ -19,8 +19,11 @@
 # See "LICENSE.GPL" in the source distribution for more information.
 
 # Headers in this file shall remain intact.
+import collections
+import copy
+
 from twisted.names import server, common, dns, authority
-from twisted.python import log
+from twisted.python import log, failure
 from twisted.internet import reactor, error, defer
 from zope.interface import implements, classProvides
 
@@ -40,12 +43,31 @@ def get_serial():
 
 
 class Resolver(authority.PySourceAuthority):
+    '''
+    Authority of the zone managed by the agent. The records updates are
+    visible right away, but the serial is only bumped when committing
+    them. Each commit is kept in the journal to answer incremental zone
+    transfer requests (IXFR, RFC 1995) from the slaves.
+
+    Answers to the queries are compiled once, with the CNAME chains
+    inside of the zone already followed, and kept until the records
+    change.
+    '''
 
     type_name = "dns-resolver"
 
+    # maximum number of commits kept in the journal
+    journal_size = 100
+
     def __init__(self, suffix, ns, notify, host_ip, ns_ttl):
         common.ResolverBase.__init__(self)
         self.records = {}
+        # [(serial before, serial after, deleted RRs, added RRs)]
+        self.journal = collections.deque()
+        # name -> records before the first uncommitted update
+        self._changed = {}
+        # (lowercase name, type) -> (answer, authority, additional)
+        self._answers = {}
         r_soa = dns.Record_SOA(
                     # This nameserver's name
                     mname = ns,
@@ -76,14 +98,133 @@ class Resolver(authority.PySourceAuthority):
                       else dns.Record_CNAME
             dns_record = factory(record.ip, record.ttl)
             translated.append(dns_record)
+        if name not in self._changed:
+            self._changed[name] = self.records.get(name, [])
         self.records[name] = translated
         if not translated:
             del(self.records[name])
+        # the answers of other names can depend on these records
+        self._answers.clear()
+
+    def query(self, query, timeout=None):
+        # the answers are shared by all the spellings of the name, the
+        # resolvers randomizing the case of the queries (0x20) would
+        # otherwise grow the table with every query
+        name = query.name.name.lower()
+        key = (name, query.type)
+        answer = self._answers.get(key)
+        if answer is None:
+            if (query.type in (dns.AXFR, dns.IXFR)
+                or name not in self.records):
+                return authority.PySourceAuthority.query(self, query, timeout)
+            answer = self._compile(name, query.type)
+            self._answers[key] = answer
+        if query.name.name != name:
+            answer = self._respell(answer, name, query.name.name)
+        return defer.succeed(answer)
+
+    def commit(self):
+        '''
+        Bumps the serial once for all the updates done since the last
+        commit and journals them. Returns True if the zone changed.
+        '''
+        changed, self._changed = self._changed, {}
+        deleted, added = [], []
+        for name in sorted(changed):
+            old = changed[name]
+            new = self.records.get(name, [])
+            deleted.extend(self._header(name, r) for r in old if r not in new)
+            added.extend(self._header(name, r) for r in new if r not in old)
+        if not (deleted or added):
+            return False
 
+        old_serial = self.soa[1].serial
         self._update_serial()
+        self.journal.append((old_serial, self.soa[1].serial, deleted, added))
+        while len(self.journal) > self.journal_size:
+            self.journal.popleft()
+        return True
+
+    def lookupIncrementalZoneTransfer(self, name, serial, timeout=None):
+        '''
+        Answers to an IXFR request of a slave having the given serial.
+        If the journal does not go back to it the whole zone is sent
+        like for an AXFR request.
+        '''
+        if self.soa[0].lower() != name.lower():
+            return defer.fail(failure.Failure(dns.DomainError(name)))
+
+        current = self._soa_header(self.soa[1].serial)
+        if serial == self.soa[1].serial:
+            return defer.succeed(([current], (), ()))
+
+        serials = [entry[0] for entry in self.journal]
+        if serial not in serials:
+            return self.lookupZone(name, timeout)
+
+        results = [current]
+        for old, new, deleted, added in \
+                list(self.journal)[serials.index(serial):]:
+            results.append(self._soa_header(old))
+            results.extend(deleted)
+            results.append(self._soa_header(new))
+            results.extend(added)
+        results.append(current)
+        return defer.succeed((results, (), ()))
+
+    ### private ###
 
     def _update_serial(self):
-        self.soa[1].serial = dns.str2time(get_serial())
+        # more than one commit can happen within a second
+        serial = max(self.soa[1].serial + 1, get_serial())
+        self.soa[1].serial = dns.str2time(serial)
+
+    def _respell(self, answer, name, spelling):
+        # the owner names of the answer are given as the client asked
+        ans, auth, add = answer
+        ans = [dns.RRHeader(spelling, rr.type, rr.cls, rr.ttl,
+                            rr.payload, rr.auth)
+               if rr.name.name == name else rr
+               for rr in ans]
+        return ans, auth, add
+
+    def _compile(self, name, type):
+        results = []
+        seen = set()
+        while name.lower() not in seen:
+            seen.add(name.lower())
+            records = self.records.get(name.lower(), ())
+            matching = [r for r in records
+                        if r.TYPE == type or type == dns.ALL_RECORDS]
+            if matching:
+                results.extend(self._header(name, r) for r in matching)
+                break
+            cnames = [r for r in records if r.TYPE == dns.CNAME]
+            if not cnames:
+                break
+            results.append(self._header(name, cnames[0]))
+            name = cnames[0].name.name
+
+        if not results:
+            # RFC 2308: the SOA allows caching the empty answer
+            return [], [self._header(self.soa[0], self.soa[1])], []
+        # the chain already contains the addresses of the aliases
+        processed = [rr for rr in results if rr.type != dns.CNAME] or results
+        additional = list(self._additionalRecords(
+            processed, [], self._default_ttl()))
+        return results, [], additional
+
+    def _default_ttl(self):
+        return max(self.soa[1].minimum, self.soa[1].expire)
+
+    def _header(self, name, record):
+        ttl = record.ttl if record.ttl is not None else self._default_ttl()
+        return dns.RRHeader(name, record.TYPE, dns.IN, ttl, record, auth=True)
+
+    def _soa_header(self, serial):
+        record = copy.copy(self.soa[1])
+        record.serial = serial
+        return self._header(self.soa[0], record)
 
 
 @feat.register_restorator
@@ -100,6 +241,9 @@ class Labour(labour.BaseLabour):
         self._factory = None
         self._slaves = notify_cfg.slaves
         self._suffix = suffix
+        # seconds the updates are batched before notifying the slaves
+        self._window = notify_cfg.window
+        self._commit_call = None
 
         self._dns_fact = DNSServerFactory(clients=[self._resolver], verbose=0)
         udp_fact = dns.DNSDatagramProtocol(self._dns_fact)
@@ -124,6 +268,9 @@ class Labour(labour.BaseLabour):
         return True
 
     def cleanup(self):
+        if self._commit_call is not None:
+            self._commit_call.cancel()
+            self._commit_call = None
         d = defer.maybeDeferred(self._tcp_listener.stopListening)
         d.addCallback(lambda _: self._listener.stopListening())
         return d
@@ -134,10 +281,20 @@ class Labour(labour.BaseLabour):
 
     @replay.side_effect
     def notify_slaves(self):
-        self._notify_slaves()
+        if not self._window:
+            self._commit()
+        elif self._commit_call is None:
+            # the updates done until the end of the window are
+            # committed with a single serial bump and notification
+            self._commit_call = time.call_later(self._window, self._commit)
 
     ### private ###
 
+    def _commit(self):
+        self._commit_call = None
+        if self._resolver.commit():
+            self._notify_slaves()
+
     def _notify_slaves(self):
         if self._factory and self._factory.transport:
             for ip in self._slaves:
@@ -157,6 +314,9 @@ class Labour(labour.BaseLabour):
 
 class DNSServerFactory(server.DNSServerFactory):
 
+    # incremental transfers with more records are refused over UDP
+    max_udp_transfer = 20
+
     def gotResolverError(self, failure, protocol, message, address):
         '''
         Copied from twisted.names.
@@ -175,14 +335,42 @@ class DNSServerFactory(server.DNSServerFactory):
     def handleQuery(self, message, protocol, address):
         """
         Copied from twisted.names.
-        Adds passing the address to resolver's query method.
+        Adds passing the address to resolver's query method
+        and handling incremental zone transfers.
         """
         query = message.queries[0]
-        d = self.resolver.query(query, address)
+        if query.type == dns.IXFR:
+            d = self._incremental_transfer(query, message, address)
+        else:
+            d = self.resolver.query(query, address)
         d.addCallback(self.gotResolverResponse, protocol, message, address)
         d.addErrback(self.gotResolverError, protocol, message, address)
         return d
 
+    def _incremental_transfer(self, query, message, address):
+        serials = [rr.payload.serial for rr in message.authority
+                   if rr.type == dns.SOA]
+        resolver = None
+        for candidate in getattr(self.resolver, 'resolvers', ()):
+            if hasattr(candidate, 'lookupIncrementalZoneTransfer'):
+                resolver = candidate
+        if not serials or resolver is None:
+            return defer.fail(failure.Failure(
+                NotImplementedError("IXFR query for %s" % (query.name, ))))
+
+        name = query.name.name
+        d = resolver.lookupIncrementalZoneTransfer(name, serials[0])
+        if address is not None:
+            # RFC 1995: if the answer does not fit in an UDP packet
+            # only the current SOA is sent, the slave retries over TCP
+            d.addCallback(self._limit_udp_transfer)
+        return d
+
+    def _limit_udp_transfer(self, (ans, auth, add)):
+        if len(ans) > self.max_udp_transfer:
+            return ans[:1], auth, add
+        return ans, auth, add
+
     def handleNotify(self, message, protocol, address):
         '''
         Not interested in handling notify messages
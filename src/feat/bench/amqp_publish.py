@@ -0,0 +1,121 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Compares the throughput of publishing messages to AMQP committing each of
+them on its own with committing them in batches. The broker is replaced
+by the channel which processes one commit at a time, each of them taking
+the configured time, so that no RabbitMQ server is needed.
+
+Usage: python -m feat.bench.amqp_publish [--count N] [--commit-time MS]
+'''
+import optparse
+import time as python_time
+
+from twisted.internet import reactor
+
+from feat.agencies import message
+from feat.agencies.messaging import net
+from feat.common import defer, log, time
+
+
+class DelayingAMQPChannel(object):
+
+    def __init__(self, commit_time):
+        self.commit_time = commit_time
+        self.commits = 0
+        self._busy_until = 0
+
+    def basic_publish(self, exchange, content, routing_key, immediate):
+        return defer.succeed(None)
+
+    def tx_commit(self):
+        # the commits on the channel are handled by the broker in order
+        self.commits += 1
+        now = python_time.time()
+        self._busy_until = max(now, self._busy_until) + self.commit_time
+        d = defer.Deferred()
+        reactor.callLater(self._busy_until - now, d.callback, None)
+        return d
+
+
+def create_channel(amqp, batch_size, batch_delay):
+    keeper = log.get_default() or log.FluLogKeeper()
+    channel = net.Channel(keeper, defer.Deferred(), None,
+                          batch_size, batch_delay)
+    channel.channel = amqp
+    channel._set_state(net.ChannelState.performing)
+    return channel
+
+
+@defer.inlineCallbacks
+def run(count, commit_time, batch_size, batch_delay=0):
+    amqp = DelayingAMQPChannel(commit_time)
+    channel = create_channel(amqp, batch_size, batch_delay)
+    messages = list()
+    for index in range(count):
+        msg = message.BaseMessage(message_id=str(index),
+                                  protocol_id='bench',
+                                  payload=dict(index=index))
+        msg.expiration_time = time.future(3600)
+        messages.append(msg)
+
+    started = python_time.time()
+    # agents don't wait for the message to be published before sending
+    # the next one, all of the messages are in flight at once
+    yield defer.DeferredList([channel.publish('key', 'shard', msg)
+                              for msg in messages])
+    elapsed = python_time.time() - started
+    defer.returnValue((elapsed, amqp.commits))
+
+
+@defer.inlineCallbacks
+def compare(count, commit_time, batch_sizes):
+    print "%-12s %10s %10s %14s" % ("batch size", "commits", "time [s]",
+                                     "messages/s")
+    for batch_size in batch_sizes:
+        elapsed, commits = yield run(count, commit_time, batch_size)
+        print "%-12s %10d %10.3f %14.1f" % (
+            batch_size, commits, elapsed, count / elapsed)
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', dest='count', type='int', default=5000,
+                      help='number of messages to publish (default: 5000)')
+    parser.add_option('--commit-time', dest='commit_time', type='float',
+                      default=0.5, help='time the broker needs to commit '
+                      'the transaction in milliseconds (default: 0.5)')
+    parser.add_option('--batch', dest='batch_sizes', action='append',
+                      type='int', help='batch size to measure, can be '
+                      'given many times (default: 1, 10, 100)')
+    opts, _ = parser.parse_args()
+
+    d = compare(opts.count, opts.commit_time / 1000.0,
+                opts.batch_sizes or [1, 10, 100])
+    d.addErrback(log.handle_failure if hasattr(log, 'handle_failure')
+                 else lambda f: f.printTraceback())
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+
+
+if __name__ == '__main__':
+    script()
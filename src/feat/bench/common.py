@@ -0,0 +1,139 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Helpers shared by the benchmark suite: they time an operation a given
+number of times and summarize the measurement as a dictionary ready to
+be dumped as json.
+
+Each result contains the throughput, the latency percentiles in
+microseconds and the allocations per operation: "objects" is the net
+number of container objects tracked by the garbage collector and
+"garbage" the number of objects the collector had to free after the run.
+'''
+import gc
+import resource
+import timeit
+
+from feat.common import defer
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, percent):
+    '''Returns the given percentile of a sorted list.'''
+    if not values:
+        return None
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+
+def measure(name, function, count, **params):
+    '''Calls the function count times and returns the summary.'''
+    latencies = [None] * count
+    timer = timeit.default_timer
+    collect = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        objects = gc.get_count()[0]
+        started = timer()
+        for index in xrange(count):
+            before = timer()
+            function()
+            latencies[index] = timer() - before
+        elapsed = timer() - started
+        objects = gc.get_count()[0] - objects
+    finally:
+        if collect:
+            gc.enable()
+    garbage = gc.collect()
+    return summarize(name, params, latencies, elapsed, objects, garbage)
+
+
+@defer.inlineCallbacks
+def measure_deferred(name, function, count, concurrency=1, **params):
+    '''Same as measure() for functions returning a Deferred, keeping
+    up to concurrency of them running at the same time.'''
+    latencies = list()
+    timer = timeit.default_timer
+
+    def done(result, before):
+        latencies.append(timer() - before)
+        return result
+
+    def call():
+        before = timer()
+        d = defer.maybeDeferred(function)
+        d.addCallback(done, before)
+        return d
+
+    gc.collect()
+    # the garbage collector is not disabled for asynchronous operations,
+    # they can run long enough to exhaust the memory
+    objects = len(gc.get_objects())
+    started = timer()
+    pending = list()
+    for _ in xrange(count):
+        pending.append(call())
+        if len(pending) >= concurrency:
+            yield defer.DeferredList(pending, fireOnOneErrback=True,
+                                     consumeErrors=True)
+            pending = list()
+    yield defer.DeferredList(pending, fireOnOneErrback=True,
+                             consumeErrors=True)
+    elapsed = timer() - started
+    objects = len(gc.get_objects()) - objects
+    garbage = gc.collect()
+    params['concurrency'] = concurrency
+    defer.returnValue(summarize(name, params, latencies, elapsed,
+                                objects, garbage))
+
+
+def summarize(name, params, latencies, elapsed, objects, garbage):
+    count = len(latencies)
+    latencies = sorted(latencies)
+    scale = 1000000.0
+    latency = dict(mean=sum(latencies) / count * scale if count else None,
+                   max=latencies[-1] * scale if count else None)
+    for percent in PERCENTILES:
+        value = percentile(latencies, percent)
+        latency['p%d' % (percent, )] = \
+            value * scale if value is not None else None
+    return dict(name=name,
+                params=params,
+                count=count,
+                elapsed=elapsed,
+                throughput=count / elapsed if elapsed else None,
+                latency=latency,
+                allocations=dict(objects=float(objects) / (count or 1),
+                                 garbage=float(garbage) / (count or 1)),
+                maxrss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def error(failure, name, **params):
+    '''Result of a benchmark which could not be run, to be used as
+    an errback.'''
+    return dict(name=name, params=params,
+                error=failure.getErrorMessage(),
+                error_type=failure.type.__name__,
+                traceback=failure.getTraceback())
@@ -0,0 +1,130 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Measures the throughput of writing log entries to the sqlite journal
+through Journaler.insert_entries(), the way the agency log keeper does.
+
+Usage: python -m feat.bench.journaler [--count N] [--chunk N]
+                                      [--flush-size N] [--flush-interval S]
+                                      [--filename PATH]
+'''
+import optparse
+import os
+import tempfile
+import time as python_time
+
+from twisted.internet import reactor
+
+from feat.common import defer, log, time
+from feat.agencies import journaler
+
+
+def generate_log(index):
+    return {'entry_type': 'log',
+            'message': 'Some log message number %d' % (index, ),
+            'level': 4,
+            'category': 'bench',
+            'log_name': 'agent-%d' % (index % 10, ),
+            'file_path': __file__,
+            'line_num': index % 1000,
+            'timestamp': int(time.time())}
+
+
+@defer.inlineCallbacks
+def run(filename, count, chunk, flush_size=None, flush_interval=None):
+    keeper = log.get_default() or log.FluLogKeeper()
+    writer = journaler.SqliteWriter(keeper, filename=filename,
+                                    encoding='zip',
+                                    flush_size=flush_size,
+                                    flush_interval=flush_interval)
+    yield writer.initiate()
+    jour = journaler.Journaler()
+    yield jour.configure_with(writer)
+
+    started = python_time.time()
+    pending = list()
+    for first in xrange(0, count, chunk):
+        entries = [generate_log(index)
+                   for index in xrange(first, min(first + chunk, count))]
+        pending.append(jour.insert_entries(entries))
+        if len(pending) >= 10:
+            # don't keep the whole payload in memory
+            yield defer.DeferredList(pending)
+            pending = list()
+    yield defer.DeferredList(pending)
+    elapsed = python_time.time() - started
+
+    yield jour.close()
+    defer.returnValue(elapsed)
+
+
+@defer.inlineCallbacks
+def measure(opts):
+    if opts.filename:
+        filename = opts.filename
+    else:
+        fd, filename = tempfile.mkstemp(suffix='_journal.sqlite')
+        os.close(fd)
+        os.remove(filename)
+    try:
+        elapsed = yield run(filename, opts.count, opts.chunk,
+                            opts.flush_size, opts.flush_interval)
+    finally:
+        if not opts.filename:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(filename + suffix):
+                    os.remove(filename + suffix)
+
+    print "%-10s %10s %10s %14s" % ("entries", "chunk", "time [s]",
+                                     "entries/s")
+    print "%-10d %10d %10.3f %14.1f" % (opts.count, opts.chunk, elapsed,
+                                        opts.count / elapsed)
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', dest='count', type='int', default=1000000,
+                      help='number of log entries to write '
+                      '(default: 1000000)')
+    parser.add_option('--chunk', dest='chunk', type='int', default=100,
+                      help='number of entries per insert_entries() call '
+                      '(default: 100)')
+    parser.add_option('--flush-size', dest='flush_size', type='int',
+                      help='maximum number of entries per transaction '
+                      '(default: %d)' % journaler.SqliteWriter.flush_size)
+    parser.add_option('--flush-interval', dest='flush_interval',
+                      type='float', help='seconds the writer waits for '
+                      'more entries (default: %s)'
+                      % journaler.SqliteWriter.flush_interval)
+    parser.add_option('--filename', dest='filename',
+                      help='journal file to write to (default: a new '
+                      'temporary file)')
+    opts, _ = parser.parse_args()
+
+    d = measure(opts)
+    d.addErrback(lambda f: f.printTraceback())
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+
+
+if __name__ == '__main__':
+    script()
@@ -0,0 +1,120 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Measures the cost of delivering the broadcast message to many routes of
+the routing table, with the messages copied lazily by BaseMessage.clone()
+compared to the deep copy which was used before. The allocations are the
+number of objects tracked by the garbage collector which were created
+and are held by the delivered messages.
+
+Usage: python -m feat.bench.message_clone [--routes N] [--read FRACTION]
+'''
+import copy
+import gc
+import optparse
+import time
+
+from zope.interface import implements
+
+from feat.agencies import message, recipient
+from feat.agencies.messaging import routing
+from feat.agencies.messaging.interface import ISink
+from feat.common import log
+
+
+class Sink(object):
+
+    implements(ISink)
+
+    def __init__(self, read):
+        self.read = read
+        self.messages = list()
+
+    def on_message(self, msg):
+        if self.read:
+            msg.payload
+        self.messages.append(msg)
+
+
+def deep_clone(self):
+    return copy.deepcopy(self)
+
+
+def create_message():
+    payload = dict(
+        descriptor=dict(doc_id='a' * 32, shard='shard', partners=[
+            dict(recipient=('agent%d' % x, 'shard'), role='partner')
+            for x in range(10)]),
+        resources=dict(('resource%d' % x, [x, x * 2]) for x in range(10)),
+        keywords=['keyword%d' % x for x in range(20)])
+    msg = message.Announcement(payload=payload, protocol_id='bench')
+    msg.recipient = recipient.Broadcast('bench', 'shard')
+    msg.message_id = 'message'
+    return msg
+
+
+def run(routes, read):
+    keeper = log.get_default() or log.FluLogKeeper()
+    table = routing.Table(keeper)
+    sinks = list()
+    key = ('bench', 'shard')
+    for index in range(routes):
+        sink = Sink(index < read * routes)
+        sinks.append(sink)
+        table.append_route(routing.Route(sink, key, final=False))
+
+    msg = create_message()
+    gc.collect()
+    before = len(gc.get_objects())
+    started = time.time()
+    table.dispatch(msg, outgoing=False)
+    elapsed = time.time() - started
+    allocated = len(gc.get_objects()) - before
+    return elapsed, allocated
+
+
+def compare(routes, read):
+    print "%-10s %12s %12s" % ("clone", "time [ms]", "allocations")
+    cow_clone = message.BaseMessage.clone
+    for name, method in (('deepcopy', deep_clone), ('lazy', cow_clone)):
+        message.BaseMessage.clone = method
+        try:
+            elapsed, allocated = run(routes, read)
+        finally:
+            message.BaseMessage.clone = cow_clone
+        print "%-10s %12.3f %12d" % (name, elapsed * 1000, allocated)
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--routes', dest='routes', type='int', default=1000,
+                      help='number of routes receiving the broadcast '
+                      '(default: 1000)')
+    parser.add_option('--read', dest='read', type='float', default=0.0,
+                      help='fraction of the receivers reading the payload '
+                      '(default: 0)')
+    opts, _ = parser.parse_args()
+    compare(opts.routes, opts.read)
+
+
+if __name__ == '__main__':
+    script()
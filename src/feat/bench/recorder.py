@@ -0,0 +1,137 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Measures the calls per second of a typical BaseAgent mutable method
+with and without journaling, keeping the fiber sections states in the
+frames or in the section context (fiber.stack_context). Without
+journaling the recorder enters a fiber.ContextSection instead of
+walking the frames for the state of a fiber.WovenSection.
+
+Usage: python -m feat.bench.recorder [--count N] [--depth N] [--repeat N]
+'''
+import optparse
+import time
+
+from zope.interface import implements
+
+from feat.agents.base import agent, replay
+from feat.common import fiber, log
+
+from feat.interface.agent import IAgencyAgent
+from feat.interface.journal import IRecorderNode, IJournalKeeper
+
+
+class Medium(log.Logger, log.LogProxy):
+    '''Minimal agent medium, only used as the agent's recorder node.'''
+
+    implements(IAgencyAgent, IRecorderNode, IJournalKeeper)
+
+    journal_parent = None
+
+    def __init__(self, journaling):
+        keeper = log.get_default() or log.FluLogKeeper()
+        log.Logger.__init__(self, self)
+        log.LogProxy.__init__(self, keeper)
+        self.journal_keeper = self
+        self.journaling = journaling
+
+    ### IRecorderNode Methods ###
+
+    def generate_identifier(self, recorder):
+        return ('bench-agent', 1)
+
+    ### IJournalKeeper Methods ###
+
+    def register(self, recorder):
+        pass
+
+
+class Agent(agent.BaseAgent):
+
+    @replay.mutable
+    def update(self, state, value):
+        state.value = value
+
+    @replay.mutable
+    def update_all(self, state, values):
+        # Nested mutable calls, the way agents update their state
+        # from inside an other recorded method
+        for value in values:
+            self.update(value)
+        f = fiber.succeed(values)
+        f.add_callback(len)
+        return f
+
+
+def call_nested(depth, function, *args):
+    # Simulates the frames of the reactor and the protocols
+    # above the agent code called from a reactor callback.
+    if depth > 0:
+        return call_nested(depth - 1, function, *args)
+    return function(*args)
+
+
+def run_root(agent, count, depth):
+    update = agent.update
+    started = time.time()
+    for index in xrange(count):
+        call_nested(depth, update, index)
+    return time.time() - started
+
+
+def run_nested(agent, count, depth):
+    values = range(100)
+    started = time.time()
+    for index in xrange(count // len(values)):
+        call_nested(depth, agent.update_all, values)
+    return time.time() - started
+
+
+BENCHMARKS = [('root calls', run_root),
+              ('nested calls', run_nested)]
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', dest='count', type='int', default=100000,
+                      help='number of mutable calls (default: 100000)')
+    parser.add_option('--depth', dest='depth', type='int', default=30,
+                      help='frames above the agent code (default: 30)')
+    parser.add_option('--repeat', dest='repeat', type='int', default=3,
+                      help='the best of N runs is reported (default: 3)')
+    opts, _ = parser.parse_args()
+
+    print "%-14s %-12s %-8s %10s %14s" % ("benchmark", "journaling",
+                                          "context", "time [s]", "calls/s")
+    for name, run in BENCHMARKS:
+        for journaling in (True, False):
+            for context in ('frames', 'stack'):
+                fiber.stack_context = context == 'stack'
+                bench_agent = Agent(Medium(journaling))
+                elapsed = min(run(bench_agent, opts.count, opts.depth)
+                              for _ in xrange(opts.repeat))
+                print "%-14s %-12s %-8s %10.3f %14.1f" % (
+                    name, journaling, context, elapsed, opts.count / elapsed)
+
+
+if __name__ == '__main__':
+    script()
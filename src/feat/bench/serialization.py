@@ -0,0 +1,124 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Micro-benchmark of the json, pytree and banana serializers on the
+payloads typical for the agencies: the contract announcement sent over
+the messaging and the agent descriptor stored in the database.
+
+Usage: python -m feat.bench.serialization [--count N] [--repeat N]
+'''
+import functools
+import optparse
+import time
+
+from feat.agencies import message, recipient
+from feat.agents.base import descriptor, partners
+from feat.common.serialization import json, pytree, banana
+
+
+SERIALIZERS = [
+    ('json', json.Serializer, json.Unserializer),
+    ('pytree', pytree.Serializer, pytree.Unserializer),
+    ('banana', banana.Serializer, banana.Unserializer),
+    # the way the messaging serializes the messages
+    ('tree', functools.partial(banana.Serializer, tree_mode=True),
+     banana.Unserializer),
+    ]
+
+
+def create_message():
+    payload = dict(
+        descriptor=dict(doc_id=u'a' * 32, shard=u'shard', partners=[
+            dict(recipient=('agent%d' % x, 'shard'), role='partner')
+            for x in range(10)]),
+        resources=dict(('resource%d' % x, [x, x * 2]) for x in range(10)),
+        keywords=['keyword%d' % x for x in range(20)])
+    msg = message.Announcement(payload=payload, protocol_id='bench',
+                               message_id='message', expiration_time=10.0)
+    msg.recipient = recipient.Broadcast('bench', 'shard')
+    msg.reply_to = recipient.Agent('sender', 'shard')
+    msg.traversal_id = 'traversal'
+    return msg
+
+
+def create_descriptor():
+    desc = descriptor.Descriptor(doc_id=u'a' * 32, shard=u'shard',
+                                 instance_id=3)
+    desc.partners = [
+        partners.BasePartner(recipient.Agent('agent%d' % x, 'shard'),
+                             allocation_id=x, role='partner')
+        for x in range(20)]
+    desc.resources = dict(('resource%d' % x, x) for x in range(10))
+    return desc
+
+
+PAYLOADS = [
+    ('message', create_message),
+    ('descriptor', create_descriptor),
+    ]
+
+
+def measure(function, count, repeat):
+    best = None
+    for _ in xrange(repeat):
+        started = time.time()
+        for _ in xrange(count):
+            function()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def run(count, repeat=1):
+    results = list()
+    for payload_name, factory in PAYLOADS:
+        value = factory()
+        for name, serializer_factory, unserializer_factory in SERIALIZERS:
+            serializer = serializer_factory()
+            unserializer = unserializer_factory()
+            data = serializer.convert(value)
+            convert = measure(lambda: serializer.convert(value),
+                              count, repeat)
+            restore = measure(lambda: unserializer.convert(data),
+                              count, repeat)
+            results.append((payload_name, name, convert, restore))
+    return results
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', dest='count', type='int', default=2000,
+                      help='number of conversions per measurement '
+                      '(default: 2000)')
+    parser.add_option('--repeat', dest='repeat', type='int', default=3,
+                      help='number of measurements, the best one is '
+                      'reported (default: 3)')
+    opts, _ = parser.parse_args()
+
+    print "%-12s %-8s %14s %14s" % ("payload", "format", "serialize/s",
+                                     "unserialize/s")
+    for payload, name, convert, restore in run(opts.count, opts.repeat):
+        print "%-12s %-8s %14.1f %14.1f" % (payload, name, convert, restore)
+
+
+if __name__ == '__main__':
+    script()
@@ -0,0 +1,422 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Benchmark suite of the hot paths of an agency. All the benchmarks run in
+a single process against the emulated database and messaging, no
+external service is needed. The results are written as json, one entry
+per benchmark, so that the runs can be compared between revisions.
+
+Usage: python -m feat.bench.suite [--count N] [--only NAME[,NAME]]
+                                  [--output FILE] [--list]
+'''
+import json
+import optparse
+import os
+import platform
+import sys
+import tempfile
+import time as python_time
+
+from twisted.internet import reactor
+from zope.interface import implements
+
+from feat.agencies import journaler, message, recipient
+from feat.agencies.messaging import routing
+from feat.agents.base import (agent, contractor, descriptor, manager,
+                              replay, )
+from feat.agents.application import feat
+from feat.bench import common
+from feat.bench.journaler import generate_log
+from feat.bench.serialization import PAYLOADS, SERIALIZERS
+from feat.common import defer, log, serialization
+from feat.database import document, emu, query, view
+from feat.models import applicationjson # registers the json writers
+from feat.web import document as web_document
+
+from feat.agencies.messaging.interface import ISink
+from feat.models.interface import IContext
+from feat.interface.protocols import InterestType
+
+
+### routing ###
+
+
+class CountingSink(object):
+
+    implements(ISink)
+
+    def __init__(self):
+        self.received = 0
+
+    def on_message(self, message):
+        self.received += 1
+
+
+def bench_routing(count, routes=1000):
+    logger = log.get_default() or log.FluLogKeeper()
+    table = routing.Table(logger)
+    sink = CountingSink()
+    messages = list()
+    for index in xrange(routes):
+        key = ('agent%d' % (index, ), 'shard')
+        table.append_route(routing.Route(sink, key=key))
+        msg = message.Notification(payload=index)
+        msg.recipient = recipient.Agent(*key)
+        messages.append(msg)
+    iterator = iter(messages * (count // routes + 1))
+    dispatch = table.dispatch
+    return common.measure('routing.dispatch',
+                          lambda: dispatch(iterator.next()),
+                          count, routes=routes)
+
+
+### serialization ###
+
+
+def bench_serializers(count):
+    results = list()
+    for payload_name, factory in PAYLOADS:
+        value = factory()
+        for name, serializer_factory, unserializer_factory in SERIALIZERS:
+            serializer = serializer_factory()
+            unserializer = unserializer_factory()
+
+            def round_trip():
+                unserializer.convert(serializer.convert(value))
+
+            results.append(common.measure(
+                'serialization.%s' % (name, ), round_trip, count,
+                payload=payload_name))
+    return results
+
+
+### database queries ###
+
+
+@serialization.register
+class BenchDocument(document.Document):
+
+    type_name = 'bench_document'
+
+    document.field('field1', None)
+    document.field('field2', None)
+
+
+class BenchView(view.BaseView):
+
+    name = 'bench'
+
+    def map(doc):
+        if doc.get('.type') == 'bench_document':
+            for attr in ('field1', 'field2'):
+                yield (attr, doc.get(attr)), None
+
+
+class BenchQuery(query.Query):
+
+    name = 'bench'
+
+    query.field(query.Field('field1', BenchView, keeps_value=True))
+    query.field(query.Field('field2', BenchView))
+
+
+@defer.inlineCallbacks
+def bench_query(count, documents=10000, limit=20):
+    connection = emu.Database().get_connection()
+    design_doc = view.DesignDocument.generate_from_views((BenchView, ))[0]
+    yield connection.save_document(design_doc)
+    for index in xrange(documents):
+        yield connection.save_document(
+            BenchDocument(field1=index, field2=index % 100))
+
+    C, E = query.Condition, query.Evaluator
+    conditions = [C('field2', E.equals, index % 100)
+                  for index in xrange(count)]
+    iterator = iter(conditions)
+
+    def select():
+        q = BenchQuery(iterator.next(),
+                       sorting=('field1', query.Direction.DESC))
+        return query.select(connection, q, limit=limit)
+
+    result = yield common.measure_deferred('database.query.select', select,
+                                           count, documents=documents,
+                                           limit=limit)
+    defer.returnValue(result)
+
+
+### journaler ###
+
+
+@defer.inlineCallbacks
+def bench_journaler(count, chunk=100, concurrency=10):
+    fd, filename = tempfile.mkstemp(suffix='_journal.sqlite')
+    os.close(fd)
+    os.remove(filename)
+    keeper = log.get_default() or log.FluLogKeeper()
+    writer = journaler.SqliteWriter(keeper, filename=filename,
+                                              encoding='zip')
+    jour = journaler.Journaler()
+    try:
+        yield writer.initiate()
+        yield jour.configure_with(writer)
+        entries = [generate_log(index) for index in xrange(chunk)]
+        result = yield common.measure_deferred(
+            'journaler.insert_entries',
+            lambda: jour.insert_entries(list(entries)),
+            count, concurrency=concurrency, chunk=chunk)
+    finally:
+        yield jour.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(filename + suffix):
+                os.remove(filename + suffix)
+    # the journal is measured in entries, not in calls
+    result['throughput'] *= chunk
+    defer.returnValue(result)
+
+
+### gateway ###
+
+
+class ResourceSource(object):
+
+    def __init__(self, classes):
+        self.usage = dict()
+        for index in xrange(classes):
+            if index % 2:
+                self.usage['range%d' % (index, )] = (
+                    'range_def', [1000, 2000],
+                    range(1000, 1000 + index), [2000 - index])
+            else:
+                self.usage['scalar%d' % (index, )] = (
+                    'scalar_def', 1000, index, index // 2)
+
+    def get_resource_usage(self):
+        return dict(self.usage)
+
+
+class BenchContext(object):
+
+    implements(IContext)
+
+    def __init__(self, models=None, names=None):
+        self.names = tuple(names) if names is not None else ()
+        self.models = tuple(models) if models is not None else ()
+        self.remaining = ()
+
+    def make_action_address(self, action):
+        return self.make_model_address(self.names + ("_" + action.name, ))
+
+    def make_model_address(self, location):
+        return "/".join(location)
+
+    def descend(self, model):
+        return BenchContext(models=self.models + (model, ),
+                            names=self.names + (model.name, ))
+
+
+@defer.inlineCallbacks
+def bench_gateway(count, classes=50, format='verbose'):
+    # imported here, the gateway needs the dependencies of the agencies
+    # networking which are not required by the rest of the suite
+    from feat.gateway import models
+
+    source = ResourceSource(classes)
+    model = yield models.Resources(source).initiate()
+    context = BenchContext(("ROOT", ), ("root", ))
+
+    def render():
+        doc = web_document.WritableDocument("application/json",
+                                            encoding='utf-8')
+        d = web_document.write(doc, model, context=context, format=format)
+        return d.addCallback(lambda _: doc.get_data())
+
+    # make sure the model is actually rendered
+    data = yield render()
+    json.loads(data)
+
+    result = yield common.measure_deferred(
+        'gateway.render', render, count, classes=classes, format=format,
+        size=len(data))
+    defer.returnValue(result)
+
+
+### contracts ###
+
+
+@feat.register_descriptor("bench_agent")
+class Descriptor(descriptor.Descriptor):
+    pass
+
+
+@feat.register_agent("bench_agent")
+class BenchAgent(agent.BaseAgent):
+
+    need_local_monitoring = False
+
+    @replay.mutable
+    def initiate(self, state):
+        state.medium.register_interest(BenchContractor)
+
+    @replay.immutable
+    def start_contract(self, state, recipients):
+        return state.medium.initiate_protocol(BenchManager, recipients)
+
+
+class BenchContractor(contractor.BaseContractor):
+
+    protocol_id = 'bench-contract'
+    interest_type = InterestType.private
+
+    @replay.immutable
+    def announced(self, state, announcement):
+        state.medium.bid(message.Bid(payload=announcement.payload))
+
+    @replay.immutable
+    def granted(self, state, grant):
+        state.medium.complete(message.FinalReport(payload=grant.payload))
+
+
+class BenchManager(manager.BaseManager):
+
+    protocol_id = 'bench-contract'
+
+    @replay.mutable
+    def initiate(self, state):
+        state.bids = list()
+        state.medium.announce(message.Announcement(payload='bench'))
+
+    @replay.mutable
+    def bid(self, state, bid):
+        state.bids.append(bid)
+
+    @replay.mutable
+    def closed(self, state):
+        grants = [(bid, message.Grant(payload=bid.payload))
+                  for bid in state.bids]
+        state.medium.grant(grants)
+
+    @replay.immutable
+    def completed(self, state, reports):
+        pass
+
+
+@defer.inlineCallbacks
+def bench_contracts(count, contractors=5):
+    # imported here, the driver loads the whole feat application
+    from feat.simulation import driver
+
+    drv = driver.Driver()
+    yield drv.initiate()
+    agency = yield drv.spawn_agency(start_host=False)
+    agents = list()
+    for _ in xrange(contractors + 1):
+        desc = yield drv.descriptor_factory('bench_agent')
+        medium = yield agency.start_agent(desc)
+        agents.append(medium.get_agent())
+    owner = agents[0]
+    recipients = [a.get_own_address() for a in agents[1:]]
+
+    def negotiate():
+        return owner.start_contract(recipients).notify_finish()
+
+    try:
+        result = yield common.measure_deferred(
+            'contracts.round', negotiate, count, contractors=contractors)
+    finally:
+        yield drv.destroy()
+    defer.returnValue(result)
+
+
+BENCHMARKS = [
+    ('routing', bench_routing, 1),
+    ('serialization', bench_serializers, 1),
+    ('query', bench_query, 0.1),
+    ('journaler', bench_journaler, 0.1),
+    ('gateway', bench_gateway, 0.1),
+    ('contracts', bench_contracts, 0.01),
+    ]
+
+
+@defer.inlineCallbacks
+def run(count, only=None):
+    results = list()
+    for name, function, scale in BENCHMARKS:
+        if only and name not in only:
+            continue
+        d = defer.maybeDeferred(function, max(int(count * scale), 1))
+        d.addErrback(common.error, name)
+        result = yield d
+        if isinstance(result, list):
+            results.extend(result)
+        else:
+            results.append(result)
+    defer.returnValue(results)
+
+
+def report(results, output):
+    document = dict(version=1,
+                    timestamp=python_time.time(),
+                    python=sys.version.split()[0],
+                    platform=platform.platform(),
+                    results=results)
+    json.dump(document, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', dest='count', type='int', default=10000,
+                      help='number of operations of the fast benchmarks, '
+                      'the slower ones do a fraction of it (default: 10000)')
+    parser.add_option('--only', dest='only',
+                      help='comma separated names of the benchmarks to run')
+    parser.add_option('--output', dest='output',
+                      help='file to write the json results to '
+                      '(default: standard output)')
+    parser.add_option('--list', dest='list', action='store_true',
+                      default=False, help='list the benchmarks and exit')
+    opts, _ = parser.parse_args()
+
+    if opts.list:
+        for name, _, _ in BENCHMARKS:
+            print name
+        return
+
+    only = opts.only and opts.only.split(',')
+
+    def write(results):
+        if opts.output:
+            with open(opts.output, 'w') as output:
+                report(results, output)
+        else:
+            report(results, sys.stdout)
+
+    d = run(opts.count, only)
+    d.addCallback(write)
+    d.addErrback(lambda f: f.printTraceback())
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+
+
+if __name__ == '__main__':
+    script()
@@ -0,0 +1,93 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+'''
+Compares the cost of scheduling and cancelling the protocol timeouts on
+the reactor (reactor.callLater) and on the timer wheel used by
+feat.common.time.call_timeout(). The timeouts are cancelled in random
+order while other timeouts are pending, the way the contracts and the
+requests cancel them when they finish.
+
+Usage: python -m feat.bench.timers [--count N] [--repeat N]
+'''
+import optparse
+import random
+import time
+
+from twisted.internet import reactor
+
+from feat.common import time as feat_time
+
+
+def noop():
+    pass
+
+
+def measure(call_later, count, repeat):
+    delays = [random.uniform(30, 300) for _ in xrange(count)]
+    order = range(count)
+    random.shuffle(order)
+    best_schedule, best_cancel = None, None
+    for _ in xrange(repeat):
+        # the reactor inserts the new calls in its heap and removes
+        # the cancelled ones only when it runs them
+        started = time.time()
+        calls = [call_later(delay, noop) for delay in delays]
+        reactor.runUntilCurrent()
+        scheduled = time.time()
+        for index in order:
+            calls[index].cancel()
+        reactor.runUntilCurrent()
+        finished = time.time()
+        schedule = scheduled - started
+        cancel = finished - scheduled
+        best_schedule = min(best_schedule or schedule, schedule)
+        best_cancel = min(best_cancel or cancel, cancel)
+    return count / best_schedule, count / best_cancel
+
+
+def run(count, repeat=1):
+    wheel = feat_time.TimerWheel(feat_time.TIMEOUT_RESOLUTION)
+    results = list()
+    for name, call_later in [('reactor', reactor.callLater),
+                             ('wheel', wheel.call_later)]:
+        schedule, cancel = measure(call_later, count, repeat)
+        results.append((name, schedule, cancel))
+    return results
+
+
+def script():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', dest='count', type='int', default=100000,
+                      help='number of timeouts pending at the same time '
+                      '(default: 100000)')
+    parser.add_option('--repeat', dest='repeat', type='int', default=3,
+                      help='number of measurements, the best one is '
+                      'reported (default: 3)')
+    opts, _ = parser.parse_args()
+
+    print "%-10s %14s %14s" % ("timers", "schedule/s", "cancel/s")
+    for name, schedule, cancel in run(opts.count, opts.repeat):
+        print "%-10s %14.1f %14.1f" % (name, schedule, cancel)
+
+
+if __name__ == '__main__':
+    script()
@@ -33,6 +33,7 @@ __all__ = ("MroDict", "MroList", "MroDictOfList",
            "Empty", "ExpDict", "ExpQueue")
 
 PRECISION = 1e3
+INFINITY = float("inf")
 MAX_LAZY_PACK_PER_SECOND = 1
 
 
@@ -363,9 +364,9 @@ class RunningAverage(object):
 @serialization.register
 class ExpDict(ExpBase):
     """
-    @warning: Getting the length, and therefore construct like
-              "if exp_dict: ..." or "bool(exp_dict)",
-              will iterate over all elements.
+    The expiration times are indexed in a heap kept alongside the items,
+    so only the entries which actually expired are visited when getting
+    the length or packing the dictionary.
     @warning: Comparison operations are very expensive.
     """
 
@@ -376,7 +377,8 @@ class ExpDict(ExpBase):
     classProvides(serialization.IRestorator)
     implements(serialization.ISerializable)
 
-    __slots__ = ("_time", "_items", "_max_size", "_last_pack")
+    __slots__ = ("_time", "_items", "_max_size", "_last_pack",
+                 "_heap", "_expired", "_seq")
 
     def __init__(self, time_provider, max_size=None):
         """Create an expiration dictionary.
@@ -388,10 +390,12 @@ class ExpDict(ExpBase):
         self._items = {} # {KEY: ExpItem(TIME, VALUE)}
         self._max_size = RunningAverage(max_size or self.DEFAULT_MAX_SIZE)
         self._last_pack = 0
+        self._reset_index()
 
     def clear(self):
         """Removes all items from the dictionary."""
         self._items.clear()
+        self._reset_index()
 
     def pack(self):
         """Packs the dictionary by removing all expired items."""
@@ -416,7 +420,7 @@ class ExpDict(ExpBase):
                 expiration = now + expiration
             if expiration <= now:
                 return
-        self._items[key] = ExpItem(expiration, value)
+        self._put(key, ExpItem(expiration, value))
 
     def remove(self, key):
         """Removes the dictionary entry with with specified key .
@@ -427,7 +431,7 @@ class ExpDict(ExpBase):
         self._lazy_pack()
         now = self._time.get_time()
         if self._items:
-            item = self._items.pop(key)
+            item = self._pop_item(key)
             if item.exp is None or item.exp > now:
                 return item.value
         raise KeyError(key)
@@ -442,7 +446,7 @@ class ExpDict(ExpBase):
         now = self._time.get_time()
         if self._items:
             try:
-                item = self._items.pop(key)
+                item = self._pop_item(key)
                 if item.exp is None or item.exp > now:
                     return item.value
                 raise KeyError(key)
@@ -473,7 +477,7 @@ class ExpDict(ExpBase):
         """Returns an iterator over the dictionary keys."""
         self._lazy_pack()
         now = self._time.get_time()
-        for key, item in self._items.iteritems():
+        for key, item in self._items.items():
             if item.exp is None or item.exp > now:
                 yield key
                 now = self._time.get_time()
@@ -482,7 +486,7 @@ class ExpDict(ExpBase):
         """Returns an iterator over the dictionary values."""
         self._lazy_pack()
         now = self._time.get_time()
-        for item in self._items.itervalues():
+        for item in self._items.values():
             if item.exp is None or item.exp > now:
                 yield item.value
                 now = self._time.get_time()
@@ -497,7 +501,7 @@ class ExpDict(ExpBase):
         """Returns an iterator over tuples (key, value)."""
         self._lazy_pack()
         now = self._time.get_time()
-        for key, item in self._items.iteritems():
+        for key, item in self._items.items():
             if item.exp is None or item.exp > now:
                 yield key, item.value
                 now = self._time.get_time()
@@ -508,7 +512,7 @@ class ExpDict(ExpBase):
 
     def __setitem__(self, key, value):
         self._lazy_pack()
-        self._items[key] = ExpItem(None, value)
+        self._put(key, ExpItem(None, value))
 
     def __getitem__(self, key):
         item = self._get_item(key)
@@ -519,7 +523,7 @@ class ExpDict(ExpBase):
     def __delitem__(self, key):
         item = self._get_item(key)
         if item is not None:
-            del self._items[key]
+            self._pop_item(key)
             return
         raise KeyError(key)
 
@@ -530,9 +534,8 @@ class ExpDict(ExpBase):
         return self.iterkeys()
 
     def __len__(self):
-        now = self._time.get_time()
-        return len([i for i in self._items.itervalues()
-                    if i.exp is None or i.exp > now])
+        self._expire(self._time.get_time())
+        return len(self._items) - len(self._expired)
 
     def __eq__(self, other):
         if not issubclass(type(other), type(self)):
@@ -568,6 +571,8 @@ class ExpDict(ExpBase):
         self._items = dict([(k, ExpItem.restore(s))
                             for k, s in data.iteritems()])
         self._last_pack = 0
+        self._reset_index()
+        self._reindex()
 
     ### Private Methods ###
 
@@ -579,8 +584,10 @@ class ExpDict(ExpBase):
                 self._pack(now)
 
     def _pack(self, now):
-        self._items = dict([(k, i) for k, i in self._items.iteritems()
-                            if i.exp is None or i.exp > now])
+        self._expire(now)
+        for key in self._expired:
+            del self._items[key]
+        self._expired.clear()
         self._last_pack = now
         self._max_size.add_point(len(self._items))
 
@@ -591,16 +598,56 @@ class ExpDict(ExpBase):
         if item is not None:
             if item.exp is None or item.exp > now:
                 return item
-            del self._items[key]
+            self._pop_item(key)
         return None
 
+    def _put(self, key, item):
+        self._items[key] = item
+        self._expired.discard(key)
+        if item.exp is not None:
+            self._seq += 1
+            heapq.heappush(self._heap, (item.exp, self._seq, key, item))
+            # The entries of removed or replaced items are only skipped
+            # when they reach the top of the heap, drop them if they
+            # become the majority.
+            if len(self._heap) > 2 * len(self._items):
+                self._reindex()
+
+    def _pop_item(self, key):
+        item = self._items.pop(key)
+        self._expired.discard(key)
+        return item
+
+    def _expire(self, now):
+        # Moves the keys of the items expired at the specified time
+        # from the heap to the set of expired keys.
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _exp, _seq, key, item = heapq.heappop(heap)
+            if self._items.get(key) is item:
+                self._expired.add(key)
+
+    def _reset_index(self):
+        self._heap = [] # [(TIME, SEQ, KEY, ExpItem(TIME, VALUE))]
+        self._expired = set() # set([KEY])
+        self._seq = 0
+
+    def _reindex(self):
+        heap = []
+        for key, item in self._items.iteritems():
+            if item.exp is not None and key not in self._expired:
+                heap.append((item.exp, len(heap), key, item))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._seq = len(heap)
+
 
 @serialization.register
 class ExpQueue(ExpBase):
     """
-    @warning: Getting the length, and therefore constructs like
-              "if exp_dict: ..." or "bool(exp_dict)"
-              will iterate over all elements.
+    The values which expired are moved out of the heap as soon as they
+    are found at its top, so getting the length or packing the queue only
+    visits the values which actually expired.
     @warning: Comparison operations are very expensive.
     """
 
@@ -611,7 +658,8 @@ class ExpQueue(ExpBase):
     classProvides(serialization.IRestorator)
     implements(serialization.ISerializable)
 
-    __slots__ = ("_time", "_heap", "_max_size", "_last_pack")
+    __slots__ = ("_time", "_heap", "_expired", "_seq",
+                 "_max_size", "_last_pack", "_on_expire")
 
     def __init__(self, time_provider, max_size=None, on_expire=None):
         """Create an expiration queue.
@@ -620,7 +668,9 @@ class ExpQueue(ExpBase):
         @param max_size: maximum size before forced packing
         @type max_size: int"""
         self._time = ITimeProvider(time_provider)
-        self._heap = []
+        self._heap = [] # [(TIME, SEQ, ExpItem(TIME, VALUE))]
+        self._expired = [] # [ExpItem(TIME, VALUE)]
+        self._seq = 0
         self._max_size = RunningAverage(max_size or self.DEFAULT_MAX_SIZE)
         self._last_pack = 0
         self._on_expire = on_expire
@@ -632,6 +682,7 @@ class ExpQueue(ExpBase):
     def clear(self):
         """Removes all the values from the queue."""
         self._heap = []
+        self._expired = []
 
     def add(self, value, expiration=None, relative=False):
         """Adds an entry to the queue with specified expiration and value.
@@ -644,58 +695,52 @@ class ExpQueue(ExpBase):
         @type relative: bool
         @return: nothing"""
         self._lazy_pack()
-        now = self._time.get_time()
         if expiration is not None:
             now = self._time.get_time()
             if relative:
                 expiration = now + expiration
             if expiration <= now:
                 return
-        heapq.heappush(self._heap, ExpItem(expiration, value))
+        self._push(ExpItem(expiration, value))
 
     def pop(self):
         """Pops and returns the value with the smaller expiration.
         @returns: value
         @rtype: any python structure or L{ISerializable}"""
         self._lazy_pack()
-        now = self._time.get_time()
-        while True:
-            try:
-                item = heapq.heappop(self._heap)
-                if item.exp is None or item.exp > now:
-                    return item.value
-                elif callable(self._on_expire):
-                    self._on_expire(item.value)
-            except IndexError:
-                raise Empty(), None, sys.exc_info()[2]
+        self._discard(self._time.get_time())
+        try:
+            _exp, _seq, item = heapq.heappop(self._heap)
+            return item.value
+        except IndexError:
+            raise Empty(), None, sys.exc_info()[2]
 
     def size(self):
         """Returns the current size counting expired values."""
-        return len(self._heap)
+        return len(self._heap) + len(self._expired)
 
     def __iter__(self):
         """Returns an iterator over queue's values."""
         self._lazy_pack()
         now = self._time.get_time()
-        for item in iter(self._heap):
+        for _exp, _seq, item in self._heap[:]:
             if item.exp is None or item.exp > now:
                 yield item.value
                 now = self._time.get_time()
 
     def __len__(self):
-        now = self._time.get_time()
-        return len([i for i in self._heap
-                    if i.exp is None or i.exp > now])
+        self._expire(self._time.get_time())
+        return len(self._heap)
 
     def __eq__(self, other):
         if not issubclass(type(other), type(self)):
             return NotImplemented
         now = self._time.get_time()
         a = [(i.pri, i.value)
-             for i in self._heap
+             for _e, _s, i in self._heap
              if i.exp is None or i.exp > now]
         b = [(i.pri, i.value)
-             for i in other._heap
+             for _e, _s, i in other._heap
              if i.exp is None or i.exp > now]
         a.sort()
         b.sort()
@@ -710,35 +755,53 @@ class ExpQueue(ExpBase):
     def snapshot(self):
         now = self._time.get_time()
         return self._time, [i.snapshot()
-                            for i in self._heap
+                            for _e, _s, i in self._heap
                             if i.exp is None or i.exp > now]
 
     def recover(self, snapshot):
         self._time, data = snapshot
-        self._heap = [ExpItem.restore(d) for d in data]
+        self._heap = []
+        self._expired = []
+        self._seq = 0
+        for d in data:
+            self._push(ExpItem.restore(d))
+        self._max_size = RunningAverage(self.DEFAULT_MAX_SIZE)
         self._last_pack = 0
+        self._on_expire = None
 
     ### Private Methods ###
 
     def _lazy_pack(self):
-        if len(self._heap) > self._max_size.get_value() * 1.25:
+        if self.size() > self._max_size.get_value() * 1.25:
             now = self._time.get_time()
             # Regulate lazy packing rate
             if (now - self._last_pack) >= (1.0 / MAX_LAZY_PACK_PER_SECOND):
                 self._pack(now)
 
     def _pack(self, now):
-        new_heap = []
-        for i in self._heap:
-            if i.exp is None or i.exp > now:
-                new_heap.append(i)
-            elif callable(self._on_expire):
-                self._on_expire(i.value)
-
-        heapq.heapify(new_heap)
-        self._heap = new_heap
+        self._discard(now)
         self._last_pack = now
-        self._max_size.add_point(len(new_heap))
+        self._max_size.add_point(len(self._heap))
+
+    def _push(self, item):
+        # Values without expiration go last, the sequence number keeps
+        # the values expiring at the same time in insertion order.
+        self._seq += 1
+        exp = INFINITY if item.exp is None else item.exp
+        heapq.heappush(self._heap, (exp, self._seq, item))
+
+    def _expire(self, now):
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _exp, _seq, item = heapq.heappop(heap)
+            self._expired.append(item)
+
+    def _discard(self, now):
+        self._expire(now)
+        expired, self._expired = self._expired, []
+        if callable(self._on_expire):
+            for item in expired:
+                self._on_expire(item.value)
 
 
 class AsyncDict(object):
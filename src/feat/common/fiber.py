@@ -21,6 +21,7 @@
 # Headers in this file shall remain intact.
 import os
 import sys
+import threading
 import uuid
 import warnings
 import traceback
@@ -40,6 +41,7 @@ from feat.interface.serialization import ISnapshotable
 
 SECTION_STATE_TAG = "__fiber_section_dict__"
 SECTION_BOUNDARY_TAG = "__section_boundary__"
+SECTION_CONTEXT_TAG = "__section_context__"
 
 
 def drop_result(_result, _method, *args, **kwargs):
@@ -202,6 +204,12 @@ trace_fiber_calls = os.environ.get("FEAT_TRACE_FIBERS", "NO").upper() \
 debug_fibers = os.environ.get("FEAT_DEBUG_FIBERS", "NO").upper() \
                in ("YES", "1", "TRUE")
 
+# If enabled the woven sections keep their state only in the thread-local
+# section context instead of the frames of the functions calling them.
+# Should only be changed when no woven section is active.
+stack_context = os.environ.get("FEAT_STACK_FIBER_CONTEXT", "NO").upper() \
+                in ("YES", "1", "TRUE")
+
 
 @decorator.simple_function
 def woven(fun):
@@ -210,7 +218,11 @@ def woven(fun):
     def wrapper(*args, **kwargs):
         section = WovenSection()
         section.enter()
-        result = fun(*args, **kwargs)
+        try:
+            result = fun(*args, **kwargs)
+        except:
+            section.abort()
+            raise
         return section.exit(result)
 
     return wrapper
@@ -255,6 +267,10 @@ def set_stack_var(name, value, depth=0):
 
 
 def get_state(depth=0):
+    if stack_context:
+        state = get_context_state()
+        if state is not None:
+            return state
     return get_stack_var(SECTION_STATE_TAG, depth=depth+1)
 
 
@@ -263,9 +279,19 @@ def set_state(state, depth=0):
 
 
 def break_fiber(depth=0):
-    """After calling break_fiber, get_state() will return None."""
+    """After calling break_fiber, get_state() will return None.
+    Returns the level of the section context to pass to restore_fiber()
+    once the calling function is done."""
     set_stack_var(SECTION_BOUNDARY_TAG, True, depth=depth+1)
     set_stack_var(SECTION_STATE_TAG, None, depth=depth+1)
+    states = _context.states
+    states.append(None)
+    return len(states) - 1
+
+
+def restore_fiber(level):
+    """Removes the section context boundary added by break_fiber()."""
+    del _context.states[level:]
 
 
 def del_state(depth=0):
@@ -279,6 +305,29 @@ def del_state(depth=0):
         del locals[SECTION_STATE_TAG]
 
 
+def get_context_state():
+    '''Returns the state of the innermost woven section entered
+    in the current thread or None. Contrary to get_state() it does not
+    walk the frames, so the side-effect boundaries are not honoured.'''
+    states = _context.states
+    if states:
+        return states[-1]
+    return None
+
+
+def _get_context_root():
+    # Only the states of a ContextSection are trusted, the other ones
+    # are only reachable through the frames; if the frames do not know
+    # about them any more they belong to sections that were never exited.
+    states = _context.states
+    while states and states[-1] is not None \
+          and SECTION_CONTEXT_TAG not in states[-1]:
+        states.pop()
+    if states:
+        return states[-1]
+    return None
+
+
 def _get_base_frame(depth):
     # Go up the frame stack to the base frame given it's deepness.
     # Go up one level more to account for this function own frame.
@@ -291,29 +340,54 @@ def _get_base_frame(depth):
     return base_frame
 
 
+class SectionContext(threading.local):
+    '''Stack of the states of the woven sections entered in a thread.'''
+
+    def __init__(self):
+        self.states = []
+
+
+_context = SectionContext()
+
+
 class WovenSection(object):
     '''Handles fiber-aware sections.'''
 
+    # Values added to the state of the sections using the section context
+    _context_tags = {}
+
     def __init__(self, descriptor=None):
         self.descriptor = descriptor
         self.state = None
         self._is_root = True
         self._inside = False
+        self._level = None
+        self._framed = False
 
     def enter(self):
         if self._inside:
             raise FiberError("Already inside a woven section")
         self._inside = True
 
+        if stack_context:
+            self._enter_context()
+            return
+
+        self._framed = True
+
         if self.descriptor is None:
             # Use a depth of 1 because we want the state to be
             # in the calling function not in the method.
             state = get_state(depth=1)
+            if state is None:
+                # Maybe called from inside a section not using the frames
+                state = _get_context_root()
             if state is not None:
                 # We are in a sub-section, just update the state
                 self.state = state
                 self.descriptor = state["descriptor"]
                 self._is_root = False
+                self._push_context(state)
                 return
             # First woven section, we create an
             # and remember to start the fibers.
@@ -322,6 +396,7 @@ class WovenSection(object):
         state = {"descriptor": self.descriptor}
         set_state(state, depth=1)
         self.state = state
+        self._push_context(state)
 
     def abort(self, result=None):
         self._cleanup()
@@ -349,15 +424,59 @@ class WovenSection(object):
 
     ### Private Methods ###
 
+    def _enter_context(self):
+        if self.descriptor is None:
+            state = get_context_state()
+            if state is not None:
+                # We are in a sub-section, just update the state
+                self.state = state
+                self.descriptor = state["descriptor"]
+                self._is_root = False
+                return
+            self.descriptor = RootFiberDescriptor()
+
+        state = dict(self._context_tags)
+        state["descriptor"] = self.descriptor
+        self.state = state
+        self._push_context(state)
+
+    def _push_context(self, state):
+        states = _context.states
+        self._level = len(states)
+        states.append(state)
+
+    def _pop_context(self):
+        # Drops the states of the sub-sections never exited too
+        del _context.states[self._level:]
+        self._level = None
+
     def _cleanup(self):
         if not self._inside:
             raise FiberError("Not inside a woven section")
         self._inside = False
         self.state = None
-        if self._is_root:
+        if self._level is not None:
+            self._pop_context()
+        if self._is_root and self._framed:
             del_state(depth=1)
 
 
+class ContextSection(WovenSection):
+    '''Fiber-aware section looking up the enclosing sections in the
+    thread-local section context instead of walking the frames.
+    Sections nested inside it do not need to be a ContextSection,
+    but it can only be used where no side-effect boundary is expected,
+    like when nothing is journaled.'''
+
+    _context_tags = {SECTION_CONTEXT_TAG: True}
+
+    def enter(self):
+        if self._inside:
+            raise FiberError("Already inside a woven section")
+        self._inside = True
+        self._enter_context()
+
+
 class RootFiberDescriptor(object):
     '''Root fiber descriptor created when get_descriptor()returns None.'''
 
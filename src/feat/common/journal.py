@@ -83,11 +83,12 @@ def replay(journal_entry, function, *args, **kwargs):
         section.state[RECMODE_TAG] = JournalMode.replay
         section.state[JOURNAL_ENTRY_TAG] = IJournalReplayEntry(journal_entry)
 
-    result = function(*args, **kwargs)
-
-    # We don't want anything asynchronous to be called,
-    # so we abort the fiber section
-    section.abort(result)
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        # We don't want anything asynchronous to be called,
+        # so we abort the fiber section
+        section.abort()
     # side effects are returned in sake of making sure that
     # all the side effects expected have been consumed (called)
     return result
@@ -149,6 +150,12 @@ def _check_side_effet_result(result, info):
 
 
 def _side_effect_wrapper(callable, args, kwargs, name):
+    section_state = fiber.get_context_state()
+
+    if section_state is None or fiber.SECTION_CONTEXT_TAG in section_state:
+        # Not in a woven section or in one where nothing is journaled
+        return _check_side_effet_result(callable(*args, **kwargs), name)
+
     section_state = fiber.get_state()
 
     if section_state is not None:
@@ -168,7 +175,7 @@ def _side_effect_wrapper(callable, args, kwargs, name):
             # Keep it in the replayable section state
             section_state[SIDE_EFFECT_TAG] = effect
             # Break the fiber to allow new replayable sections
-            fiber.break_fiber()
+            level = fiber.break_fiber()
             # Keep the side-effect entry to detect we are in one
             fiber.set_stack_var(SIDE_EFFECT_TAG, effect)
             try:
@@ -183,6 +190,8 @@ def _side_effect_wrapper(callable, args, kwargs, name):
                                        "Exception raised by side-effect %s",
                                        reflect.canonical_name(callable))
                 raise
+            finally:
+                fiber.restore_fiber(level)
 
     # Not in a replayable section, maybe in another side-effect
     return _check_side_effet_result(callable(*args, **kwargs), name)
@@ -329,8 +338,12 @@ class Recorder(RecorderNode, annotate.Annotable):
             return fiber.fail(e)
 
     def _recorded_call(self, fun_id, function, args, kwargs, reentrant=True):
-        # Starts the fiber section
-        section = fiber.WovenSection()
+        # Starts the fiber section, if the journal keeper is not journaling
+        # the section does not need to look for side-effect boundaries
+        if getattr(self.journal_keeper, "journaling", True):
+            section = fiber.WovenSection()
+        else:
+            section = fiber.ContextSection()
         section.enter()
         fibdesc = section.descriptor
 
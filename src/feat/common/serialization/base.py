@@ -25,7 +25,7 @@ import copy
 import sys
 import types
 
-from zope.interface import implements
+from zope.interface import implements, providedBy
 from zope.interface.interface import InterfaceClass
 
 from feat.common import decorator, enum, adapter, reflect, registry
@@ -395,7 +395,7 @@ class Serializer(object):
 
     def __init__(self, converter_caps=None, freezer_caps=None,
                  post_converter=None, externalizer=None, registry=None,
-                 source_ver=None, target_ver=None):
+                 source_ver=None, target_ver=None, tree_mode=False):
         global _global_registry
         assert ((source_ver is None) and (target_ver is None)) \
                or ((source_ver is not None) and (target_ver is not None))
@@ -406,6 +406,11 @@ class Serializer(object):
         self._registry = IRegistry(registry) if registry else _global_registry
         self._source_ver = source_ver
         self._target_ver = target_ver
+        # If the values are expected to be acyclic and without shared
+        # references, first try to flatten them without the bookkeeping
+        self.tree_mode = tree_mode
+        self._value_plans = {} # {(TYPE, FREEZING): PLAN}
+        self._key_plans = {} # {(TYPE, FREEZING): PLAN}
         self.reset()
 
     ### IFreezer ###
@@ -439,12 +444,26 @@ class Serializer(object):
 
     def flatten_value(self, value, caps, freezing):
         vtype = type(value)
+        own_caps = (self.freezer_capabilities if freezing
+                    else self.converter_capabilities)
+        if caps is own_caps:
+            plan = self._value_plans.get((vtype, freezing))
+            if plan is None:
+                plan = self._compile_value_plan(vtype, caps, freezing)
+            return plan(value, caps, freezing)
         default = Serializer.flatten_unknown_value
         flattener = self._value_lookup.get(vtype, default)
         return flattener(self, value, caps, freezing)
 
     def flatten_key(self, key, caps, freezing):
         vtype = type(key)
+        own_caps = (self.freezer_capabilities if freezing
+                    else self.converter_capabilities)
+        if caps is own_caps:
+            plan = self._key_plans.get((vtype, freezing))
+            if plan is None:
+                plan = self._compile_key_plan(vtype, caps, freezing)
+            return plan(key, caps, freezing)
         default = Serializer.flatten_unknown_key
         flattener = self._key_lookup.get(vtype, default)
         return flattener(self, key, caps, freezing)
@@ -456,7 +475,8 @@ class Serializer(object):
 
     def reset(self):
         self._freezing = False # If we are freezing or serializing
-        self._preserved = {} # {OBJ_ID: FLATTENED_STRUCTURE}
+        self._tree_mode = False # If no reference is expected
+        self._preserved = {} # {OBJ_ID: FLATTENED_STRUCTURE or OBJ}
         self._refids = {} # {OBJ_ID: REFERENCE_ID}
         self._references = {} # {OBJ_ID: REFERENCE_CONTAINER}
         self._memory = []
@@ -743,12 +763,201 @@ class Serializer(object):
                    bool: flatten_bool_key,
                    type(None): flatten_none_key}
 
+    ### plan tables ###
+
+    # {FLATTENER: (CAPABILITY, PACKER_NAME)}
+    _scalar_plans = {flatten_str_value: (Capabilities.str_values,
+                                         "pack_str"),
+                     flatten_unicode_value: (Capabilities.unicode_values,
+                                             "pack_unicode"),
+                     flatten_int_value: (Capabilities.int_values,
+                                         "pack_int"),
+                     flatten_long_value: (Capabilities.long_values,
+                                          "pack_long"),
+                     flatten_float_value: (Capabilities.float_values,
+                                           "pack_float"),
+                     flatten_bool_value: (Capabilities.bool_values,
+                                          "pack_bool"),
+                     flatten_none_value: (Capabilities.none_values,
+                                          "pack_none"),
+                     flatten_str_key: (Capabilities.str_keys,
+                                       "pack_str"),
+                     flatten_unicode_key: (Capabilities.unicode_keys,
+                                           "pack_unicode"),
+                     flatten_int_key: (Capabilities.int_keys,
+                                       "pack_int"),
+                     flatten_long_key: (Capabilities.long_keys,
+                                        "pack_long"),
+                     flatten_float_key: (Capabilities.float_keys,
+                                         "pack_float"),
+                     flatten_bool_key: (Capabilities.bool_keys,
+                                        "pack_bool"),
+                     flatten_none_key: (Capabilities.none_keys,
+                                        "pack_none")}
+
+    # {FLATTENER: (CAPABILITY, PACKER_NAME)}
+    _sequence_plans = {flatten_tuple_value: (Capabilities.tuple_values,
+                                             "pack_tuple"),
+                       flatten_list_value: (Capabilities.list_values,
+                                            "pack_list"),
+                       flatten_set_value: (Capabilities.set_values,
+                                           "pack_set"),
+                       flatten_tuple_key: (Capabilities.tuple_keys,
+                                           "pack_tuple")}
+
+    # {FLATTENER: CAPABILITY}
+    _mapping_plans = {flatten_dict_value: Capabilities.dict_values}
+
     ### private ###
 
+    def _compile_value_plan(self, vtype, caps, freezing):
+        """Resolves once the way values of the specified type are flattened
+        with the serializer capabilities for the specified mode.
+        The resulting plan is a callable with the same signature
+        as flatten_value() that skip the lookup tables, the capability
+        checks and, for instances, the type checks and interface lookup."""
+        flattener = self._value_lookup.get(vtype)
+        if flattener is not None:
+            plan = self._compile_known_plan(flattener, caps, freezing)
+        else:
+            plan = self._compile_instance_plan(vtype, caps, freezing)
+        self._value_plans[(vtype, freezing)] = plan
+        return plan
+
+    def _compile_key_plan(self, vtype, caps, freezing):
+        flattener = self._key_lookup.get(vtype)
+        if flattener is not None:
+            plan = self._compile_known_plan(flattener, caps, freezing)
+        else:
+            plan = self._bind_flattener(Serializer.flatten_unknown_key)
+        self._key_plans[(vtype, freezing)] = plan
+        return plan
+
+    def _compile_known_plan(self, flattener, caps, freezing):
+        if flattener in self._scalar_plans:
+            cap, packer_name = self._scalar_plans[flattener]
+            if cap in caps:
+                packer = getattr(self, packer_name)
+
+                def scalar_plan(value, caps, freezing):
+                    return packer, value
+
+                return scalar_plan
+
+        if flattener in self._sequence_plans:
+            cap, packer_name = self._sequence_plans[flattener]
+            if cap in caps:
+                return self._sequence_plan(getattr(self, packer_name))
+
+        if flattener in self._mapping_plans:
+            if self._mapping_plans[flattener] in caps:
+                return self._dict_plan()
+
+        # Unsupported values are left to the flattener to raise the error
+        return self._bind_flattener(flattener)
+
+    def _compile_instance_plan(self, vtype, caps, freezing):
+        if vtype is types.InstanceType:
+            # All old-style instances share the same type
+            return self._bind_flattener(Serializer.flatten_unknown_value)
+
+        if issubclass(vtype, enum.Enum):
+            return self._bind_flattener(Serializer.flatten_enum_value)
+
+        if issubclass(vtype, (type, InterfaceClass)):
+            return self._bind_flattener(Serializer.flatten_type_value)
+
+        iface = ISnapshotable if freezing else ISerializable
+        if getattr(vtype, "__conform__", None) is not None:
+            # The type can do its own adaptation, no way to know in advance
+            return self._bind_flattener(Serializer.flatten_unknown_value)
+
+        if iface.implementedBy(vtype):
+            return self._instance_plan(None)
+
+        return self._instance_plan(iface)
+
+    def _bind_flattener(self, flattener):
+
+        def flattener_plan(value, caps, freezing):
+            return flattener(self, value, caps, freezing)
+
+        return flattener_plan
+
+    def _sequence_plan(self, packer):
+        prepare = self._prepare
+        preserve = self._preserve
+        flatten = self.flatten_value
+
+        def sequence_plan(value, caps, freezing):
+            if self._tree_mode:
+                preserved = self._preserved
+                ident = id(value)
+                if ident in preserved:
+                    raise SharedReference()
+                preserved[ident] = value
+                return [packer, [flatten(v, caps, freezing) for v in value]]
+            deref = prepare(value)
+            if deref is not None:
+                return deref
+            data = [flatten(v, caps, freezing) for v in value]
+            return preserve(value, packer, data)
+
+        return sequence_plan
+
+    def _dict_plan(self):
+        prepare = self._prepare
+        preserve = self._preserve
+        flatten = self.flatten_item
+        packer = self.pack_dict
+
+        def dict_plan(value, caps, freezing):
+            tree_mode = self._tree_mode
+            if tree_mode:
+                preserved = self._preserved
+                ident = id(value)
+                if ident in preserved:
+                    raise SharedReference()
+                preserved[ident] = value
+            else:
+                deref = prepare(value)
+                if deref is not None:
+                    return deref
+            items = value.items()
+            if freezing:
+                items = sorted(items, key=operator.itemgetter(0))
+            data = [flatten(i, caps, freezing) for i in items]
+            if tree_mode:
+                return [packer, data]
+            return preserve(value, packer, data)
+
+        return dict_plan
+
+    def _instance_plan(self, iface):
+        externalizer = self._externalizer
+        lookup = adapter.registry.lookup1
+
+        def instance_plan(value, caps, freezing):
+            if externalizer is not None:
+                extid = externalizer.identify(value)
+                if extid is not None:
+                    return self.flatten_external(extid, caps, freezing)
+            if iface is not None:
+                # Adapter registrations may change at any time,
+                # the registry keep its own lookup cache
+                factory = lookup(providedBy(value), iface)
+                adapted = factory and factory(value)
+                if adapted is None:
+                    return self.flatten_unknown_value(value, caps, freezing)
+                value = adapted
+            return self.flatten_instance(value, caps, freezing)
+
+        return instance_plan
+
     def _convert(self, data, caps, freezing):
         try:
             # Flatten the value to the list-only format with packer function
-            flattened = self.flatten_value(data, caps, freezing)
+            flattened = self._flatten_root(data, caps, freezing)
             # Pack all the value with there own packer functions
             packed = self.pack_value(flattened)
             # Post-convert the data if a convert was specified
@@ -757,12 +966,31 @@ class Serializer(object):
             # Reset the state to cleanup all references
             self.reset()
 
+    def _flatten_root(self, data, caps, freezing):
+        if self.tree_mode:
+            # The flattened structure is the same without the reference
+            # bookkeeping as long as no value is seen twice, otherwise
+            # the value is flattened again from scratch
+            self._tree_mode = True
+            try:
+                return self.flatten_value(data, caps, freezing)
+            except SharedReference:
+                self.reset()
+        return self.flatten_value(data, caps, freezing)
+
     def _next_refid(self):
         self._refid += 1
         return self._refid
 
     def _prepare(self, value):
         ident = id(value)
+        if self._tree_mode:
+            # No bookkeeping, only make sure no value is seen twice.
+            # Keeping the value prevents its identifier to be reused.
+            if ident in self._preserved:
+                raise SharedReference()
+            self._preserved[ident] = value
+            return None
         # Check if already preserved
         if ident in self._preserved:
             # Already preserved so we should return a dereference
@@ -796,6 +1024,8 @@ class Serializer(object):
         return None
 
     def _preserve(self, value, packer, data):
+        if self._tree_mode:
+            return [packer, data]
         ident = id(value)
         # Keep a reference to the value to prevent it to be garbage-collected.
         # If it was, a different value with the same id could appear
@@ -812,6 +1042,11 @@ class Serializer(object):
         return container
 
 
+class SharedReference(Exception):
+    """Raised when a value is found twice while flattening
+    without the reference bookkeeping."""
+
+
 class DelayPacking(Exception):
     """Exception raised when unpacking a dereference to an unknown
     reference. This allows to delay unpacking of mutable object
@@ -186,11 +186,12 @@ class Serializer(base.Serializer):
     pack_external = External._build
 
     def __init__(self, post_converter=None, externalizer=None,
-                 source_ver=None, target_ver=None):
+                 source_ver=None, target_ver=None, tree_mode=False):
         base.Serializer.__init__(self, post_converter=post_converter,
                                  externalizer=externalizer,
                                  source_ver=source_ver,
-                                 target_ver=target_ver)
+                                 target_ver=target_ver,
+                                 tree_mode=tree_mode)
 
     def pack_frozen_external(self, value):
         identifier, = value
@@ -21,16 +21,22 @@
 # Headers in this file shall remain intact.
 # -*- Mode: Python -*-
 # vi:si:et:sw=4:sts=4:ts=4
+import math
 import sys
 
 from zope.interface import implements
 from twisted.internet import reactor, defer
+from twisted.internet.error import AlreadyCalled, AlreadyCancelled
+from twisted.python import log as twisted_log
 
 from feat import hacks
 from feat.common import log
 
 from twisted.internet.interfaces import IDelayedCall
 
+# Resolution of the timeouts scheduled with call_timeout() in seconds
+TIMEOUT_RESOLUTION = 0.1
+
 
 def scale(factor):
     '''
@@ -110,6 +116,21 @@ def call_later(_seconds, _f, *args, **kwargs):
         return ScaledDelayedCall(cur_scale, call)
 
 
+def call_timeout(_seconds, _f, *args, **kwargs):
+    '''
+    Same as call_later() for timeouts, which are usually cancelled before
+    they fire. The calls are kept in a timer wheel driven by a single
+    reactor call, they are cheap to schedule and cancel but can fire up
+    to L{TIMEOUT_RESOLUTION} seconds late.
+    '''
+    cur_scale = _get_scale()
+    call = _get_wheel(cur_scale).call_later(_seconds * cur_scale, _f,
+                                            *args, **kwargs)
+    if cur_scale == 1:
+        return call
+    return ScaledDelayedCall(cur_scale, call)
+
+
 def reset():
     '''
     Reset any manipulations done by the module.
@@ -161,6 +182,171 @@ def _get_scale():
     return _time_scale
 
 
+_wheel = None
+
+
+def _get_wheel(cur_scale):
+    global _wheel
+    resolution = TIMEOUT_RESOLUTION * cur_scale
+    # The wheel is recreated when the time scale changes, unless some
+    # timeouts are still waiting in it
+    if _wheel is None or (_wheel.resolution != resolution and not _wheel):
+        _wheel = TimerWheel(resolution)
+    return _wheel
+
+
+class TimerWheel(object):
+    '''
+    Hashed timer wheel. The calls are put in the slot of the tick they
+    expire in, a slot being visited every size ticks, the calls expiring
+    in later turns of the wheel count the visits they have to wait for.
+    Scheduling and cancelling a call is O(1), the wheel only keeps
+    a reactor call for the next tick while some calls are scheduled.
+    '''
+
+    def __init__(self, resolution, size=512, reactor=reactor):
+        self.resolution = resolution
+        self._reactor = reactor
+        self._slots = [set() for _ in xrange(size)]
+        # index of the slot and time of the last tick
+        self._position = 0
+        self._time = None
+        self._count = 0
+        self._tick_call = None
+
+    def __len__(self):
+        return self._count
+
+    def call_later(self, _seconds, _f, *args, **kwargs):
+        '''Same as reactor.callLater() with delay in real seconds.'''
+        now = self._reactor.seconds()
+        call = WheelCall(self, now + max(_seconds, 0), _f, args, kwargs)
+        self._insert(call, now)
+        return call
+
+    ### protected, used by WheelCall ###
+
+    def _insert(self, call, now):
+        if not self._count:
+            self._time = now
+
+        # Tolerate the rounding of the floats, the time of a call scheduled
+        # from another one is a sum of multiples of the resolution
+        ticks = (call.time - self._time) / self.resolution
+        ticks = max(int(math.ceil(ticks - 1e-6)), 1)
+        size = len(self._slots)
+        call.slot = (self._position + ticks) % size
+        call.rounds = (ticks - 1) // size
+        self._slots[call.slot].add(call)
+        self._count += 1
+
+        if self._tick_call is None:
+            delay = max(self._time + self.resolution - now, 0)
+            self._tick_call = self._reactor.callLater(delay, self._tick)
+
+    def _remove(self, call):
+        if call.slot is None:
+            # Already taken out of the wheel by the tick about to fire it
+            return
+        self._slots[call.slot].remove(call)
+        call.slot = None
+        self._count -= 1
+        if not self._count and self._tick_call is not None:
+            self._tick_call.cancel()
+            self._tick_call = None
+
+    ### private ###
+
+    def _tick(self):
+        self._tick_call = None
+        now = self._reactor.seconds() + self.resolution * 1e-6
+        size = len(self._slots)
+        expired = []
+        while self._count > len(expired) and \
+                self._time + self.resolution <= now:
+            self._time += self.resolution
+            self._position = (self._position + 1) % size
+            slot = self._slots[self._position]
+            for call in list(slot):
+                if call.rounds:
+                    call.rounds -= 1
+                else:
+                    slot.remove(call)
+                    call.slot = None
+                    expired.append(call)
+
+        self._count -= len(expired)
+        # Fire in the order the calls were meant to expire
+        expired.sort(key=lambda call: call.time)
+        for call in expired:
+            if call.cancelled or call.slot is not None:
+                # Cancelled or rescheduled by a call fired before it
+                continue
+            call.called = True
+            try:
+                call.func(*call.args, **call.kwargs)
+            except:
+                twisted_log.msg("Unhandled error in timer wheel call:")
+                twisted_log.err()
+
+        if self._count and self._tick_call is None:
+            delay = max(self._time + self.resolution
+                        - self._reactor.seconds(), 0)
+            self._tick_call = self._reactor.callLater(delay, self._tick)
+
+
+class WheelCall(object):
+    implements(IDelayedCall)
+
+    __slots__ = ('time', 'func', 'args', 'kwargs', 'called', 'cancelled',
+                 'slot', 'rounds', '_wheel')
+
+    def __init__(self, wheel, time, func, args, kwargs):
+        self.time = time
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.called = False
+        self.cancelled = False
+        self.slot = None
+        self.rounds = 0
+        self._wheel = wheel
+
+    ### IDelayedCall ###
+
+    def getTime(self):
+        return self.time
+
+    def cancel(self):
+        self._check_active()
+        self.cancelled = True
+        self._wheel._remove(self)
+
+    def delay(self, secondsLater):
+        self._check_active()
+        self._wheel._remove(self)
+        self.time += secondsLater
+        self._wheel._insert(self, self._wheel._reactor.seconds())
+
+    def reset(self, secondsFromNow):
+        self._check_active()
+        self._wheel._remove(self)
+        now = self._wheel._reactor.seconds()
+        self.time = now + secondsFromNow
+        self._wheel._insert(self, now)
+
+    def active(self):
+        return not (self.called or self.cancelled)
+
+    ### private ###
+
+    def _check_active(self):
+        if self.cancelled:
+            raise AlreadyCancelled()
+        if self.called:
+            raise AlreadyCalled()
+
+
 class ScaledDelayedCall(object):
     implements(IDelayedCall)
 
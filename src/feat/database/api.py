@@ -30,22 +30,22 @@ class Cache(model.Model):
     model.attribute('size', value.Integer(),
                     desc="Sum of sizes of cached fragments",
                     getter=call.source_call('get_size'))
-    model.attribute('average_size', value.Integer(),
-                    desc="Average size of cache calculated during the "
-                         "cleanup call",
-                    getter=call.model_call('get_average_size'))
-    model.attribute('average_cleanup_time', value.Integer(),
-                    desc="Average size of cache calculated during the "
-                         "cleanup call",
-                    getter=call.model_call('get_average_cleanup_time'))
     model.attribute('desired_size', value.Integer(),
                     desc="Desired size of cache.",
                     getter=getter.source_attr('desired_size'),
                     setter=setter.source_attr('desired_size'))
-    model.attribute('operation', value.Integer(),
-                    desc=("Internal counter of operations used to "
-                          "determine when to call cleanup()"),
-                    getter=getter.source_attr('_operation'))
+    model.attribute('policy', value.String(),
+                    desc="Name of the eviction policy",
+                    getter=call.model_call('get_stat', 'policy'))
+    model.attribute('hits', value.Integer(),
+                    desc="Number of requests served from the cache",
+                    getter=call.model_call('get_stat', 'hits'))
+    model.attribute('misses', value.Integer(),
+                    desc="Number of requests not found in the cache",
+                    getter=call.model_call('get_stat', 'misses'))
+    model.attribute('evictions', value.Integer(),
+                    desc="Number of entries evicted to keep the desired size",
+                    getter=call.model_call('get_stat', 'evictions'))
     model.collection('entries',
                      child_names=call.source_call('keys'),
                      child_source=getter.source_get('get'),
@@ -56,11 +56,8 @@ class Cache(model.Model):
                                   'cached_at, last_accessed_at, '
                                   'num_accessed, size')])
 
-    def get_average_size(self):
-        return self.source.average_size.get_value()
-
-    def get_average_cleanup_time(self):
-        return self.source.average_cleanup_time.get_value()
+    def get_stat(self, name):
+        return self.source.get_stats()[name]
 
     model.action('cleanup', action.MetaAction.new(
         'cleanup',
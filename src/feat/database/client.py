@@ -21,6 +21,7 @@
 # Headers in this file shall remain intact.
 # -*- Mode: Python -*-
 # vi:si:et:sw=4:sts=4:ts=4
+import collections
 import inspect
 import uuid
 import urllib
@@ -38,6 +39,7 @@ from feat.database.interface import IRevisionStore, IDocument, IViewFactory
 from feat.database.interface import NotFoundError, ConflictResolutionStrategy
 from feat.database.interface import ResignFromModifying, ConflictError
 from feat.database.interface import IVersionedDocument, NotMigratable
+from feat.database.interface import DatabaseError
 from feat.interface.generic import ITimeProvider
 from feat.interface.serialization import ISerializable
 
@@ -76,47 +78,53 @@ class ViewFilter(object):
 
 
 class DocIdFilter(object):
+    '''
+    Dispatches the changes of the unfiltered feed to the listeners
+    of the document ids. The feed is shared by all the listeners and
+    is kept open once started, adding or removing listeners never
+    restarts it.
+    '''
 
     def  __init__(self):
         self.name = 'doc_ids'
-        # doc_ids -> [(callback, listener_id)]
+        # doc_id -> {listener_id: callback}
         self._listeners = {}
+        # listener_id -> doc_ids
+        self._listener_docs = {}
 
     def match(self, doc):
         # used only by emu
-        return doc['_id'] in self._listeners.keys()
+        return doc['_id'] in self._listeners
 
     def notified(self, doc_id, rev, deleted):
-        listeners = self._listeners.get(doc_id, list())
-        for cb, _ in listeners:
+        listeners = self._listeners.get(doc_id)
+        if not listeners:
+            return
+        for cb in listeners.values():
             reactor.callLater(0, cb, doc_id, rev, deleted)
 
     def add_listener(self, callback, listener_id, doc_ids):
+        doc_ids = set(doc_ids)
         for doc_id in doc_ids:
-            cur = self._listeners.get(doc_id, list())
-            cur.append((callback, listener_id, ))
-            self._listeners[doc_id] = cur
+            self._listeners.setdefault(doc_id, {})[listener_id] = callback
+        self._listener_docs.setdefault(listener_id, set()).update(doc_ids)
 
     def cancel_listener(self, listener_id):
-        changed = False
-        for values in self._listeners.itervalues():
-            iterator = (x for x in values if x[1] == listener_id)
-            for matching in iterator:
-                changed = True
-                values.remove(matching)
-        for key, values in self._listeners.items():
-            # cleanup empty entry
-            if not values:
-                del(self._listeners[key])
-
-        return changed
+        doc_ids = self._listener_docs.pop(listener_id, None)
+        if doc_ids is None:
+            return False
+        for doc_id in doc_ids:
+            listeners = self._listeners[doc_id]
+            del listeners[listener_id]
+            if not listeners:
+                # cleanup empty entry
+                del self._listeners[doc_id]
+        return True
 
     def extract_params(self):
-        if not self._listeners:
-            # returning None prevents channel for being established
-            return
         # FIXME: after upgrading couchdb to a version supporting builting
-        # filter for doc_ids, pass here the correct params to trigger using it
+        # filter for doc_ids, we could pass the document ids here, but
+        # it would restart the feed every time a listener is added
         return dict()
 
 
@@ -171,6 +179,79 @@ class ChangeListener(log.Logger):
         return defer.succeed(None)
 
 
+class RevisionStore(object):
+    '''
+    Bounded store of the last revisions of the documents saved by
+    a connection, used to recognize the notifications of its own changes.
+
+    The revisions are kept at least for the notification horizon, the time
+    in which the notification of a change is expected to arrive even
+    with reconnections. Past it the least recently saved revisions
+    are evicted when the store is bigger than the maximum size, and
+    all of them are evicted when older than the maximum age.
+    A notification for a document without known revision is considered
+    as a change made by someone else, like for the documents never saved
+    by the connection.
+    '''
+
+    horizon = 600
+    max_size = 10000
+    max_age = 3600
+
+    def __init__(self, time_provider, horizon=None, max_size=None,
+                 max_age=None):
+        self._time = ITimeProvider(time_provider)
+        self.horizon = horizon or type(self).horizon
+        self.max_size = max_size or type(self).max_size
+        self.max_age = max(max_age or type(self).max_age, self.horizon)
+        # DOC_ID -> (REV_INDEX, REV_HASH, SAVED_AT) from the oldest
+        self._revisions = collections.OrderedDict()
+
+        # statistics
+        self.evictions = 0
+
+    def __contains__(self, doc_id):
+        return doc_id in self._revisions
+
+    def __getitem__(self, doc_id):
+        rev_index, rev_hash, _ = self._revisions[doc_id]
+        return rev_index, rev_hash
+
+    def __setitem__(self, doc_id, (rev_index, rev_hash)):
+        now = self._time.get_time()
+        # reinserting moves the entry to the end
+        self._revisions.pop(doc_id, None)
+        self._revisions[doc_id] = (rev_index, rev_hash, now)
+        self._evict(now)
+
+    def __len__(self):
+        return len(self._revisions)
+
+    def get(self, doc_id, default=None):
+        if doc_id in self._revisions:
+            return self[doc_id]
+        return default
+
+    def get_stats(self):
+        return dict(size=len(self._revisions),
+                    max_size=self.max_size,
+                    evictions=self.evictions)
+
+    ### private ###
+
+    def _evict(self, now):
+        revisions = self._revisions
+        while revisions:
+            doc_id, (_, _, saved_at) = next(revisions.iteritems())
+            age = now - saved_at
+            if age < self.horizon:
+                break
+            if len(revisions) <= self.max_size and age < self.max_age:
+                break
+            del revisions[doc_id]
+            self.evictions += 1
+
+
 class Connection(log.Logger, log.LogProxy):
     '''API for agency to call against the database.'''
 
@@ -189,13 +270,9 @@ class Connection(log.Logger, log.LogProxy):
         # listner_id -> doc_ids
         self._listeners = dict()
         self._change_cb = None
-        # Changed to use a normal dictionary.
-        # It will grow boundless up to the number of documents
-        # modified by the connection. It is a kind of memory leak
-        # done to temporarily resolve the problem of notifications
-        # received after the expiration time due to reconnection
-        # killing agents.
-        self._known_revisions = {} # {DOC_ID: (REV_INDEX, REV_HASH)}
+        # Revisions are kept for longer than the notifications can be
+        # delayed by reconnections, but not for ever.
+        self._known_revisions = RevisionStore(self)
         # If the counter of current tasks on database which can produce
         # a new revision
         self._update_lock_counter = 0
@@ -212,6 +289,9 @@ class Connection(log.Logger, log.LogProxy):
     def known_revisions(self):
         return self._known_revisions
 
+    def show_revision_status(self):
+        return self._known_revisions.get_stats()
+
     @property
     def analyzes_locked(self):
         return self._update_lock_counter > 0
@@ -285,6 +365,45 @@ class Connection(log.Logger, log.LogProxy):
         finally:
             self._unlock_notifications()
 
+    @serialization.freeze_tag('IDatabaseClient.save_documents')
+    @defer.inlineCallbacks
+    def save_documents(self, docs):
+        result = [None] * len(docs)
+        # index in result -> doc, for the documents which can be saved
+        # with a single request
+        bulk = list()
+        separate = list()
+        for index, doc in enumerate(docs):
+            assert IDocument.providedBy(doc) or isinstance(doc, dict), \
+                   repr(doc)
+            if IDocument.providedBy(doc) and (
+                doc.links.to_save or
+                any(not x.saved for x in doc.get_attachments().itervalues())):
+                separate.append((index, doc))
+            else:
+                bulk.append((index, doc))
+
+        try:
+            self._lock_notifications()
+            if bulk:
+                serialized = [self._serializer.convert(doc)
+                              for _, doc in bulk]
+                rows = yield self._database.bulk_save_docs(serialized)
+                for (index, doc), row in zip(bulk, rows):
+                    if isinstance(row, Exception):
+                        result[index] = row
+                    else:
+                        result[index] = self._update_id_and_rev(row, doc)
+            for index, doc in separate:
+                try:
+                    result[index] = yield self.save_document(doc)
+                except DatabaseError as e:
+                    result[index] = e
+        finally:
+            self._unlock_notifications()
+
+        defer.returnValue(result)
+
     @serialization.freeze_tag('IDatabaseClient.get_attachment_body')
     def get_attachment_body(self, attachment):
         d = self._database.get_attachment(attachment.doc_id, attachment.name)
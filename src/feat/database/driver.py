@@ -19,8 +19,11 @@
 # See "LICENSE.GPL" in the source distribution for more information.
 
 # Headers in this file shall remain intact.
+import collections
+import re
 import types
 import operator
+import weakref
 from urllib import urlencode, quote
 
 from zope.interface import implements
@@ -136,6 +139,12 @@ class Notifier(object):
         self._params = None
         self._changes = None
 
+        # public statistics
+        self.last_seq = None
+        self.received = 0
+        self.restarts = 0
+        self.last_change_at = None
+
     def setup(self):
         new_params = self._filter.extract_params()
         if (self._params is not None and
@@ -158,13 +167,18 @@ class Notifier(object):
             query = dict(new_params)
             query['feed'] = 'continuous'
             query['heartbeat'] = 1000
-            if 'since' not in query:
+            if 'since' not in query and self.last_seq is not None:
+                # resume the feed, nothing is missed while reconnecting
+                query['since'] = self.last_seq
+                self.restarts += 1
+            elif 'since' not in query:
                 url = '/%s/' % (self._db.db_name, )
                 d.addCallback(defer.drop_param, self._db.couchdb_call,
                               self._db.couchdb.get, url)
 
                 def set_since(resp):
                     query['since'] = resp['update_seq']
+                    self.last_seq = resp['update_seq']
 
                 d.addCallback(set_since)
 
@@ -188,7 +202,11 @@ class Notifier(object):
         # The change parameter is just an ugly effect of json unserialization
         # of the couchdb output. It can be many different things, hence the
         # strange logic above.
+        if 'seq' in change:
+            self.last_seq = change['seq']
         if "changes" in change:
+            self.received += 1
+            self.last_change_at = time.time()
             doc_id = change['id']
             deleted = change.get('deleted', False)
             for line in change['changes']:
@@ -202,6 +220,18 @@ class Notifier(object):
             return reason
         self._db.connectionLost(reason)
 
+    def get_stats(self, update_seq=None):
+        lag = None
+        if isinstance(update_seq, (int, long)) and \
+           isinstance(self.last_seq, (int, long)):
+            lag = update_seq - self.last_seq
+        return dict(active=self._changes is not None,
+                    last_seq=self.last_seq,
+                    received=self.received,
+                    restarts=self.restarts,
+                    last_change_at=self.last_change_at,
+                    lag=lag)
+
 
 class CouchDB(httpclient.ConnectionPool):
 
@@ -341,7 +371,8 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
     DESIRED_CACHE_SIZE = 3 * 10 * 1024 * 1024
 
     def __init__(self, host, port, db_name, username=None, password=None,
-                 https=False):
+                 https=False, cache_size=None, cache_policy=None,
+                 write_delay=None):
         common.ConnectionManager.__init__(self)
         log.LogProxy.__init__(self, log.get_default() or log.FluLogKeeper())
         ChangeListener.__init__(self, self)
@@ -369,7 +400,15 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
         self._pending_notifications = dict()
         # doc_id -> C{int} number of locks
         self._document_locks = dict()
-        self._cache = Cache(desired_size=self.DESIRED_CACHE_SIZE)
+        # Connections created by get_connection(), for their statistics
+        self._connections = weakref.WeakSet()
+        self._cache = Cache(desired_size=cache_size or self.DESIRED_CACHE_SIZE,
+                            policy=cache_policy)
+        # WriteCoalescer, if set the documents saved concurrently are
+        # grouped into the _bulk_docs requests
+        self._coalescer = None
+        if write_delay:
+            self.enable_write_coalescing(max_delay=write_delay)
 
         self._configure(host, port, db_name, username, password,
                         https)
@@ -383,13 +422,57 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
               time.left(self.reconnector.getTime())
         return "CouchDB", self.is_connected(), self.host, self.port, eta
 
+    def enable_write_coalescing(self, max_size=None, max_delay=None):
+        if self._coalescer:
+            self._coalescer.flush()
+        self._coalescer = WriteCoalescer(self, max_size, max_delay)
+
+    def disable_write_coalescing(self):
+        if self._coalescer:
+            self._coalescer.flush()
+            self._coalescer = None
+
+    def show_cache_status(self):
+        return self._cache.get_stats()
+
+    def show_notifier_status(self):
+        '''
+        Returns a Deferred fired with the statistics of the change feeds
+        by name. The lag is the number of database updates the feed
+        has not delivered yet, for filtered feeds it includes the updates
+        filtered out since the last matching change.
+        '''
+
+        def compute(update_seq):
+            return dict((name, notifier.get_stats(update_seq))
+                        for name, notifier in self.notifiers.iteritems())
+
+        d = self.get_update_seq()
+        d.addCallbacks(compute, lambda _: compute(None))
+        return d
+
     def show_document_locks(self):
         return dict(self._document_locks), dict(self._pending_notifications)
 
+    def show_revision_status(self):
+        '''
+        Returns the statistics of the revision stores of the connections
+        still in use, summed up.
+        '''
+        result = dict(connections=0, size=0, evictions=0)
+        for connection in list(self._connections):
+            stats = connection.show_revision_status()
+            result['connections'] += 1
+            result['size'] += stats['size']
+            result['evictions'] += stats['evictions']
+        return result
+
     ### IDbConnectionFactory
 
     def get_connection(self):
-        return Connection(self)
+        connection = Connection(self)
+        self._connections.add(connection)
+        return connection
 
     ### IDatabaseDriver
 
@@ -417,6 +500,14 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
     @defer.inlineCallbacks
     def save_doc(self, doc, doc_id=None, following_attachments=None,
                  db_name=None):
+        # the _bulk_docs request takes the id from the body, so the
+        # documents saved under a different id go through the single path
+        if (self._coalescer is not None and not following_attachments and
+            (db_name is None or db_name == self.db_name) and
+            (doc_id is None or doc_id == parse_doc_id(doc))):
+            r = yield self._coalescer.save(doc)
+            defer.returnValue(r)
+
         db_name = db_name or self.db_name
         if doc_id:
             url = '/%s/%s' % (db_name, quote(doc_id.encode('utf-8')))
@@ -521,18 +612,65 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
         cache_id += cache_id_suffix
 
         if post_process:
-            parser = (parse_response, parse_view_result, post_process)
+            parser = (parse_view_response, post_process)
         else:
-            parser = (parse_response, parse_view_result)
+            parser = parse_view_response
 
+        # The rows are parsed as the chunks of the body arrive. The class
+        # is passed instead of the instance, so that each retry of the
+        # request gets a fresh decoder.
         if body:
             return self.couchdb_call(self.couchdb.post, url, body=body,
                                      cache_id=cache_id, parser=parser,
-                                     if_modified_since=if_modified_since)
+                                     if_modified_since=if_modified_since,
+                                     decoder=ViewRowsDecoder)
         else:
             return self.couchdb_call(self.couchdb.get, url,
                                      cache_id=cache_id, parser=parser,
-                                     if_modified_since=if_modified_since)
+                                     if_modified_since=if_modified_since,
+                                     decoder=ViewRowsDecoder)
+
+    def stream_view(self, factory, consumer, **options):
+        '''
+        Queries the view passing each row to the consumer as soon as it
+        is parsed. The rows are neither cached nor kept in memory.
+
+        @param consumer: callable taking the row tuple, see
+                         parse_view_row() for its format
+        @rtype: Deferred
+        @callback: C{dict} with the metadata of the view response
+                   (total_rows, offset)
+        '''
+        factory = IViewFactory(factory)
+        url = "/%s/_design/%s/_view/%s" % (self.db_name,
+                                           quote(str(factory.design_doc_id)),
+                                           quote(str(factory.name)))
+        body = None
+        if 'keys' in options:
+            body = json.dumps({"keys": options.pop("keys")})
+        if options:
+            encoded = urlencode(dict((k, json.dumps(v))
+                                     for k, v in options.iteritems()))
+            url += '?' + encoded
+
+        # If the request is retried after the part of the rows has been
+        # consumed, the new decoder skips over them.
+        delivered = [0]
+
+        def count_and_consume(row):
+            delivered[0] += 1
+            consumer(row)
+
+        def decoder():
+            return ViewRowsDecoder(count_and_consume, skip=delivered[0])
+
+        parser = (parse_view_response, parse_view_meta)
+        if body:
+            return self.couchdb_call(self.couchdb.post, url, body=body,
+                                     parser=parser, decoder=decoder)
+        else:
+            return self.couchdb_call(self.couchdb.get, url,
+                                     parser=parser, decoder=decoder)
 
     def save_attachment(self, doc_id, revision, attachment):
         attachment = IAttachmentPrivate(attachment)
@@ -573,6 +711,15 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
         url = str('/%s/_changes?%s' % (self.db_name, urlencode(params)))
         return self.couchdb_call(self.couchdb.get, url)
 
+    def bulk_save_docs(self, docs):
+        url = '/%s/_bulk_docs' % (self.db_name, )
+        # the documents are already serialized, there is no point in
+        # parsing them just to serialize the body again
+        body = u'{"docs": [%s]}' % (u", ".join(docs), )
+        d = self.couchdb_call(self.couchdb.post, url, body)
+        d.addCallback(parse_bulk_save_response)
+        return d
+
     def bulk_get(self, doc_ids):
         url = '/%s/_all_docs?include_docs=true' % (self.db_name, )
         body = dict(keys=doc_ids)
@@ -682,6 +829,8 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
         if entry:
             d.addCallback(defer.keep_param, self._cache.freshen_entries)
             d.addBoth(defer.keep_param, entry.got_response)
+            d.addBoth(defer.keep_param, defer.drop_param,
+                      self._cache.account, cache_id, entry)
             d.addErrback(self._error_handler)
             return entry.wait()
         else:
@@ -755,6 +904,66 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener):
             failure.raiseException()
 
 
+class WriteCoalescer(object):
+    '''
+    Groups the documents saved in a short period of time into a single
+    _bulk_docs request. The batch is sent when it reaches max_size documents
+    or max_delay seconds after the first document was queued. Every save
+    gets its own Deferred, fired with the response row or failed with the
+    error of this particular document.
+    '''
+
+    DEFAULT_MAX_SIZE = 100
+    DEFAULT_MAX_DELAY = 0.005
+
+    def __init__(self, database, max_size=None, max_delay=None):
+        self._database = database
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.max_delay = max_delay or self.DEFAULT_MAX_DELAY
+
+        # [(serialized document, Deferred)]
+        self._pending = list()
+        self._delayed_call = None
+
+    def save(self, doc):
+        d = defer.Deferred()
+        self._pending.append((doc, d))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._delayed_call is None:
+            self._delayed_call = time.call_later(self.max_delay, self.flush)
+        return d
+
+    def flush(self):
+        if self._delayed_call is not None:
+            if self._delayed_call.active():
+                self._delayed_call.cancel()
+            self._delayed_call = None
+        pending, self._pending = self._pending, list()
+        if not pending:
+            return
+
+        d = self._database.bulk_save_docs([x[0] for x in pending])
+        d.addCallbacks(self._got_response, self._got_failure,
+                       callbackArgs=(pending, ), errbackArgs=(pending, ))
+
+    def __len__(self):
+        return len(self._pending)
+
+    ### private ###
+
+    def _got_response(self, rows, pending):
+        for (_, d), row in zip(pending, rows):
+            if isinstance(row, Exception):
+                d.errback(row)
+            else:
+                d.callback(row)
+
+    def _got_failure(self, fail, pending):
+        for _, d in pending:
+            d.errback(fail)
+
+
 class EntryState(enum.Enum):
     '''
     waiting - request is in progress
@@ -826,7 +1035,11 @@ class CacheEntry(object):
                 self.state = EntryState.invalid
             else:
                 self.state = EntryState.ready
-                self.size = len(response.body)
+                # streamed responses don't keep the body, they know
+                # its size though
+                self.size = getattr(response, 'size', None)
+                if self.size is None:
+                    self.size = len(response.body)
 
                 if not self.cached_at:
                     self.cached_at = ctime
@@ -847,112 +1060,383 @@ class CacheEntry(object):
         return "<Entry, state: %s, tag: %s>" % (self.state.name, self.tag)
 
 
+class EvictionPolicy(object):
+    '''
+    Base class of the cache eviction policies. The policy keeps track of
+    the keys of the entries with known size and chooses the victims when
+    the cache grows over its capacity. All the operations are expected
+    to run in O(1) amortised time.
+    '''
+
+    name = None
+
+    def __init__(self):
+        self.capacity = None
+
+    def set_capacity(self, capacity):
+        self.capacity = capacity
+
+    def insert(self, key, size):
+        '''
+        Called when the entry gets its size for the first time.
+        '''
+        raise NotImplementedError("%r should implement insert()" % (self, ))
+
+    def update(self, key, size):
+        '''
+        Called when the size of the tracked entry has changed.
+        '''
+
+    def touch(self, key):
+        '''
+        Called on every cache hit of the tracked entry.
+        '''
+        raise NotImplementedError("%r should implement touch()" % (self, ))
+
+    def remove(self, key):
+        '''
+        Called when the entry leaves the cache for a reason other than
+        being chosen as a victim.
+        '''
+        raise NotImplementedError("%r should implement remove()" % (self, ))
+
+    def victim(self):
+        '''
+        Chooses the key to evict and stops tracking it.
+        @returns: the key or None if nothing is tracked.
+        '''
+        raise NotImplementedError("%r should implement victim()" % (self, ))
+
+
+class LRUPolicy(EvictionPolicy):
+    '''
+    Evicts the entry which has not been used for the longest time.
+    '''
+
+    name = 'lru'
+
+    def __init__(self):
+        EvictionPolicy.__init__(self)
+        self._order = collections.OrderedDict()
+
+    def insert(self, key, size):
+        self._order.pop(key, None)
+        self._order[key] = size
+
+    def update(self, key, size):
+        if key in self._order:
+            self._order[key] = size
+
+    def touch(self, key):
+        if key in self._order:
+            self._order[key] = self._order.pop(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        if self._order:
+            return self._order.popitem(last=False)[0]
+
+    def __len__(self):
+        return len(self._order)
+
+
+class ARCPolicy(EvictionPolicy):
+    '''
+    Adaptive Replacement Cache working on bytes instead of the number of
+    entries. The entries seen once live in the recent list, the ones hit
+    again are promoted to the frequent list. The ghost lists remember the
+    keys evicted lately, a miss on a ghost shifts the target size of the
+    recent list towards the list which would have kept the entry.
+    '''
+
+    name = 'arc'
+
+    def __init__(self):
+        EvictionPolicy.__init__(self)
+        # key -> size
+        self._recent = collections.OrderedDict()
+        self._frequent = collections.OrderedDict()
+        self._recent_ghost = collections.OrderedDict()
+        self._frequent_ghost = collections.OrderedDict()
+        # sizes in bytes of the lists above
+        self._sizes = dict.fromkeys(
+            ('recent', 'frequent', 'recent_ghost', 'frequent_ghost'), 0)
+        # target size in bytes of the recent list
+        self.target = 0
+
+    def insert(self, key, size):
+        self.remove(key)
+        if key in self._recent_ghost:
+            ratio = max(1, self._ratio('frequent_ghost', 'recent_ghost'))
+            self.target = min(self.capacity or 0, self.target + ratio * size)
+            self._pop('recent_ghost', key)
+            self._push('frequent', key, size)
+        elif key in self._frequent_ghost:
+            ratio = max(1, self._ratio('recent_ghost', 'frequent_ghost'))
+            self.target = max(0, self.target - ratio * size)
+            self._pop('frequent_ghost', key)
+            self._push('frequent', key, size)
+        else:
+            self._push('recent', key, size)
+
+    def update(self, key, size):
+        for name in ('recent', 'frequent'):
+            if key in self._list(name):
+                self._pop(name, key)
+                self._push(name, key, size)
+                return
+
+    def touch(self, key):
+        if key in self._recent:
+            self._push('frequent', key, self._pop('recent', key))
+        elif key in self._frequent:
+            self._push('frequent', key, self._pop('frequent', key))
+
+    def remove(self, key):
+        for name in ('recent', 'frequent'):
+            if key in self._list(name):
+                self._pop(name, key)
+                return
+
+    def victim(self):
+        if self._recent and (self._sizes['recent'] > self.target or
+                             not self._frequent):
+            key, size = self._popitem('recent')
+            self._push('recent_ghost', key, size)
+        elif self._frequent:
+            key, size = self._popitem('frequent')
+            self._push('frequent_ghost', key, size)
+        else:
+            return None
+        self._trim_ghosts()
+        return key
+
+    def __len__(self):
+        return len(self._recent) + len(self._frequent)
+
+    ### private ###
+
+    def _list(self, name):
+        return getattr(self, '_' + name)
+
+    def _push(self, name, key, size):
+        self._list(name)[key] = size
+        self._sizes[name] += size
+
+    def _pop(self, name, key):
+        size = self._list(name).pop(key)
+        self._sizes[name] -= size
+        return size
+
+    def _popitem(self, name):
+        key, size = self._list(name).popitem(last=False)
+        self._sizes[name] -= size
+        return key, size
+
+    def _ratio(self, nominator, denominator):
+        return (float(self._sizes[nominator]) /
+                max(self._sizes[denominator], 1))
+
+    def _trim_ghosts(self):
+        # the ghost lists remember at most the capacity worth of bytes
+        capacity = self.capacity or 0
+        for name in ('recent_ghost', 'frequent_ghost'):
+            while self._list(name) and self._sizes[name] > capacity:
+                self._popitem(name)
+
+
+EVICTION_POLICIES = dict((x.name, x) for x in (LRUPolicy, ARCPolicy))
+
+
+def create_eviction_policy(name):
+    try:
+        return EVICTION_POLICIES[name]()
+    except KeyError:
+        raise ValueError("Unknown cache eviction policy %r, known ones are: "
+                         "%s" % (name, ", ".join(sorted(EVICTION_POLICIES))))
+
+
 class Cache(dict):
     '''
     url -> CacheEntry
+
+    The size of the cache is accounted incrementally, every time the entry
+    receives the response. When the size goes over the desired one
+    the victims are chosen by the eviction policy.
     '''
 
     DEFAULT_DESIRED_SIZE = 3 * 10 * 1024 * 1024
-    OPERATIONS_PER_CLEANUP = 500
+    DEFAULT_POLICY = 'lru'
 
-    def __init__(self, desired_size=None):
+    def __init__(self, desired_size=None, policy=None):
         super(Cache, self).__init__()
+        if policy is None or isinstance(policy, (str, unicode)):
+            policy = create_eviction_policy(policy or self.DEFAULT_POLICY)
+        self.policy = policy
+
+        # total size of the entries accounted so far
+        self.size = 0
+        # ident -> accounted size
+        self._sizes = dict()
+        # etag -> set of idents, used to freshen entries on 304
+        self._etags = dict()
+        # ident -> etag under which the ident is indexed
+        self._entry_etags = dict()
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
         self.desired_size = desired_size or self.DEFAULT_DESIRED_SIZE
-        self.average_size = container.RunningAverage(0)
-        self.average_cleanup_time = container.RunningAverage(0)
-        self.last_cleanup = None
-        self._operation = 0
+
+    @property
+    def desired_size(self):
+        return self._desired_size
+
+    @desired_size.setter
+    def desired_size(self, size):
+        self._desired_size = size
+        self.policy.set_capacity(size)
+        self._evict()
 
     def get_url(self, identifier):
-        self._bump_counter()
-        if identifier in self and self[identifier].state != EntryState.invalid:
-            return self[identifier]
+        entry = self.get(identifier)
+        if entry is not None and entry.state != EntryState.invalid:
+            self.hits += 1
+            self.policy.touch(identifier)
+            return entry
+        self.misses += 1
 
     def __setitem__(self, key, value):
+        if key in self:
+            self._forget(key)
         super(Cache, self).__setitem__(key, value)
-        self._bump_counter()
-
-    def _bump_counter(self):
-        self._operation += 1
-        if self._operation % self.OPERATIONS_PER_CLEANUP == 0:
-            self.cleanup()
 
-    def cleanup(self, ctime=None):
+    def __delitem__(self, key):
+        super(Cache, self).__delitem__(key)
+        self._forget(key)
+        self.policy.remove(key)
+
+    # the other mutating methods of dict would bypass the accounting
+
+    def clear(self):
+        for ident in self.keys():
+            self.policy.remove(ident)
+        super(Cache, self).clear()
+        self.size = 0
+        self._sizes.clear()
+        self._etags.clear()
+        self._entry_etags.clear()
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super(Cache, self).pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        key, value = super(Cache, self).popitem()
+        self._forget(key)
+        self.policy.remove(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def account(self, ident, entry):
         '''
-        This method is called iteratively by the connection owning it.
-        Its job is to control the size of cache and remove old entries.
+        Called after the entry has processed the response. Updates the
+        size, the etag index and evicts the entries if necessary.
         '''
-        ctime = ctime or time.time()
-        if self.last_cleanup:
-            self.average_cleanup_time.add_point(ctime - self.last_cleanup)
-        self.last_cleanup = ctime
-
-        log.debug('couchdb', "Running cache cleanup().")
-        # first remove already invalidated entries, used this iteration to
-        # build up the map of usage
-        expire = list()
-
-        # [(num_accessed / time_in_cache, size, ident)]
-        usage = list()
-
-        actual_size = 0
-
-        for ident, entry in self.iteritems():
-            if entry.state is EntryState.invalid:
-                expire.append(ident)
-                continue
-            elif entry.state is EntryState.waiting:
-                continue
-            else: # EntryState.ready
-                actual_size += entry.size
-                time_in_cache = max([ctime - entry.cached_at, 1])
-                usage.append((
-                    float(entry.num_accessed) / time_in_cache,
-                    -entry.size,
-                    ident))
-
-        self.average_size.add_point(actual_size)
-
-        if self.average_size.get_value() > 3 * self.desired_size:
-            log.warning("couchdb", "The average size of Cache is %.2f times "
-                        "bigger than the desired size of: %s. It might be "
-                        "a good idea to rethink the caching strategy.",
-                        self.average_size.get_value() / self.desired_size,
-                        self.desired_size)
-
-        if actual_size > self.desired_size:
-            log.debug('couchdb', "I will have to cleanup some data, "
-                      "the actual size is: %s, the desired limit is %s.",
-                      actual_size, self.desired_size)
-            # The usage list is sorted in order of things I will
-            # be removing first. The important factor is "density" of usages
-            # in time.
-            usage.sort()
-            size_to_delete = 0
-            num_to_delete = 0
-            while (len(usage) > 1 and
-                   actual_size - size_to_delete > self.desired_size):
-                _, negative_size, ident = usage.pop(0)
-                size_to_delete += -negative_size
-                num_to_delete += 1
-                expire.append(ident)
-            log.debug('couchdb', "I will remove %d entries from cache of the "
-                      "size of %s to compensate the size.",
-                      num_to_delete, size_to_delete)
+        if self.get(ident) is not entry:
+            # the entry has been evicted or replaced in the meantime
+            return
+        if entry.state is EntryState.invalid:
+            del self[ident]
+            return
+
+        self._index_etag(ident, entry.etag)
+        if entry.size is None:
+            return
+        if ident in self._sizes:
+            self.size += entry.size - self._sizes[ident]
+            self.policy.update(ident, entry.size)
+        else:
+            self.size += entry.size
+            self.policy.insert(ident, entry.size)
+        self._sizes[ident] = entry.size
 
+        self._evict()
+
+    def cleanup(self):
+        '''
+        Removes the invalid entries and evicts until the size of the cache
+        is below the desired one.
+        '''
+        expire = [ident for ident, entry in self.iteritems()
+                  if entry.state is EntryState.invalid]
         for ident in expire:
             del self[ident]
+        self._evict()
 
     def get_size(self):
-        return sum([x.size for x in self.itervalues()])
+        return self.size
+
+    def get_stats(self):
+        return dict(policy=self.policy.name,
+                    entries=len(self),
+                    size=self.size,
+                    desired_size=self.desired_size,
+                    hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions)
 
     def freshen_entries(self, response):
         etag = response.headers.get('etag')
         if response.status == 304 and etag:
             ctime = time.time()
-            for entry in self.itervalues():
-                if entry.etag == etag:
-                    entry.fresh_at = ctime
+            for ident in self._etags.get(etag, ()):
+                self[ident].fresh_at = ctime
+
+    ### private ###
+
+    def _evict(self):
+        while self.size > self.desired_size:
+            ident = self.policy.victim()
+            if ident is None:
+                break
+            if ident in self:
+                super(Cache, self).__delitem__(ident)
+            self._forget(ident)
+            self.evictions += 1
+
+    def _forget(self, ident):
+        self.size -= self._sizes.pop(ident, 0)
+        self._index_etag(ident, None)
+
+    def _index_etag(self, ident, etag):
+        old = self._entry_etags.get(ident)
+        if old == etag:
+            return
+        if old is not None:
+            idents = self._etags[old]
+            idents.discard(ident)
+            if not idents:
+                del self._etags[old]
+            del self._entry_etags[ident]
+        if etag is not None:
+            self._etags.setdefault(etag, set()).add(ident)
+            self._entry_etags[ident] = etag
 
 
 def apply_parsers(response, parsers, tag):
@@ -991,6 +1475,33 @@ def parse_response(response, tag):
             return failure.Failure(DatabaseError(msg))
 
 
+def parse_bulk_save_response(rows):
+    result = list()
+    for row in rows:
+        if 'error' not in row:
+            result.append(dict(ok=True, id=row['id'], rev=row['rev']))
+            continue
+        msg = ("Saving document %s failed with %s: %s" %
+               (row.get('id'), row['error'], row.get('reason')))
+        if row['error'] == 'conflict':
+            result.append(ConflictError(msg))
+        else:
+            result.append(DatabaseError(msg))
+    return result
+
+
+def parse_doc_id(doc):
+    '''
+    Returns the _id of the serialized document or None if it has none.
+    '''
+    try:
+        body = json.loads(doc)
+    except ValueError:
+        return None
+    if isinstance(body, dict):
+        return body.get('_id')
+
+
 def parse_binary(response, tag):
     if response.status < 300:
         return response.body
@@ -1009,19 +1520,157 @@ def parse_view_result(resp, tag):
                (resp, ))
         return failure.Failure(DatabaseError(msg))
 
-    result = list()
+    return [parse_view_row(row) for row in resp["rows"]]
 
-    for row in resp["rows"]:
-        if "id" in row:
-            if "doc" in row:
-                # querying with include_docs=True
-                r = (row["key"], row["value"], row["id"], row["doc"])
-                result.append(r)
-            else:
-                # querying without reduce
-                result.append((row["key"], row["value"], row["id"]))
+
+def parse_view_row(row):
+    if "id" in row:
+        if "doc" in row:
+            # querying with include_docs=True
+            return (row["key"], row["value"], row["id"], row["doc"])
         else:
-            # querying with reduce
-            result.append((row["key"], row["value"]))
+            # querying without reduce
+            return (row["key"], row["value"], row["id"])
+    else:
+        # querying with reduce
+        return (row["key"], row["value"])
 
-    return result
+
+def parse_view_response(response, tag):
+    '''
+    Parser of the responses received with ViewRowsDecoder. The rows have
+    already been parsed while receiving the body, the responses which
+    couldn't be streamed go through the regular parsers.
+    '''
+    if response.status < 300 and response.rows is not None:
+        return response.rows
+    resp = parse_response(response, tag)
+    if isinstance(resp, failure.Failure):
+        return resp
+    return parse_view_result(resp, tag)
+
+
+def parse_view_meta(rows, tag):
+    # used by Database.stream_view(), the rows have already been consumed
+    return rows.meta
+
+
+class ViewRows(list):
+    '''
+    List of the rows of the view, meta is the C{dict} with the remaining
+    keys of the response (total_rows, offset).
+    '''
+
+    meta = None
+
+
+class ViewResponse(httpclient.Response):
+
+    def __init__(self):
+        httpclient.Response.__init__(self)
+        # ViewRows or None if the response couldn't be streamed
+        self.rows = None
+        # number of bytes of the body
+        self.size = None
+
+
+class ViewRowsDecoder(httpclient.ResponseDecoder):
+    '''
+    Parses the rows of the view response incrementally, as the chunks of
+    the body arrive, so that the whole body is never kept in memory and
+    the parsing is spread over the reactor iterations. Each row is turned
+    into the tuple (see parse_view_row()) and passed to the consumer, or
+    collected in the response if there is none. The responses which are
+    not 200 OK are buffered and left for the regular parsers.
+    '''
+
+    rows = httpclient.Delegate('_response', 'rows')
+    size = httpclient.Delegate('_response', 'size')
+
+    rows_start = re.compile(r'"rows"\s*:\s*\[')
+    separator = re.compile(r'[\s,]*')
+    json_decoder = json.JSONDecoder()
+
+    def __init__(self, consumer=None, skip=0):
+        httpclient.ResponseDecoder.__init__(self)
+        self._response = ViewResponse()
+        self._consumer = consumer
+        self._skip = skip
+        # unparsed part of the body
+        self._pending = ''
+        # the part of the body before and after the rows array
+        self._head = None
+        self._tail = None
+        self._rows = ViewRows()
+        self._received = 0
+
+    ### IProtocol ###
+
+    def dataReceived(self, data):
+        if self.status != 200:
+            return httpclient.ResponseDecoder.dataReceived(self, data)
+        self._received += len(data)
+        if self._tail is not None:
+            self._tail += data
+            return
+        self._pending += data
+        self._parse()
+
+    def connectionLost(self, reason=None):
+        if reason or self.status != 200:
+            return httpclient.ResponseDecoder.connectionLost(self, reason)
+
+        self.size = self._received
+        if self._tail is None:
+            # the rows array has never been closed, leave the body to
+            # the regular parsers to generate the error
+            self.body = (self._head or '') + self._pending
+            self._pending = ''
+        else:
+            try:
+                self._rows.meta = json.loads(
+                    self._head + '"rows": []' + self._tail[1:])
+                del self._rows.meta['rows']
+            except ValueError:
+                self._rows.meta = dict()
+            self.rows = self._rows
+        self._deferred.callback(self._response)
+
+    ### private ###
+
+    def _parse(self):
+        buf = self._pending
+        pos = 0
+        if self._head is None:
+            match = self.rows_start.search(buf)
+            if not match:
+                return
+            self._head = buf[:match.start()]
+            pos = match.end()
+
+        size = len(buf)
+        decode = self.json_decoder.raw_decode
+        skip_separator = self.separator.match
+        while True:
+            pos = skip_separator(buf, pos).end()
+            if pos >= size:
+                break
+            if buf[pos] == ']':
+                self._tail = buf[pos:]
+                pos = size
+                break
+            try:
+                row, pos = decode(buf, pos)
+            except ValueError:
+                # the row is not complete yet, wait for more data
+                break
+            self._got_row(parse_view_row(row))
+        self._pending = buf[pos:]
+
+    def _got_row(self, row):
+        if self._skip:
+            self._skip -= 1
+        elif self._consumer is not None:
+            self._consumer(row)
+        else:
+            self._rows.append(row)
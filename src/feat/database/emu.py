@@ -148,6 +148,16 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener,
 
         return d
 
+    def bulk_save_docs(self, docs):
+        '''Imitates POST to _bulk_docs. Every document is saved on its own,
+        the errors are returned in place of the responses.'''
+        result = list()
+        for doc in docs:
+            d = self.save_doc(doc)
+            d.addErrback(lambda fail: fail.value)
+            d.addCallback(result.append)
+        return defer.succeed(result)
+
     def _analize_changes(self, doc):
         for filter_i in self._filters.itervalues():
             if filter_i.match(doc):
@@ -239,8 +249,8 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener,
                           group_level=group_level)
         if include_docs:
             d.addCallback(self._include_docs)
-        d.addCallback(self._apply_slice, **options)
         d.addCallback(self._sort_by_key, **options)
+        d.addCallback(self._apply_slice, **options)
         if 'post_process' in options:
             tag = 'query to %s' % (factory.name, )
             if callable(options['post_process']):
@@ -349,7 +359,7 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener,
 
         if skip > 0 or limit is not None:
             if limit is None:
-                index = slice(skip, -1)
+                index = slice(skip, None)
             else:
                 index = slice(skip, skip + limit)
             rows = rows[index]
@@ -357,8 +367,10 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener,
         return rows
 
     def _sort_by_key(self, rows, **options):
+        # rows with the same key are ordered by the document id
         descend = options.get('descending', False)
-        return sorted(rows, key=operator.itemgetter(0), reverse=descend)
+        return sorted(rows, key=lambda row: (row[0], row[2:3]),
+                      reverse=descend)
 
     def _matches_filter(self, tup, **filter_options):
         if 'key' in filter_options:
@@ -372,10 +384,22 @@ class Database(common.ConnectionManager, log.LogProxy, ChangeListener,
             if ((not descending and filter_options['startkey'] > tup[0]) or
                 (descending and filter_options['startkey'] < tup[0])):
                 return False
+            if ('startkey_docid' in filter_options and
+                filter_options['startkey'] == tup[0]):
+                docid = filter_options['startkey_docid']
+                if ((not descending and docid > tup[2]) or
+                    (descending and docid < tup[2])):
+                    return False
         if 'endkey' in filter_options:
             if ((not descending and filter_options['endkey'] < tup[0]) or
                 (descending and filter_options['endkey'] > tup[0])):
                 return False
+            if ('endkey_docid' in filter_options and
+                filter_options['endkey'] == tup[0]):
+                docid = filter_options['endkey_docid']
+                if ((not descending and docid < tup[2]) or
+                    (descending and docid > tup[2])):
+                    return False
         return True
 
     def _flatten(self, iterator, **filter_options):
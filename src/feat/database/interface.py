@@ -125,6 +125,19 @@ class IDatabaseClient(Interface):
                   set)
         '''
 
+    def save_documents(documents):
+        '''
+        Save multiple documents in a single request. The documents which
+        need to upload the attachments or save the linked documents are
+        saved one by one.
+
+        @param documents: C{list} of documents to save
+        @returns: Deferred called with the list of updated documents in the
+                  order they were passed. The documents which could not be
+                  saved are replaced with the exception instance
+                  (usually ConflictError).
+        '''
+
     def get_document(document_id):
         '''
         Download the document from the database and instantiate it.
@@ -256,6 +269,16 @@ class IDatabaseDriver(Interface):
         @return: Deferred fired with the HTTP response body (keys: id, rev)
         '''
 
+    def bulk_save_docs(docs):
+        '''
+        Create or update multiple documents in a single request.
+        @param docs: C{list} of strings with json documents
+        @return: Deferred fired with the list of the results in the order
+                 of the documents passed. The result is either the dict
+                 (keys: id, rev) or the exception instance (ConflictError,
+                 DatabaseError) for the document which could not be saved.
+        '''
+
     def open_doc(doc_id):
         '''
         Fetch document from database.
@@ -450,7 +473,8 @@ class IRevisionStore(Interface):
     RevisionFilter to obtain the information about the documents changed
     by this connection.'''
 
-    known_revisions = Attribute('dict of doc_id -> (last_index, last_hash)')
+    known_revisions = Attribute('mapping of doc_id -> '
+                                '(last_index, last_hash)')
     analyzes_locked = Attribute('C{bool} flag saying that at the moment the'
                                 ' notifications should not be processed')
 
@@ -566,6 +590,18 @@ class IQueryIndex(Interface):
         @returns: value or None
         '''
 
+    def get_sorted_ids():
+        '''
+        @returns: C{list} of unique ids sorted by their natural ordering,
+                  used for joining the indexes.
+        '''
+
+    def get_rank(direction):
+        '''
+        @param direction: C{feat.database.query.Direction}
+        @returns: C{dict} id -> position of the id in the index
+        '''
+
 
 class IPlanBuilder(Interface):
 
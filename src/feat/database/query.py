@@ -1,4 +1,6 @@
+import bisect
 import decimal
+import heapq
 import inspect
 import time
 
@@ -29,9 +31,38 @@ class ParsedIndex(object):
                 self.entries.append(entry)
                 self.values[entry] = value
 
+        # The structures below are built lazily the first time the index
+        # takes part in a query. The driver keeps the ParsedIndex cached
+        # as long as the ETag of the view doesn't change, so they are only
+        # rebuilt for the views which have actually changed.
+        self._sorted_ids = None
+        # Direction -> dict doc_id -> position in the index
+        self._ranks = dict()
+
     def get_value(self, id):
         return self.values.get(id)
 
+    def get_sorted_ids(self):
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(set(self.entries))
+        return self._sorted_ids
+
+    def get_rank(self, direction):
+        if direction not in self._ranks:
+            entries = self.entries
+            size = len(entries)
+            if direction == Direction.ASC:
+                # iterating backwards makes the first occurence win
+                rank = dict((entries[i], i)
+                            for i in xrange(size - 1, -1, -1))
+            else:
+                # the last occurence wins, which is the first one for
+                # the reversed index
+                rank = dict((x, size - 1 - i)
+                            for i, x in enumerate(entries))
+            self._ranks[direction] = rank
+        return self._ranks[direction]
+
 
 class Field(object):
 
@@ -551,18 +582,9 @@ def select_ids(connection, query, skip=0, limit=None,
         stop = None
 
     name, direction = query.sorting
-    index = first(v.entries
-                  for k, v in responses.iteritems() if k.field == name)
-
-    if direction == Direction.DESC:
-        index = reversed(index)
+    index = first(v for k, v in responses.iteritems() if k.field == name)
 
-    if query.aggregate:
-        # we have to copy the collection, because _get_sorted_slice()
-        # treats it as a buffer, and modifies the content
-        aggregate_index = set(temp)
-
-    r = Result(_get_sorted_slice(index, temp, skip, stop))
+    r = Result(_get_sorted_slice(index, temp, direction, skip, stop))
     r.total_count = total_count
 
     # count reductions for aggregated fields based on the view index
@@ -572,7 +594,7 @@ def select_ids(connection, query, skip=0, limit=None,
             value_index = first(v for k, v in responses.iteritems()
                                 if k.field == field)
             r.aggregations.append(handler(
-                x for x in value_iterator(aggregate_index, value_index)))
+                x for x in value_iterator(temp, value_index)))
     if include_responses:
         defer.returnValue((r, responses))
     else:
@@ -693,12 +715,17 @@ def _fail_on_subquery(fail, connection, subquery):
 
 
 def _calculate_query_response(responses, query):
+    '''
+    Evaluates the query against the parsed indexes. Returns a C{list} of
+    unique ids sorted by their natural order. The list might be the one
+    cached by the ParsedIndex, so it should never be modified in place.
+    '''
     for_parts = []
 
     for part in query.parts:
         if isinstance(part, Condition):
             key = part.get_basic_queries()[0]
-            for_parts.append(set(responses[key].entries))
+            for_parts.append(responses[key].get_sorted_ids())
         elif isinstance(part, Query):
             for_parts.append(_calculate_query_response(responses, part))
     if len(for_parts) == 1:
@@ -706,37 +733,77 @@ def _calculate_query_response(responses, query):
 
     operators = list(query.operators)
     if operators[0] == Operator.AND:
-        return set.intersection(*for_parts)
+        # start with the shortest list, this keeps the intermediate
+        # results as small as possible
+        for_parts.sort(key=len)
+        result = for_parts[0]
+        for part in for_parts[1:]:
+            if not result:
+                break
+            result = _intersect(result, part)
+        return result
     elif operators[0] == Operator.OR:
-        return set.union(*for_parts)
+        return _union(for_parts)
     else:
         raise ValueError("Unkown operator '%r' %" (operators[0], ))
 
 
-def _get_sorted_slice(index, rows, skip, stop):
-    seen = 0
-    if stop is None:
-        stop = len(rows)
-
-    for value in index:
-        if not rows:
-            return
-        try:
-            rows.remove(value)
-        except KeyError:
-            continue
-
-        seen += 1
-        if skip < seen <= stop:
-            yield value
-        if seen > stop:
+def _intersect(left, right):
+    '''
+    Merge join of two sorted lists of unique ids. The shorter list is
+    iterated and the matching position in the longer one is found by
+    galloping, which gives O(m * log(n / m)) for the lists of m <= n.
+    '''
+    if len(left) > len(right):
+        left, right = right, left
+    result = list()
+    size = len(right)
+    lo = 0
+    for value in left:
+        bound = 1
+        while lo + bound < size and right[lo + bound] < value:
+            bound *= 2
+        lo = bisect.bisect_left(right, value, lo + bound // 2,
+                                min(lo + bound + 1, size))
+        if lo == size:
             break
+        if right[lo] == value:
+            result.append(value)
+            lo += 1
+    return result
+
+
+_nothing = object()
+
+
+def _union(parts):
+    '''
+    Merges the sorted lists of unique ids into the single sorted list
+    without duplicates.
+    '''
+    result = list()
+    last = _nothing
+    for value in heapq.merge(*parts):
+        if value != last:
+            result.append(value)
+            last = value
+    return result
+
+
+def _get_sorted_slice(index, rows, direction, skip, stop):
+    '''
+    Returns the [skip:stop] slice of rows ordered by their position in
+    the sorting index. When the page is limited only the first stop rows
+    are selected (with a heap) instead of sorting all of them. The rows
+    which are not present in the sorting index go last, in the order
+    of their ids.
+    '''
+    rank = index.get_rank(direction)
+    missing = len(rank)
+    key = lambda x, get=rank.get: get(x, missing)
+
+    if stop is None or stop >= len(rows):
+        ordered = sorted(rows, key=key)
     else:
-        # if we haven't reached the sorted target,
-        # now just return the rows as they appear
-        missing = stop - seen
-        try:
-            for x in range(missing):
-                yield rows.pop()
-        except KeyError:
-            pass
+        ordered = heapq.nsmallest(stop, rows, key=key)
+    return ordered[skip:stop]
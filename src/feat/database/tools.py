@@ -343,15 +343,33 @@ def view_aterator(connection, callback, view, view_keys=dict(),
     Asynchronous iterator for the view. Downloads a view in pages
     and calls the callback for each row.
     This helps avoid transfering data in huge datachunks.
+
+    The pages of the map views are fetched with the startkey and
+    startkey_docid of the last row received, so that CouchDB doesn't
+    have to walk over all the rows skipped so far. The reduce views and
+    the queries for the specific keys are paged with skip.
     '''
+    use_keyset = (not (view.use_reduce and view_keys.get('reduce', True))
+                  and 'keys' not in view_keys and 'skip' not in view_keys)
     skip = 0
+    last_row = None
     while True:
         keys = dict(view_keys)
         keys.update(dict(skip=skip, limit=per_page))
-        records = yield connection.query_view(view, **keys)
+        if use_keyset:
+            if last_row is not None:
+                keys['startkey'] = last_row[0]
+                keys['startkey_docid'] = last_row[2]
+            rows = yield connection.query_view(view, parse_results=False,
+                                               **keys)
+            if rows:
+                skip, last_row = _next_page_skip(rows, last_row, skip)
+            records = connection._parse_view_results(rows, view, keys)
+        else:
+            rows = records = yield connection.query_view(view, **keys)
+            skip += len(records)
         log.debug('view_aterator', "Fetched %d records of the view: %s",
                   len(records), view.name)
-        skip += len(records)
         for record in records:
             try:
                 yield callback(connection, record, *args, **kwargs)
@@ -363,8 +381,27 @@ def view_aterator(connection, callback, view, view_keys=dict(),
                 if not consume_errors:
                     raise e
 
-        if not records:
+        if not rows:
+            break
+
+
+def _next_page_skip(rows, last_row, skip):
+    '''
+    Returns the skip and the row to start the next page of the map view
+    from. The same document might emit the same key many times, all the
+    rows of (key, docid) received so far need to be skipped.
+    '''
+    new_last = rows[-1]
+    count = 0
+    for row in reversed(rows):
+        if row[0] != new_last[0] or row[2] != new_last[2]:
             break
+        count += 1
+    if (count == len(rows) and last_row is not None and
+        last_row[0] == new_last[0] and last_row[2] == new_last[2]):
+        # whole page is taken by the rows of the same (key, docid)
+        count += skip
+    return count, new_last
 
 
 def rebuild_view_index(connection, design_doc):
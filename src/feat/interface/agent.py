@@ -146,6 +146,19 @@ class IAgencyAgent(Interface):
         Return the copy of the descriptor.
         '''
 
+    def find_descriptor_partners(key):
+        '''
+        Return copies of the partners of the descriptor whose recipient
+        has the specified key.
+        '''
+
+    def query_descriptor_partners(factory, role=None, with_role=False):
+        '''
+        Return copies of the partners of the descriptor which are instances
+        of the specified class and, if with_role is True, have
+        the specified role.
+        '''
+
     def get_configuration():
         '''
         Return a copy of the agents metadocument with configuration.
@@ -210,6 +223,16 @@ class IAgencyAgent(Interface):
                   set)
         '''
 
+    def save_documents(documents):
+        '''
+        Save multiple documents with a single request to the database.
+
+        @param documents: C{list} of documents to save
+        @returns: Deferred called with the list of updated documents, the
+                  ones which could not be saved are replaced with the
+                  exception instance (usually ConflictError).
+        '''
+
     def get_document(document_id):
         '''
         Download the document from the database and instantiate it.
@@ -349,6 +372,16 @@ class IAgencyAgent(Interface):
         @returns: The call id which can be used to cancel the call.
         '''
 
+    def schedule_periodic(period, method, name=None, jitter=0,
+                          aligned=True, busy=False):
+        '''
+        Calls the method after the period, on a tick shared by the periodic
+        jobs of the agency. Unless aligned is False the call is postponed
+        to a tick of a grid chosen from the period, jitter is the maximum
+        random delay added to the period.
+        @returns: The call id which can be used to cancel the call.
+        '''
+
     def cancel_delayed_call(call_id):
         '''
         Cancels the delayed call.
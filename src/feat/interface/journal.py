@@ -125,6 +125,10 @@ class IEffectHandler(Interface):
 class IJournalKeeper(Interface):
     '''Store journal entries'''
 
+    journaling = Attribute('Optional flag, if False the recorders will not '
+                           'create journal entries and use a cheaper '
+                           'fiber section. True if not specified')
+
     def register(recorder):
         '''Adds the specified recorder to the journal keeper registry.
         Should be called by every recorder when created.
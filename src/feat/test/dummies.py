@@ -71,6 +71,10 @@ class DummyBase(journal.DummyRecorderNode, log.LogProxy, log.Logger):
         self.calls[callid] = payload
         return callid
 
+    def schedule_periodic(self, period, fun, name=None, jitter=0,
+                          aligned=True, busy=False):
+        return self.call_later_ex(period, fun, busy=busy)
+
     def cancel_delayed_call(self, callid):
         if callid in self.calls:
             del self.calls[callid]
@@ -124,6 +128,13 @@ class DummyAgent(DummyBase):
     def get_descriptor(self):
         return self.descriptor
 
+    def find_descriptor_partners(self, key):
+        return [x for x in self.descriptor.partners if x.recipient.key == key]
+
+    def query_descriptor_partners(self, factory, role=None, with_role=False):
+        return [x for x in self.descriptor.partners if isinstance(x, factory)
+                and (not with_role or x.role == role)]
+
     def update_descriptor(self, _method, *args, **kwargs):
         f = fiber.succeed()
         f.add_callback(fiber.drop_param,
@@ -144,6 +155,9 @@ class DummyAgent(DummyBase):
     def save_document(self, document):
         return fiber.wrap_defer(self._db.save_document, document)
 
+    def save_documents(self, documents):
+        return fiber.wrap_defer(self._db.save_documents, documents)
+
     def update_document(self, doc_or_id, *args, **kwargs):
         return fiber.wrap_defer(self._db.update_document, doc_or_id,
                                 *args, **kwargs)
@@ -230,6 +244,9 @@ class DummyMedium(DummyMediumBase):
     def save_document(self, document):
         return self._db.save_document(document)
 
+    def save_documents(self, documents):
+        return self._db.save_documents(documents)
+
     def update_document(self, doc_or_id, *args, **kwargs):
         return self._db.update_document(doc_or_id, *args, **kwargs)
 
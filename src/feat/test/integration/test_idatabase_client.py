@@ -702,6 +702,30 @@ class TestCase(object):
         self.assertFailure(d, ConflictError)
         yield d
 
+    @defer.inlineCallbacks
+    def testSavingDocumentsInBulk(self):
+        docs = [DummyDocument(field=u"doc %d" % (x, )) for x in range(3)]
+        saved = yield self.connection.save_documents(docs)
+        self.assertEqual(docs, saved)
+        for doc in docs:
+            self.assertTrue(doc.doc_id)
+            self.assertTrue(doc.rev)
+            fetched = yield self.connection.get_document(doc.doc_id)
+            self.assertEqual(doc, fetched)
+
+        # make the second document conflict
+        second_checkout = yield self.connection.get_document(docs[1].doc_id)
+        yield self.connection.save_document(second_checkout)
+
+        for doc in docs:
+            doc.field = u"changed"
+        saved = yield self.connection.save_documents(docs)
+        self.assertEqual(docs[0], saved[0])
+        self.assertIsInstance(saved[1], ConflictError)
+        self.assertEqual(docs[2], saved[2])
+        fetched = yield self.connection.get_document(docs[2].doc_id)
+        self.assertEqual(u"changed", fetched.field)
+
     @defer.inlineCallbacks
     def testGettingDocumentUpdatingDeleting(self):
         id = u'test id'
@@ -29,7 +29,8 @@ from twisted.internet import defer
 from zope.interface import implements
 
 from feat.agents.base import descriptor, requester, replier, replay
-from feat.agencies import message, retrying
+from feat.agents.base import partners
+from feat.agencies import message, retrying, recipient
 from feat.interface.agency import ExecMode
 
 from feat.database.interface import NotFoundError
@@ -155,6 +156,42 @@ class TestAgencyAgent(common.TestCase, common.AgencyTestHelper):
         yield self.agent.update_descriptor(update_fun)
         self.assertEqual('changed', self.agent._descriptor.shard)
 
+    @defer.inlineCallbacks
+    def testDescriptorPartners(self):
+        first = partners.BasePartner(recipient.dummy_agent())
+        second = partners.BasePartner(recipient.dummy_agent(), role="role")
+
+        def add_partner(desc, partner):
+            desc.partners.append(partner)
+
+        yield self.agent.update_descriptor(add_partner, first)
+        key = first.recipient.key
+        self.assertEqual([first], self.agent.find_descriptor_partners(key))
+        self.assertEqual([first], self.agent.query_descriptor_partners(
+            partners.BasePartner))
+        self.assertEqual([], self.agent.query_descriptor_partners(
+            partners.BasePartner, "role", with_role=True))
+
+        # the lookups return copies of the partners
+        found = self.agent.find_descriptor_partners(key)
+        found[0].role = "changed"
+        self.assertEqual(None,
+                         self.agent.find_descriptor_partners(key)[0].role)
+
+        yield self.agent.update_descriptor(add_partner, second)
+        self.assertEqual([first, second], self.agent.query_descriptor_partners(
+            partners.BasePartner))
+        self.assertEqual([second], self.agent.query_descriptor_partners(
+            partners.BasePartner, "role", with_role=True))
+
+        # the descriptor replaced by a reload is used as well
+        desc = self.agent.get_descriptor()
+        del desc.partners[0]
+        self.agent._descriptor = desc
+        self.assertEqual([], self.agent.find_descriptor_partners(key))
+        self.assertEqual([second], self.agent.query_descriptor_partners(
+            partners.BasePartner))
+
     def testRegisterTwice(self):
         self.assertTrue(self.agent.register_interest(DummyReplier))
         self.failIf(self.agent.register_interest(DummyReplier))
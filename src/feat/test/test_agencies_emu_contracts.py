@@ -217,6 +217,31 @@ class TestManager(common.TestCase, common.AgencyTestHelper):
 
         return d
 
+    @common.attr(timescale=0.02)
+    def testInitiatedManagerReceivesBids(self):
+        d = self.start_manager()
+
+        def asserts_registered(_):
+            # Replies are dispatched to the protocols the agent registered
+            self.assertIs(self.medium, self.agent._protocols.get(self.guid))
+
+        d.addCallback(asserts_registered)
+        d.addCallback(defer.drop_param, self.send_announce, self.manager)
+        d.addCallback(defer.drop_param, self._consume_all)
+        d.addCallback(self._put_bids, (1, 2, 3, ))
+        d.addCallback(defer.drop_param, self.medium.wait_for_state,
+                      contracts.ContractState.closed)
+        d.addCallback(lambda _: self.manager)
+        d.addCallback(self.assertCalled, 'bid', times=3)
+        d.addCallback(self._wait_for_finish)
+
+        def asserts_unregistered(_):
+            self.assertFalse(self.guid in self.agent._protocols)
+
+        d.addCallback(asserts_unregistered)
+
+        return d
+
     @common.attr(timescale=0.02)
     def testSendAnnouncementRecvBidsAndGoToClosed(self):
         d = self.start_manager()
@@ -107,6 +107,28 @@ class SuccessTask(BaseTestTask):
         pass
 
 
+class PeriodicTask(task.StealthPeriodicTask):
+
+    protocol_id = 'periodic-task'
+
+    runs = 0
+
+    def initiate(self):
+        return task.StealthPeriodicTask.initiate(self, 1)
+
+    def run(self):
+        self.runs += 1
+
+
+class FailingPeriodicTask(PeriodicTask):
+
+    protocol_id = 'failing-periodic-task'
+
+    def run(self):
+        self.runs += 1
+        raise RuntimeError("Expected failure")
+
+
 @common.attr(timescale=0.05)
 class TestTask(common.TestCase, common.AgencyTestHelper):
 
@@ -189,3 +211,25 @@ class TestTask(common.TestCase, common.AgencyTestHelper):
         self.assertFailure(self.finished, SomeException)
         self.task.fail(SomeException('result'))
         yield self.finished
+
+    @defer.inlineCallbacks
+    def testPeriodicTask(self):
+        self.start_task(PeriodicTask)
+        yield self.wait_for(lambda: self.task.runs >= 3, 10, freq=0.1)
+        stats = self.agency.get_periodic_stats()[PeriodicTask.type_name]
+        self.assertTrue(stats["runs"] >= 2)
+        self.assertEqual(0, stats["failures"])
+        self.assertEqual(1, stats["period"])
+        self.task.cancel()
+        yield self.finished
+
+    @defer.inlineCallbacks
+    def testFailingPeriodicTask(self):
+        self.start_task(FailingPeriodicTask)
+        yield self.wait_for(lambda: self.task.runs >= 3, 10, freq=0.1)
+        stats = self.agency.get_periodic_stats()
+        stats = stats[FailingPeriodicTask.type_name]
+        self.assertTrue(stats["failures"] >= 2)
+        self.assertEqual(stats["runs"], stats["failures"])
+        self.task.cancel()
+        yield self.finished
@@ -209,6 +209,59 @@ class DBTests(common.TestCase, ModelTestMixin, GenerateEntryMixin):
         # stored value should win
         self.assertEqual('zip', writer._encoding)
 
+    @defer.inlineCallbacks
+    def testWriteAheadLog(self):
+        filename = self._get_tmp_file()
+        writer = journaler.SqliteWriter(self, filename=filename)
+        yield writer.initiate()
+        res = yield writer._db.runQuery("PRAGMA journal_mode")
+        self.assertEqual("wal", res[0][0])
+        res = yield writer._db.runQuery("PRAGMA synchronous")
+        self.assertEqual(1, res[0][0]) # NORMAL
+        yield writer.close()
+
+    @defer.inlineCallbacks
+    def testFlushSize(self):
+        jour = journaler.Journaler()
+        writer = journaler.SqliteWriter(self, flush_size=3)
+        yield writer.initiate()
+        yield jour.configure_with(writer)
+
+        entries = []
+        for x in range(5):
+            entries.append(self._generate_entry(function_id='f%d' % x))
+            entries.append(self._generate_log(line_num=x))
+        yield jour.insert_entries(entries)
+
+        yield self._assert_entries(jour, 5)
+        histories = yield writer.get_histories()
+        stored = yield writer.get_entries(histories[0])
+        self.assertEqual(['f%d' % x for x in range(5)],
+                         [e['function_id'] for e in stored])
+        logs = yield writer.get_log_entries()
+        self.assertEqual(range(5), [l['line_num'] for l in logs])
+
+    @defer.inlineCallbacks
+    def testFlushInterval(self):
+        writer = journaler.SqliteWriter(self, flush_size=3,
+                                        flush_interval=0.1)
+        yield writer.initiate()
+
+        d = writer.insert_entries([self._generate_entry()])
+        self.assertFalse(d.called)
+        self.assertFalse(writer.is_idle())
+        yield d
+        self.assertTrue(writer.is_idle())
+        yield self._assert_entries(writer, 1)
+
+        # reaching the flush size writes right away
+        entries = [self._generate_entry() for _ in range(3)]
+        d = writer.insert_entries(entries)
+        self.assertEqual(None, writer._flush_call)
+        yield d
+        self.assertTrue(writer.is_idle())
+        yield self._assert_entries(writer, 4)
+
     @defer.inlineCallbacks
     @common.attr(timeout=10)
     def testJourfileRotation(self):
@@ -321,8 +374,15 @@ class DBTests(common.TestCase, ModelTestMixin, GenerateEntryMixin):
     def _get_tmp_file(self):
         fd, name = tempfile.mkstemp(suffix='_journal.sqlite')
         self.addCleanup(os.remove, name)
+        # write-ahead log files left by writers not closed
+        for suffix in ('-wal', '-shm'):
+            self.addCleanup(self._remove_if_exists, name + suffix)
         return name
 
+    def _remove_if_exists(self, name):
+        if os.path.exists(name):
+            os.remove(name)
+
     @defer.inlineCallbacks
     def _assert_entries(self, jour, expected):
         num = yield self._get_number_of_entries(jour, expected)
@@ -0,0 +1,79 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+from feat.agencies import message, recipient
+from feat.common.serialization import pytree
+from feat.test import common
+
+
+class TestMessageCopies(common.TestCase):
+
+    def setUp(self):
+        common.TestCase.setUp(self)
+        self.msg = message.DialogMessage(
+            message_id='id', protocol_id='proto',
+            payload=dict(nested=dict(value=1)))
+        self.msg.reply_to = recipient.Agent('agent', 'shard')
+
+    def testCloneSharesUntilAccessed(self):
+        clone = self.msg.clone()
+        self.assertFalse('payload' in clone.__dict__)
+        self.assertFalse('payload' in self.msg.__dict__)
+        self.assertEqual('id', clone.message_id)
+
+        # both sides get their own copy
+        clone.payload['nested']['value'] = 2
+        self.assertEqual(1, self.msg.payload['nested']['value'])
+        self.msg.payload['nested']['value'] = 3
+        self.assertEqual(2, clone.payload['nested']['value'])
+        self.assertEqual(self.msg.reply_to, clone.reply_to)
+        self.assertIsNot(self.msg.reply_to, clone.reply_to)
+
+    def testCloneOfClone(self):
+        clone = self.msg.clone()
+        clone.payload['new'] = True
+        second = clone.clone()
+        second.recipient = recipient.Agent('other', 'shard')
+        self.assertEqual(dict(nested=dict(value=1), new=True),
+                         second.payload)
+        self.assertIs(None, clone.recipient)
+        self.assertFalse('new' in self.msg.payload)
+
+    def testDuplicate(self):
+        clone = self.msg.clone()
+        duplicate = clone.duplicate()
+        self.assertIs(None, duplicate.message_id)
+        self.assertIs(None, duplicate.reply_to)
+        self.assertFalse('_shared' in duplicate.__dict__)
+        duplicate.payload['nested']['value'] = 5
+        self.assertEqual(1, clone.payload['nested']['value'])
+
+    def testSerialization(self):
+        clone = self.msg.clone()
+        self.assertEqual(self.msg.snapshot(), clone.snapshot())
+        # serializing doesn't copy the shared values
+        self.assertFalse('payload' in clone.__dict__)
+
+        serializer = pytree.Serializer()
+        unserializer = pytree.Unserializer()
+        copy = unserializer.convert(serializer.convert(clone))
+        self.assertEqual(self.msg, copy)
+        self.assertFalse('_shared' in copy.__dict__)
@@ -0,0 +1,114 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+from twisted.internet import defer
+
+from feat.agencies import message
+from feat.agencies.messaging import net
+from feat.common import time
+from feat.test import common
+
+
+class DummyAMQPChannel(object):
+
+    def __init__(self):
+        self.published = list()
+        self.commits = list()
+
+    def basic_publish(self, exchange, content, routing_key, immediate):
+        self.published.append((exchange, routing_key))
+        return defer.succeed(None)
+
+    def tx_commit(self):
+        d = defer.Deferred()
+        self.commits.append((len(self.published), d))
+        return d
+
+
+class TestPublishing(common.TestCase):
+
+    def setUp(self):
+        common.TestCase.setUp(self)
+        self.amqp = DummyAMQPChannel()
+
+    def create_channel(self, size, delay=0):
+        channel = net.Channel(self, defer.Deferred(), None, size, delay)
+        channel.channel = self.amqp
+        channel._set_state(net.ChannelState.performing)
+        return channel
+
+    def message(self):
+        msg = message.BaseMessage()
+        msg.expiration_time = time.future(10)
+        return msg
+
+    def testCommitEachMessage(self):
+        channel = self.create_channel(1)
+        msg = self.message()
+        result = list()
+        d = channel.publish('key', 'shard', msg)
+        d.addCallback(result.append)
+        self.assertEqual(1, len(self.amqp.commits))
+        self.assertEqual([], result)
+        self.amqp.commits[0][1].callback(None)
+        self.assertEqual([msg], result)
+
+    def testCommitFullBatch(self):
+        channel = self.create_channel(3, 10)
+        messages = [self.message() for x in range(4)]
+        defers = [channel.publish('key', 'shard', x) for x in messages]
+        self.assertEqual(4, len(self.amqp.published))
+        self.assertEqual(1, len(self.amqp.commits))
+        self.assertEqual(3, self.amqp.commits[0][0])
+        self.amqp.commits[0][1].callback(None)
+        for msg, d in zip(messages[:3], defers):
+            self.assertTrue(d.called)
+            self.assertIs(msg, d.result)
+        self.assertFalse(defers[3].called)
+
+        # last message is committed by the flush
+        channel.flush()
+        self.assertEqual(2, len(self.amqp.commits))
+        self.amqp.commits[1][1].errback(RuntimeError('failed commit'))
+        self.assertFailure(defers[3], RuntimeError)
+        return defers[3]
+
+    @defer.inlineCallbacks
+    def testCommitAfterDelay(self):
+        channel = self.create_channel(10, 0.01)
+        d = channel.publish('key', 'shard', self.message())
+        self.assertEqual([], self.amqp.commits)
+        yield common.delay(None, 0.05)
+        self.assertEqual(1, len(self.amqp.commits))
+        self.amqp.commits[0][1].callback(None)
+        self.assertTrue(d.called)
+
+    def testBatchRequeuedOnConnectionLost(self):
+        channel = self.create_channel(10, 10)
+        channel.factory = net.AMQFactory.__new__(net.AMQFactory)
+        channel.factory.add_connection_made_cb = defer.Deferred
+        d = channel.publish('key', 'shard', self.message())
+        channel._on_connection_lost()
+        self.assertFalse(d.called)
+        self.assertEqual(0, len(channel._batch))
+        self.assertIs(None, channel._batch_call)
+        key, shard, _message, cb = channel._to_send.pop()
+        self.assertIs(d, cb)
@@ -426,3 +426,61 @@ class TestRouting(common.TestCase):
         m_id = msg.message_id
         m_ids = [msg.message_id for msg in sink.messages]
         self.assertFalse(m_id in m_ids, "Messages are: %r" % (sink.messages, ))
+
+
+class TestTable(common.TestCase):
+
+    implements(ITimeProvider)
+
+    def get_time(self):
+        return self._time
+
+    def setUp(self):
+        self._time = time.time()
+        self.table = routing.Table(self, self)
+
+    def testPriorityOrder(self):
+        key = ('agent', 'shard')
+        low = BaseDummySink(self, key=key)
+        high = BaseDummySink(self, key=key)
+        other = BaseDummySink(self, key=('other', 'shard'))
+        self.table.append_route(low.create_route(priority=10, final=True))
+        self.table.append_route(high.create_route(priority=1, final=False))
+        self.table.append_route(other.create_route())
+
+        self.table.dispatch(direct(key), outgoing=False)
+        self.assertEqual(1, len(high.messages))
+        self.assertEqual(1, len(low.messages))
+        self.assertEqual(0, len(other.messages))
+
+        self.table.remove_sink(low)
+        self.table.dispatch(direct(key), outgoing=False)
+        self.assertEqual(2, len(high.messages))
+        self.assertEqual(1, len(low.messages))
+
+        # nonfinal route leaves the message in the store for the next route
+        self.table.remove_sink(high)
+        self.assertEqual([('other', 'shard')], self.table._index.keys())
+        msg = direct(key, expiration_time=self._time + 10)
+        self.table.dispatch(msg, outgoing=False)
+        self.table.append_route(low.create_route(priority=10, final=True))
+        self.assertEqual([msg.message_id],
+                         [x.message_id for x in low.messages[1:]])
+
+    def testStoreRemovesExpiredKeys(self):
+        store = routing.MessageStore(self)
+        for index in range(20):
+            store.insert(direct(('agent%d' % index, 'shard'),
+                                expiration_time=self._time + 1))
+        self.assertEqual(20, len(store))
+        self._time += 2
+        self.assertEqual(0, len(store))
+
+        # the expired keys are removed when the number of keys doubles
+        for index in range(13):
+            store.insert(direct(('late%d' % index, 'shard'),
+                                expiration_time=self._time + 1))
+        self.assertEqual(13, len(store._store))
+        route = BaseDummySink(self).create_route(key=('late0', 'shard'))
+        self.assertEqual(1, len(store.match_to_route(route)))
+        self.assertEqual(12, len(store._store))
@@ -0,0 +1,156 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+from twisted.internet import task
+
+from feat.agencies import periodic
+from feat.common import defer
+from feat.test import common
+
+from twisted.internet.error import AlreadyCalled, AlreadyCancelled
+
+
+class PeriodicSchedulerTest(common.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000)
+        self.scheduler = periodic.PeriodicScheduler(self, self.clock, seed=3)
+        self.fired = []
+        return common.TestCase.setUp(self)
+
+    def call(self, period, value, **kwargs):
+        return self.scheduler.call_later(period,
+                                         lambda: self.fired.append(value),
+                                         name=str(value), **kwargs)
+
+    def testAlignmentStep(self):
+        self.assertEqual(None, periodic.alignment_step(0.5))
+        self.assertEqual(0.1, periodic.alignment_step(1))
+        self.assertEqual(0.1, periodic.alignment_step(3))
+        self.assertEqual(1, periodic.alignment_step(10))
+        self.assertEqual(5, periodic.alignment_step(60))
+        self.assertEqual(300, periodic.alignment_step(3600))
+
+    def testSharedTicks(self):
+        self.clock.advance(0.125)
+        call1 = self.call(10, 1)
+        self.clock.advance(0.25)
+        call2 = self.call(10, 2)
+        self.clock.advance(0.5)
+        call3 = self.call(20, 3)
+        call4 = self.call(20, 4, aligned=False)
+        self.assertEqual(1011, call1.getTime())
+        self.assertEqual(1011, call2.getTime())
+        self.assertEqual(1021, call3.getTime())
+        self.assertEqual(1020.875, call4.getTime())
+        self.assertEqual(3, len(self.clock.getDelayedCalls()))
+        self.assertEqual(4, len(self.scheduler))
+
+        self.clock.advance(10.125)
+        self.assertEqual([1, 2], self.fired)
+        self.clock.advance(9.875)
+        self.assertEqual([1, 2, 4], self.fired)
+        self.clock.advance(0.125)
+        self.assertEqual([1, 2, 4, 3], self.fired)
+        self.assertEqual(0, len(self.scheduler))
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def testSchedulingFromCall(self):
+
+        def run():
+            self.fired.append(self.clock.seconds())
+            if len(self.fired) < 3:
+                self.scheduler.call_later(3, run)
+
+        self.scheduler.call_later(3, run)
+        self.clock.pump([0.1] * 100)
+        self.assertEqual(3, len(self.fired))
+        self.assertApproximates(1003, self.fired[0], 1e-6)
+        self.assertApproximates(1006, self.fired[1], 1e-6)
+        self.assertApproximates(1009, self.fired[2], 1e-6)
+
+    def testCancel(self):
+        call1 = self.call(10, 1)
+        call2 = self.call(10, 2)
+        self.assertTrue(call1.active())
+        call1.cancel()
+        self.assertFalse(call1.active())
+        self.assertRaises(AlreadyCancelled, call1.cancel)
+        self.assertEqual(1, len(self.clock.getDelayedCalls()))
+        call2.cancel()
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+        # a call cancelled by another one run on the same tick
+        call3 = self.scheduler.call_later(10, lambda: call4.cancel())
+        call4 = self.call(10, 4)
+        self.clock.advance(10)
+        self.assertEqual([], self.fired)
+        self.assertFalse(call3.active())
+        self.assertRaises(AlreadyCalled, call3.cancel)
+        self.assertFalse(call4.active())
+
+    def testJitter(self):
+        times = set()
+        for i in range(20):
+            times.add(self.call(10, i, jitter=5).getTime())
+        # the jittered calls are spread on the ticks of the grid
+        self.assertTrue(1 < len(times) <= 6)
+        for t in times:
+            self.assertTrue(1010 <= t <= 1015)
+            self.assertEqual(int(t), t)
+
+    def testStatistics(self):
+        deferreds = []
+
+        def run():
+            d = defer.Deferred()
+            deferreds.append(d)
+            return d
+
+        def fail():
+            raise ValueError("expected")
+
+        self.scheduler.call_later(2, run, name="job")
+        self.scheduler.call_later(2, run, name="job")
+        self.scheduler.call_later(2, fail, name="failing")
+        self.clock.advance(2)
+        self.assertEqual(2, len(deferreds))
+        self.clock.advance(1)
+        deferreds[0].callback(None)
+        self.clock.advance(2)
+        deferreds[1].callback(None)
+
+        stats = self.scheduler.get_stats()
+        self.assertEqual(["failing", "job"], sorted(stats))
+        job = stats["job"]
+        self.assertEqual(2, job["period"])
+        self.assertEqual(2, job["runs"])
+        self.assertEqual(1, job["overruns"])
+        self.assertEqual(0, job["failures"])
+        self.assertEqual(3, job["last"])
+        self.assertEqual(3, job["max"])
+        self.assertEqual(2, job["mean"])
+        self.assertEqual(1, stats["failing"]["runs"])
+        self.assertEqual(1, stats["failing"]["failures"])
+
+        self.scheduler.clear_stats()
+        self.assertEqual({}, self.scheduler.get_stats())
@@ -19,9 +19,12 @@
 # See "LICENSE.GPL" in the source distribution for more information.
 
 # Headers in this file shall remain intact.
+import copy
+
 from feat.test import common
 from feat.agents.base import partners
-from feat.agencies import recipient
+from feat.agencies import agency, recipient
+from feat.common import defer, fiber
 
 
 class FirstPartner(partners.BasePartner):
@@ -110,6 +113,45 @@ class TestPartners(common.TestCase):
         self.assertIsInstance(specials, list)
         self.assertEqual(3, len(specials))
 
+    @defer.inlineCallbacks
+    def testFindingPartners(self):
+        generated = self._generate_partners()
+        first = generated[0]
+        self.assertEqual(first, self.partners.find(first.recipient))
+        self.assertEqual(first, self.partners.find(first.recipient.key))
+        self.assertEqual(None, self.partners.find(recipient.dummy_agent()))
+
+        new = self._generate_partner(SecondPartner)
+        yield self.partners.update_partner(new)
+        self.assertEqual(new, self.partners.find(new.recipient))
+        self.assertEqual(4, len(self.partners.second))
+        self.assertEqual(3, len(self.partners.all_with_role("special")))
+
+        new.role = "special"
+        yield self.partners.update_partner(new)
+        self.assertEqual(new, self.partners.find(new.recipient))
+        self.assertEqual(4, len(self.partners.second))
+        self.assertEqual(4, len(self.partners.all_with_role("special")))
+
+        yield self.partners.remove(new)
+        self.assertEqual(None, self.partners.find(new.recipient))
+        self.assertEqual(3, len(self.partners.second))
+        self.assertEqual(3, len(self.partners.all_with_role("special")))
+
+        # the lookups return copies of the partners
+        found = self.partners.find(first.recipient)
+        found.role = "changed"
+        self.assertEqual(None, self.partners.find(first.recipient).role)
+
+    def testFindingDuplicates(self):
+        first = self._generate_partner(FirstPartner)
+        double = SecondPartner(first.recipient)
+        self._inject_partners([first, double])
+        self.assertRaises(partners.FindPartnerError,
+                          self.partners.find, first.recipient)
+        self.assertRaises(partners.FindPartnerError,
+                          self.partners.find, double.recipient.key)
+
     def _generate_partners(self):
         partners = [
             self._generate_partner(FirstPartner),
@@ -119,13 +161,31 @@ class TestPartners(common.TestCase):
             self._generate_partner(SpecialPartner)]
 
         self._inject_partners(partners)
+        return partners
 
     def _inject_partners(self, partners):
+        desc = DummyDesc(partners)
 
         def get_descriptor():
-            return DummyDesc(partners)
+            return desc
+
+        def find_descriptor_partners(key):
+            index = agency.PartnersIndex(desc)
+            return copy.deepcopy(index.find(key))
+
+        def query_descriptor_partners(factory, role=None, with_role=False):
+            index = agency.PartnersIndex(desc)
+            return copy.deepcopy(index.query(factory, role, with_role))
+
+        def update_descriptor(method, *args, **kwargs):
+            return fiber.succeed(method(desc, *args, **kwargs))
 
         setattr(self.agent, 'get_descriptor', get_descriptor)
+        setattr(self.agent, 'find_descriptor_partners',
+                find_descriptor_partners)
+        setattr(self.agent, 'query_descriptor_partners',
+                query_descriptor_partners)
+        setattr(self.agent, 'update_descriptor', update_descriptor)
 
     def _generate_partner(self, factory, role=None):
         recp = recipient.dummy_agent()
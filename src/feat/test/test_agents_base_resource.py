@@ -172,6 +172,89 @@ class PortResourceTest(common.TestCase, Common):
         self.agent.time += 15
         self._assert_allocated([[], [1001, 1002, 1003]])
 
+    @defer.inlineCallbacks
+    def testUsageMaintained(self):
+        self.resources.define('ports', resource.Range, 10000, 30000)
+        allocs = []
+        for _ in range(20):
+            alloc = yield self.resources.allocate(ports=100)
+            allocs.append(alloc)
+        for alloc in allocs[::2]:
+            yield self.resources.release(alloc.id)
+        pre = yield self.resources.preallocate(ports=150)
+        mod = yield self.resources.premodify(
+            allocs[1].id, ports=('release', 10100, 'add', 1))
+        yield self.resources.confirm(mod.id)
+
+        expected = self.resources.allocated()['ports']
+        self.assertEqual(1000 + 150, len(expected))
+        self.assertNotIn(10100, expected)
+        # the usage rebuilt from the allocations gives the same result
+        self.resources._get_state().usage = None
+        self.assertEqual(expected, self.resources.allocated()['ports'])
+
+        self.agent.time += 15
+        self.assertEqual(1000, len(self.resources.allocated()['ports']))
+        self.assertNotIn(pre.alloc['ports'].values.pop(),
+                         self.resources.allocated()['ports'])
+
+
+class RangeUsageTest(common.TestCase):
+
+    def setUp(self):
+        self.range = resource.Range('ports', 10, 30)
+
+    def testFreeValues(self):
+        usage = self.range.usage([AllocatedRange([10, 11, 12]),
+                                  AllocatedRange([15, 20]),
+                                  AllocatedRange([13, 30])])
+        self.assertEqual([10, 11, 12, 13, 15, 20, 30],
+                         list(usage.iter_used()))
+        self.assertEqual([14, 16, 17, 18, 19, 21],
+                         list(usage.iter_free())[:6])
+        self.assertEqual(7, len(usage))
+
+        alloc = self.range.allocate(usage, 3)
+        self.assertEqual(set([14, 16, 17]), alloc.values)
+        usage.add(alloc)
+        self.assertEqual([18, 19, 21], list(usage.iter_free())[:3])
+
+        usage.remove(AllocatedRange([13, 30]))
+        usage.remove(alloc)
+        self.assertEqual([10, 11, 12, 15, 20], list(usage.iter_used()))
+        self.assertEqual([10, 11, 12, 15, 20], self.range.reduce(usage))
+
+        self.assertRaises(resource.NotEnoughResource,
+                          self.range.allocate, usage, 17)
+        self.assertEqual(16, len(self.range.allocate(usage, 16).values))
+
+    def testSharedValues(self):
+        usage = self.range.usage([AllocatedRange([10, 11])])
+        usage.add(AllocatedRange([11]))
+        usage.remove(AllocatedRange([10, 11]))
+        self.assertEqual([11], list(usage.iter_used()))
+        # releases of modifications are not accounted before applied
+        usage.add(RangeModification([-11, 12]))
+        self.assertEqual([11, 12], list(usage.iter_used()))
+
+    def testModify(self):
+        usage = self.range.usage([AllocatedRange([10, 11])])
+        change = self.range.modify(usage, AllocatedRange([10, 11]),
+                                   'add', 2, 'add', 1, 'release', 10)
+        self.assertEqual(set([12, 13, 14, -10]), change.values)
+        self.assertRaises(resource.NotEnoughResource, self.range.modify,
+                          usage, None, 'add_specific', 11)
+
+    def testSerialization(self):
+        usage = self.range.usage([AllocatedRange([10, 11, 12]),
+                                  AllocatedRange([20]),
+                                  AllocatedRange([20])])
+        copy = pytree.unserialize(pytree.serialize(usage))
+        self.assertEqual(list(usage.iter_used()), list(copy.iter_used()))
+        copy.remove(AllocatedRange([20]))
+        self.assertIn(20, copy)
+        self.assertEqual(list(usage.iter_free()), list(copy.iter_free()))
+
 
 @common.attr(timescale=0.05)
 class ResourcesTest(common.TestCase, Common):
@@ -230,6 +313,45 @@ class ResourcesTest(common.TestCase, Common):
         self._assert_allocated([3, 3])
         self._assert_preallocated({'a': 0, 'b': 0})
 
+    @defer.inlineCallbacks
+    def testUsageTotals(self):
+        allocation = yield self.resources.allocate(a=2, b=1)
+        self.assertEqual(dict(a=('scalar_def', 5, 2, 0),
+                              b=('scalar_def', 6, 1, 0)),
+                         self.resources.get_usage())
+
+        def get_descriptor():
+            self.fail("Descriptor should not be needed")
+
+        # the totals are maintained without going through the allocations
+        self.agent.get_descriptor = get_descriptor
+        yield self.resources.preallocate(a=2)
+        yield self.resources.allocate(b=3)
+        self.assertEqual(dict(a=('scalar_def', 5, 4, 2),
+                              b=('scalar_def', 6, 4, 0)),
+                         self.resources.get_usage())
+        pre = yield self.resources.preallocate(a=2)
+        self.assertIs(None, pre)
+
+        self.agent.time += 15
+        self.assertEqual(dict(a=('scalar_def', 5, 2, 0),
+                              b=('scalar_def', 6, 4, 0)),
+                         self.resources.get_usage())
+        del self.agent.get_descriptor
+
+        change = yield self.resources.premodify(allocation.id, a=-1, b=2)
+        self.assertEqual(dict(a=('scalar_def', 5, 2, 0),
+                              b=('scalar_def', 6, 6, 2)),
+                         self.resources.get_usage())
+        yield self.resources.confirm(change.id)
+        self.assertEqual(dict(a=('scalar_def', 5, 1, 0),
+                              b=('scalar_def', 6, 6, 0)),
+                         self.resources.get_usage())
+        yield self.resources.release(allocation.id)
+        self.assertEqual(dict(a=('scalar_def', 5, 0, 0),
+                              b=('scalar_def', 6, 3, 0)),
+                         self.resources.get_usage())
+
     @defer.inlineCallbacks
     def testCannotOverallocate(self):
         allocation = yield self.resources.preallocate(a=10)
@@ -140,6 +140,186 @@ class TestDNSAgentLabour(common.TestCase):
         yield check("spam", ["192.168.0.1"], 42, aa_ttl=42)
         yield check("spam", ["192.168.0.1", "192.168.0.2"], 300)
 
+    @defer.inlineCallbacks
+    def testBatchedNotify(self):
+        notify = dns_agent.NotifyConfiguration(window=0.1)
+        suffix = 'mydomain.lan'
+        patron = log.LogProxy(self)
+        labour = production.Labour(
+            patron, notify, suffix, '127.0.0.1', 'ns.' + suffix, 300)
+        self.assertTrue(labour.startup(0))
+        sent = []
+        labour._send_notify = sent.append
+        resolver = labour._resolver
+        serial = resolver.soa[1].serial
+
+        for name in ('spam', 'eggs', 'bacon'):
+            name = format_name(name, suffix)
+            labour.update_records(name, [RecordA(ip='192.168.0.1', ttl=300)])
+            labour.notify_slaves()
+        # the updates are visible before being committed
+        self.assertIn(format_name('eggs', suffix), resolver.records)
+        self.assertEqual(serial, resolver.soa[1].serial)
+        self.assertEqual([], sent)
+
+        yield common.delay(None, 0.2)
+        self.assertEqual(serial + 1, resolver.soa[1].serial)
+        self.assertEqual(notify.slaves, sent)
+        self.assertEqual(1, len(resolver.journal))
+
+        # notifying without any change does not bump the serial
+        labour.notify_slaves()
+        yield common.delay(None, 0.2)
+        self.assertEqual(serial + 1, resolver.soa[1].serial)
+        self.assertEqual(notify.slaves, sent)
+        yield labour.cleanup()
+
+    @defer.inlineCallbacks
+    def testIncrementalTransfer(self):
+        suffix = 'mydomain.lan'
+        spam = format_name('spam', suffix)
+        eggs = format_name('eggs', suffix)
+        resolver = production.Resolver(
+            suffix, 'ns.' + suffix, dns_agent.NotifyConfiguration(),
+            '127.0.0.1', 300)
+        serial0 = resolver.soa[1].serial
+
+        self.assertFalse(resolver.commit())
+        resolver.update_records(spam, [RecordA(ip='192.168.0.1', ttl=300)])
+        self.assertTrue(resolver.commit())
+        serial1 = resolver.soa[1].serial
+        resolver.update_records(spam, [RecordA(ip='192.168.0.2', ttl=300)])
+        resolver.update_records(eggs, [RecordCNAME(ip=spam, ttl=300)])
+        self.assertTrue(resolver.commit())
+        serial2 = resolver.soa[1].serial
+        self.assertTrue(serial0 < serial1 < serial2)
+
+        def describe(answers):
+            result = []
+            for rr in answers:
+                if rr.type == dns.SOA:
+                    result.append(rr.payload.serial)
+                elif rr.type == dns.A:
+                    result.append((str(rr.name),
+                                   socket.inet_ntoa(rr.payload.address)))
+                else:
+                    result.append((str(rr.name), str(rr.payload.name)))
+            return result
+
+        ans, _, _ = yield resolver.lookupIncrementalZoneTransfer(
+            suffix, serial2)
+        self.assertEqual([serial2], describe(ans))
+
+        ans, _, _ = yield resolver.lookupIncrementalZoneTransfer(
+            suffix, serial1)
+        self.assertEqual([serial2,
+                          serial1, (spam, '192.168.0.1'),
+                          serial2, (eggs, spam), (spam, '192.168.0.2'),
+                          serial2], describe(ans))
+
+        ans, _, _ = yield resolver.lookupIncrementalZoneTransfer(
+            suffix, serial0)
+        self.assertEqual([serial2,
+                          serial0,
+                          serial1, (spam, '192.168.0.1'),
+                          serial1, (spam, '192.168.0.1'),
+                          serial2, (eggs, spam), (spam, '192.168.0.2'),
+                          serial2], describe(ans))
+
+        # serials older than the journal get the whole zone
+        resolver.journal_size = 1
+        resolver.update_records(eggs, [])
+        self.assertTrue(resolver.commit())
+        self.assertEqual(1, len(resolver.journal))
+        ans, _, _ = yield resolver.lookupIncrementalZoneTransfer(
+            suffix, serial0)
+        self.assertEqual(ans[0].payload.serial, ans[-1].payload.serial)
+        self.assertIn((spam, '192.168.0.2'), describe(ans))
+        self.assertNotIn((eggs, spam), describe(ans))
+
+        factory = production.DNSServerFactory(clients=[resolver])
+        query = dns.Message()
+        query.addQuery(suffix, dns.IXFR)
+        query.authority.append(dns.RRHeader(
+            suffix, dns.SOA, payload=dns.Record_SOA(serial=serial2)))
+        ans, _, _ = yield factory._incremental_transfer(
+            query.queries[0], query, None)
+        self.assertEqual(5, len(ans))
+        # answers too big for UDP only get the current SOA
+        factory.max_udp_transfer = 3
+        ans, _, _ = yield factory._incremental_transfer(
+            query.queries[0], query, ('127.0.0.1', 53))
+        self.assertEqual([resolver.soa[1].serial], describe(ans))
+
+
+    @defer.inlineCallbacks
+    def testAnswerCache(self):
+        suffix = 'mydomain.lan'
+        spam, eggs, bacon = [format_name(x, suffix)
+                             for x in ('spam', 'eggs', 'bacon')]
+        resolver = production.Resolver(
+            suffix, 'ns.' + suffix, dns_agent.NotifyConfiguration(),
+            '127.0.0.1', 300)
+
+        def query(name, type=dns.A):
+            return resolver.query(dns.Query(name, type))
+
+        def describe((ans, auth, add)):
+            result = []
+            for rr in ans:
+                if rr.type == dns.A:
+                    result.append((str(rr.name),
+                                   socket.inet_ntoa(rr.payload.address)))
+                else:
+                    result.append((str(rr.name), str(rr.payload.name)))
+            return result
+
+        resolver.update_records(spam, [RecordCNAME(ip=eggs, ttl=300)])
+        resolver.update_records(eggs, [RecordCNAME(ip=bacon, ttl=300)])
+        resolver.update_records(bacon, [RecordA(ip='192.168.0.1', ttl=300)])
+
+        res = yield query(spam)
+        self.assertEqual([(spam, eggs), (eggs, bacon),
+                          (bacon, '192.168.0.1')], describe(res))
+        self.assertIn((spam, dns.A), resolver._answers)
+        res2 = yield query(spam)
+        self.assertIs(res, res2)
+
+        # all the spellings of the name share the answer
+        res = yield query(spam.upper())
+        self.assertEqual([(spam.upper(), eggs), (eggs, bacon),
+                          (bacon, '192.168.0.1')], describe(res))
+        self.assertEqual([(spam, dns.A)], resolver._answers.keys())
+        res = yield query(spam)
+        self.assertIs(res2, res)
+
+        res = yield query(spam, dns.CNAME)
+        self.assertEqual([(spam, eggs)], describe(res))
+
+        # updating the end of the chain updates the answer
+        resolver.update_records(bacon, [RecordA(ip='192.168.0.2', ttl=300)])
+        self.assertEqual({}, resolver._answers)
+        res = yield query(spam)
+        self.assertEqual([(spam, eggs), (eggs, bacon),
+                          (bacon, '192.168.0.2')], describe(res))
+
+        # name without the requested records only get the SOA
+        ans, auth, add = yield query(bacon, dns.MX)
+        self.assertEqual([], ans)
+        self.assertEqual([dns.SOA], [rr.type for rr in auth])
+
+        # loops in the chain are cut
+        resolver.update_records(bacon, [RecordCNAME(ip=spam, ttl=300)])
+        res = yield query(spam)
+        self.assertEqual([(spam, eggs), (eggs, bacon), (bacon, spam)],
+                         describe(res))
+
+        # unknown names are not cached
+        d = query(format_name('unknown', suffix))
+        self.assertFailure(d, dns.AuthoritativeDomainError)
+        yield d
+        self.assertEqual(1, len(resolver._answers))
+
 
 class TestDNSAgentMisc(common.TestCase):
 
@@ -103,6 +103,10 @@ class DummyPatron(journal.DummyRecorderNode, log.LogProxy, log.Logger):
         self.calls[callid] = payload
         return callid
 
+    def schedule_periodic(self, period, fun, name=None, jitter=0,
+                          aligned=True, busy=False):
+        return self.call_later_ex(period, fun, busy=busy)
+
     def cancel_delayed_call(self, callid):
         if callid in self.calls:
             del self.calls[callid]
@@ -104,6 +104,10 @@ class DummyPatron(journal.DummyRecorderNode, log.LogProxy, log.Logger):
         self.calls[self.cid] = (time, fun, args, kwargs)
         return self.cid
 
+    def schedule_periodic(self, period, fun, name=None, jitter=0,
+                          aligned=True, busy=False):
+        return self.call_later_ex(period, fun, busy=busy)
+
     def cancel_delayed_call(self, dc):
         if dc in self.calls:
             del self.calls[dc]
@@ -353,6 +353,45 @@ class TestExpDict(common.TestCase):
         d.pack() # calling pack() always pack
         self.assertEqual(d.size(), 0)
 
+    def testReplacedAndRemovedItems(self):
+        t = DummyTimeProvider(0)
+        d = ExpDict(t)
+        d.set("spam", 1, 10)
+        d.set("spam", 2, 30) # the first expiration is not used anymore
+        d.set("bacon", 3, 10)
+        d["bacon"] = 4 # replaced by an item which never expire
+        d.set("eggs", 5, 10)
+        del d["eggs"]
+        d.set("beans", 6, 20)
+        self.assertEqual(len(d), 3)
+
+        t.time += 15
+        self.assertEqual(len(d), 3)
+        self.check_iterator(d.iteritems(), [("spam", 2), ("bacon", 4),
+                                            ("beans", 6)])
+        d.set("eggs", 7, 40)
+        self.assertEqual(len(d), 4)
+
+        t.time += 10
+        self.assertEqual(len(d), 3)
+        self.assertEqual(d.size(), 4)
+        d.set("beans", 8, 50) # replacing an expired item
+        self.assertEqual(len(d), 4)
+        self.assertEqual(d.pop("beans"), 8)
+        self.assertEqual(len(d), 3)
+
+        t.time += 10
+        self.assertEqual(len(d), 2)
+        d.pack()
+        self.assertEqual(d.size(), 2)
+        self.check_iterator(d.iteritems(), [("bacon", 4), ("eggs", 7)])
+
+        # replacing the same key does not grow the expiration index
+        for i in range(1000):
+            d.set("spam", i, 100 + i)
+        self.assertEqual(len(d), 3)
+        self.assertTrue(len(d._heap) <= 2 * d.size())
+
     def testSerialization(self):
         t = DummyTimeProvider(0)
         serialize = pytree.serialize
@@ -598,6 +637,24 @@ class TestExpQueue(common.TestCase):
         self.assertEqual(q.pop(), 2)
         self.assertEqual(q.pop(), 3)
 
+    def testSameExpiration(self):
+        t = DummyTimeProvider(0)
+        expired = []
+        q = ExpQueue(t, on_expire=expired.append)
+        q.add(1, 10.0001)
+        q.add(2, 10.0004)
+        q.add(3, 10)
+        q.add(4, 10)
+        q.add(5, 20)
+
+        t.time = 10.0002
+        self.assertEqual(len(q), 2)
+        self.assertEqual(q.size(), 5)
+        self.assertEqual(q.pop(), 2)
+        self.assertEqual([3, 4, 1], expired)
+        self.assertEqual(len(q), 1)
+        self.assertEqual(q.size(), 1)
+
     def testSerialization(self):
         t = DummyTimeProvider(0)
         serialize = pytree.serialize
@@ -1692,3 +1692,52 @@ class TestFiber(common.TestCase):
         self.assertEqual(fiber.get_stack_var(NAME1), VALUE1)
         self.assertEqual(fiber.get_stack_var(NAME2), None)
         self.assertEqual(fiber.get_stack_var(NAME3), None)
+
+    def testSectionContext(self):
+
+        def nested(expected):
+            self.assertEqual(expected, fiber.get_context_state())
+            self.assertEqual(expected, fiber.get_state())
+
+        self.assertEqual(None, fiber.get_context_state())
+
+        def side_effect(parent):
+            level = fiber.break_fiber()
+            try:
+                nested(None)
+                section = fiber.WovenSection()
+                section.enter()
+                self.assertNotEqual(parent, section.state)
+                nested(section.state)
+                section.abort()
+            finally:
+                fiber.restore_fiber(level)
+
+        section = fiber.WovenSection()
+        section.enter()
+        nested(section.state)
+        side_effect(section.state)
+        nested(section.state)
+        section.abort()
+        self.assertEqual(None, fiber.get_context_state())
+
+        # Sections left without exiting are dropped with their parent
+        section = fiber.WovenSection(descriptor=fiber.RootFiberDescriptor())
+        section.enter()
+        fiber.WovenSection(descriptor=fiber.RootFiberDescriptor()).enter()
+        section.abort()
+        self.assertEqual(None, fiber.get_context_state())
+
+
+class TestStackContextFiber(TestFiber):
+    '''Same tests with the section states kept only in the
+    thread-local section context.'''
+
+    def setUp(self):
+        self._stack_context = fiber.stack_context
+        fiber.stack_context = True
+        return TestFiber.setUp(self)
+
+    def tearDown(self):
+        fiber.stack_context = self._stack_context
+        return TestFiber.tearDown(self)
@@ -1163,3 +1163,120 @@ class TestJournaling(common.TestCase):
         # Check that the identifier generator has not been reset
         self.assertNotEqual(sub.journal_id,
                             BasicRecordingDummy(obj2).journal_id)
+
+
+
+class UnjournaledDummy(journal.Recorder):
+
+    @journal.recorded()
+    def direct(self):
+        return self.nested_fiber()
+
+    @journal.recorded()
+    def nested_fiber(self):
+        f = fiber.succeed()
+        f.add_callback(fiber.drop_param, self._get_depth)
+        return f
+
+    @journal.recorded()
+    def woven(self):
+        return self._woven_fiber()
+
+    @fiber.woven
+    def _woven_fiber(self):
+        return self.nested_fiber()
+
+    @journal.recorded()
+    def in_callback(self):
+        f = fiber.succeed()
+        f.add_callback(common.break_chain)
+        f.add_callback(fiber.drop_param, self.nested_fiber)
+        return f
+
+    @journal.recorded(reentrant=False)
+    def not_reentrant(self):
+        return "not reentrant"
+
+    @journal.recorded()
+    def reentrant(self):
+        return self.not_reentrant()
+
+    def _get_depth(self):
+        return fiber.get_context_state()["descriptor"].fiber_depth
+
+
+class TestUnjournaled(common.TestCase):
+
+    def setUp(self):
+        self.serializer = pytree.Serializer()
+        self.unserializer = pytree.Unserializer()
+        self.keeper = journal.StupidJournalKeeper(self.serializer,
+                                                  self.unserializer)
+        self.keeper.journaling = False
+
+    @defer.inlineCallbacks
+    def testNestedCalls(self):
+        root = journal.RecorderRoot(self.keeper)
+        obj = NestedRecordedDummy(root)
+        d = obj.main(3, 5)
+        self.assertTrue(isinstance(d, defer.Deferred))
+        result = yield d
+        self.assertEqual(39, result)
+        self.assertEqual(None, fiber.get_context_state())
+
+    @defer.inlineCallbacks
+    def testNestedFibers(self):
+        root = journal.RecorderRoot(self.keeper)
+        obj = UnjournaledDummy(root)
+
+        for journaling in (True, False):
+            self.keeper.journaling = journaling
+            # The nested fiber is chained to the root fiber
+            depth = yield obj.direct()
+            self.assertEqual(1, depth)
+            depth = yield obj.woven()
+            self.assertEqual(1, depth)
+            # Nested in a fiber callback it becomes a sub-fiber
+            depth = yield obj.in_callback()
+            self.assertEqual(2, depth)
+            self.assertEqual(None, fiber.get_context_state())
+
+    @defer.inlineCallbacks
+    def testSections(self):
+        root = journal.RecorderRoot(self.keeper)
+        obj = UnjournaledDummy(root)
+
+        section = fiber.WovenSection()
+        section.enter()
+        f = obj.nested_fiber()
+        self.assertTrue(fiber.IFiber.providedBy(f))
+        depth = yield section.exit(f)
+        self.assertEqual(1, depth)
+        self.assertEqual(None, fiber.get_context_state())
+
+        section = fiber.ContextSection()
+        section.enter()
+        self.assertEqual(section.state, fiber.get_context_state())
+        f = obj.woven()
+        self.assertTrue(fiber.IFiber.providedBy(f))
+        section.exit()
+        self.assertEqual(None, fiber.get_context_state())
+
+    @defer.inlineCallbacks
+    def testExceptions(self):
+        root = journal.RecorderRoot(self.keeper)
+        obj = ExceptionTestDummy(root)
+        yield self.assertFails(TypeError, obj.type_error_1)
+        yield self.assertFails(TypeError, obj.type_error_2)
+        yield self.assertFails(TypeError, obj.type_error_3)
+        yield self.assertFails(TypeError, obj.type_error_4)
+        self.assertEqual(None, fiber.get_context_state())
+
+    @defer.inlineCallbacks
+    def testNonReentrant(self):
+        root = journal.RecorderRoot(self.keeper)
+        obj = UnjournaledDummy(root)
+        result = yield obj.not_reentrant()
+        self.assertEqual("not reentrant", result)
+        result = yield obj.reentrant()
+        self.assertEqual("not reentrant", result)
@@ -24,9 +24,10 @@
 # vi:si:et:sw=4:sts=4:ts=4
 
 from twisted.spread import jelly
+from zope.interface import declarations
 
-from feat.common import serialization
-from feat.common.serialization import base
+from feat.common import serialization, adapter
+from feat.common.serialization import base, sexp, json
 from feat.interface.serialization import *
 
 from . import common
@@ -304,3 +305,146 @@ class TestVersionAdapter(common.TestCase):
 
         self.check_combinations(DummyVerAdapter2, range(1, 10), expected)
         self.check_combinations(DummyVerAdapter2(), range(1, 10), expected)
+
+
+class NotSerializable(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+class NotSerializableAdapter(serialization.Serializable):
+
+    type_name = "NotSerializable"
+
+    def __init__(self, value):
+        self.value = value.value
+
+
+class TestSerializerPlans(common.TestCase):
+
+    def convert_without_plans(self, serializer, value):
+        # Capabilities other than the serializer's own skip the plans
+        caps = set(serializer.converter_capabilities)
+        return serializer._convert(value, caps, False)
+
+    def testSameOutput(self):
+        shared = [1, 2L, 3.0]
+        value = {"list": shared, "tuple": (u"spam", None, True),
+                 "set": set(["a", "b"]), "instances": [A(shared), B(1, 2)],
+                 "nested": {(1, 2): [C(D(3)), shared]},
+                 "type": A, "enum": Capabilities.int_values}
+        serializer = sexp.Serializer()
+        expected = self.convert_without_plans(serializer, value)
+        self.assertEqual(expected, serializer.convert(value))
+        self.assertEqual(expected, serializer.convert(value))
+
+    def testContainerPlans(self):
+        serializer = sexp.Serializer()
+        serializer.convert({"list": [1], "tuple": (2, ), "set": set([3])})
+        self.assertEqual("dict_plan",
+                         serializer._value_plans[(dict, False)].__name__)
+        for vtype in (list, tuple, set):
+            plan = serializer._value_plans[(vtype, False)]
+            self.assertEqual("sequence_plan", plan.__name__)
+
+        caps = base.DEFAULT_CONVERTER_CAPS - set([Capabilities.dict_values])
+        serializer = sexp.Serializer(converter_caps=caps)
+        self.assertRaises(ValueError, serializer.convert, {})
+        self.assertEqual("flattener_plan",
+                         serializer._value_plans[(dict, False)].__name__)
+
+    def testUnsupportedCapabilities(self):
+        caps = base.DEFAULT_CONVERTER_CAPS - set([Capabilities.int_values])
+        serializer = sexp.Serializer(converter_caps=caps)
+        self.assertRaises(ValueError, serializer.convert, [1])
+        self.assertRaises(ValueError, serializer.convert, [1])
+        self.assertEqual([sexp.LIST_ATOM, "spam"],
+                         serializer.convert(["spam"]))
+
+    def testAdapterRegisteredLater(self):
+        serializer = sexp.Serializer()
+        value = NotSerializable(42)
+        self.assertRaises(TypeError, serializer.convert, value)
+
+        adapted = declarations.implementedBy(NotSerializable)
+        adapter.register_adapter(adapter.registry, NotSerializableAdapter,
+                                 NotSerializable, ISerializable)
+        try:
+            self.assertEqual(["NotSerializable", ["dictionary",
+                                                  ["value", 42]]],
+                             serializer.convert(value))
+        finally:
+            adapter.registry.unregister([adapted], ISerializable, '',
+                                        NotSerializableAdapter)
+
+        self.assertRaises(TypeError, serializer.convert, value)
+
+
+class Counted(serialization.Serializable):
+
+    snapshots = 0
+
+    def __init__(self, x):
+        self.x = x
+
+    def snapshot(self):
+        Counted.snapshots += 1
+        return serialization.Serializable.snapshot(self)
+
+
+class TestTreeMode(common.TestCase):
+
+    def check_same_output(self, value):
+        for factory in (sexp.Serializer, json.Serializer):
+            tree = factory(tree_mode=True)
+            full = factory()
+            self.assertEqual(full.convert(value), tree.convert(value))
+            self.assertEqual(full.freeze(value), tree.freeze(value))
+
+    def testAcyclic(self):
+        value = {"list": [1, 2L, 3.0], "tuple": (u"spam", None, True),
+                 "instances": [A([1]), B(1, {"x": [2]})],
+                 "nested": {"a": [C(D(3)), {"b": [4]}]}}
+        self.check_same_output(value)
+
+    def testSharedReferences(self):
+        shared = [1, 2]
+        instance = A(shared)
+        self.check_same_output([shared, {"x": shared}])
+        self.check_same_output([instance, instance])
+        self.check_same_output({"a": C(shared), "b": (shared, )})
+
+    def testCircularReferences(self):
+        value = [1]
+        value.append(value)
+        self.check_same_output(value)
+
+        instance = A(None)
+        instance.x = [instance]
+        self.check_same_output(instance)
+
+    def testFallbackResets(self):
+        serializer = json.Serializer(tree_mode=True)
+        shared = [1]
+        expected = serializer.convert([[1], [1]])
+        serializer.convert([shared, shared])
+        self.assertEqual(expected, serializer.convert([[1], [1]]))
+
+    def testSnapshotCalls(self):
+        shared = Counted([1])
+        value = {"a": shared, "b": [shared]}
+        Counted.snapshots = 0
+        # references are expected by default, snapshot only once
+        expected = json.Serializer().convert(value)
+        self.assertEqual(1, Counted.snapshots)
+
+        Counted.snapshots = 0
+        serializer = json.Serializer(tree_mode=True)
+        self.assertEqual(expected, serializer.convert(value))
+        # the fallback flattens the value again
+        self.assertEqual(2, Counted.snapshots)
+
+        Counted.snapshots = 0
+        serializer.convert([Counted([1]), Counted([2])])
+        self.assertEqual(2, Counted.snapshots)
@@ -21,9 +21,13 @@
 # Headers in this file shall remain intact.
 import time as python_time
 
+from twisted.internet import task
+
 from feat.test import common
 from feat.common import time, defer
 
+from twisted.internet.error import AlreadyCalled, AlreadyCancelled
+
 
 class TimeScaleTest(common.TestCase):
 
@@ -71,3 +75,117 @@ class TimeScaleTest(common.TestCase):
         call.reset(1)
 
         return d
+
+
+class TimerWheelTest(common.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        # the times used are exact binary fractions
+        self.wheel = time.TimerWheel(0.25, size=8, reactor=self.clock)
+        self.fired = []
+        return common.TestCase.setUp(self)
+
+    def testFiringOrder(self):
+        for delay in (0.875, 0.125, 6.25, 0.75, 0.25):
+            self.wheel.call_later(delay, self.fired.append, delay)
+        self.assertEqual(5, len(self.wheel))
+        self.assertEqual(1, len(self.clock.getDelayedCalls()))
+
+        self.advance(0.25)
+        self.assertEqual([0.125, 0.25], self.fired)
+        self.advance(0.5)
+        self.assertEqual([0.125, 0.25, 0.75], self.fired)
+        self.advance(0.25)
+        self.assertEqual([0.125, 0.25, 0.75, 0.875], self.fired)
+        # expires after more than one turn of the wheel
+        self.advance(5)
+        self.assertEqual([0.125, 0.25, 0.75, 0.875], self.fired)
+        self.advance(0.25)
+        self.assertEqual([0.125, 0.25, 0.75, 0.875, 6.25], self.fired)
+
+        self.assertEqual(0, len(self.wheel))
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def testCancel(self):
+        call1 = self.wheel.call_later(1, self.fired.append, 1)
+        call2 = self.wheel.call_later(2, self.fired.append, 2)
+        self.assertTrue(call1.active())
+        call1.cancel()
+        self.assertFalse(call1.active())
+        self.assertRaises(AlreadyCancelled, call1.cancel)
+        self.assertEqual(1, len(self.wheel))
+
+        call2.cancel()
+        self.assertEqual(0, len(self.wheel))
+        # nothing left to tick for
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.advance(3)
+        self.assertEqual([], self.fired)
+
+    def testResetAndDelay(self):
+        call1 = self.wheel.call_later(1, self.fired.append, 1)
+        call2 = self.wheel.call_later(1, self.fired.append, 2)
+        self.advance(0.5)
+        call1.reset(2)
+        call2.delay(0.25)
+        self.assertEqual(2.5, call1.getTime())
+        self.assertEqual(1.25, call2.getTime())
+        self.advance(0.75)
+        self.assertEqual([2], self.fired)
+        self.assertFalse(call2.active())
+        self.assertRaises(AlreadyCalled, call2.cancel)
+        self.advance(1.25)
+        self.assertEqual([2, 1], self.fired)
+
+    def testSchedulingFromCall(self):
+
+        def reschedule(value):
+            self.fired.append(value)
+            if value < 3:
+                self.wheel.call_later(0.5, reschedule, value + 1)
+
+        self.wheel.call_later(0.5, reschedule, 1)
+        self.advance(1.5)
+        self.assertEqual([1, 2, 3], self.fired)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def testChangingCallOfSameTick(self):
+        # all the calls expire in the first tick
+        calls = [self.wheel.call_later(delay, self.fired.append, delay)
+                 for delay in (0.125, 0.1875, 0.25)]
+
+        def change():
+            self.fired.append("change")
+            calls[0].cancel()
+            calls[1].reset(0.5)
+            calls[2].delay(0.25)
+
+        self.wheel.call_later(0.0625, change)
+        self.advance(0.25)
+        self.assertEqual(["change"], self.fired)
+        self.assertFalse(calls[0].active())
+        self.assertRaises(AlreadyCancelled, calls[0].cancel)
+        self.assertTrue(calls[1].active())
+        self.assertEqual(0.75, calls[1].getTime())
+        self.assertTrue(calls[2].active())
+        self.assertEqual(0.5, calls[2].getTime())
+        self.assertEqual(2, len(self.wheel))
+
+        self.advance(0.5)
+        self.assertEqual(["change", 0.25, 0.1875], self.fired)
+        self.assertEqual(0, len(self.wheel))
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def testScaledTimeout(self):
+        d = defer.Deferred()
+        time.scale(0.1)
+        call = time.call_timeout(1, d.callback, None)
+        self.assertIsInstance(call, time.ScaledDelayedCall)
+        self.assertApproximates(1, call.getTime() - time.time(), 0.01)
+        return d
+
+    def advance(self, seconds):
+        # advance in small steps, the way the reactor would do
+        for _ in range(int(seconds / 0.125)):
+            self.clock.advance(0.125)
@@ -0,0 +1,66 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+import json
+
+from feat.common import defer
+from feat.database import api, driver
+from feat.web import document
+
+from feat.test import common
+from feat.test.test_database_driver import DummyResponse, parser
+from feat.test.test_models_applicationjson import DummyContext
+
+
+class TestCacheModel(common.TestCase):
+
+    def setUp(self):
+        self.cache = driver.Cache(desired_size=25, policy='arc')
+        entry = driver.CacheEntry('tag', parser)
+        self.cache['a'] = entry
+        entry.got_response(DummyResponse('x' * 10, etag='1'))
+        self.cache.account('a', entry)
+        self.cache.get_url('a')
+        self.cache.get_url('b')
+        self.model = api.Cache(self.cache)
+
+    @defer.inlineCallbacks
+    def testRendering(self):
+        doc = document.WritableDocument("application/json")
+        ctx = DummyContext(("ROOT", ), ("root", ))
+        yield document.write(doc, self.model, context=ctx, format="compact")
+        struct = json.loads(doc.get_data())
+        self.assertEqual(10, struct["size"])
+        self.assertEqual(25, struct["desired_size"])
+        self.assertEqual("arc", struct["policy"])
+        self.assertEqual(1, struct["hits"])
+        self.assertEqual(1, struct["misses"])
+        self.assertEqual(0, struct["evictions"])
+        self.assertEqual("root/entries", struct["entries"])
+
+    @defer.inlineCallbacks
+    def testSettingDesiredSize(self):
+        item = yield self.model.fetch_item("desired_size")
+        attr = yield item.fetch()
+        yield attr.update_value(5)
+        self.assertEqual(5, self.cache.desired_size)
+        self.assertEqual(5, self.cache.policy.capacity)
+        self.assertEqual(0, self.cache.size)
@@ -79,3 +79,72 @@ class UnserializingAndMigrationgTest(common.TestCase):
         fetched = yield self.client.get_document("test-doc")
         self.assertEqual(3, fetched.version)
         self.assertIsInstance(fetched, MigratableDoc)
+
+
+class TestRevisionStore(common.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.store = client.RevisionStore(self, horizon=10, max_size=2,
+                                          max_age=100)
+
+    def get_time(self):
+        return self.now
+
+    def testKeptForTheHorizon(self):
+        for doc_id in 'abc':
+            self.store[doc_id] = (1, doc_id)
+        self.assertEqual(3, len(self.store))
+
+        self.now = 10
+        self.store['d'] = (1, 'd')
+        self.assertEqual(2, len(self.store))
+        self.assertNotIn('a', self.store)
+        self.assertNotIn('b', self.store)
+        self.assertEqual((1, 'c'), self.store['c'])
+        self.assertEqual(dict(size=2, max_size=2, evictions=2),
+                         self.store.get_stats())
+
+    def testLeastRecentlySavedEvicted(self):
+        self.store['a'] = (1, 'a')
+        self.store['b'] = (1, 'b')
+        self.store['a'] = (2, 'a')
+        self.now = 20
+        self.store['c'] = (1, 'c')
+        self.assertEqual(['a', 'c'],
+                         sorted(x for x in 'abc' if x in self.store))
+        self.assertEqual((2, 'a'), self.store.get('a'))
+        self.assertIs(None, self.store.get('b'))
+
+    def testConnectionStatus(self):
+        connection = client.Connection(emu.Database())
+        connection._known_revisions = self.store
+        self.store['a'] = (1, 'a')
+        self.assertEqual(dict(size=1, max_size=2, evictions=0),
+                         connection.show_revision_status())
+
+    def testExpiredEvicted(self):
+        self.store['a'] = (1, 'a')
+        self.now = 100
+        self.store['b'] = (1, 'b')
+        self.assertNotIn('a', self.store)
+        self.assertEqual(1, self.store.evictions)
+
+    def testOwnChangeDetection(self):
+        connection = client.Connection(emu.Database())
+        connection._known_revisions = self.store
+        changes = []
+        analytic = client.RevisionAnalytic(
+            connection, lambda *args: changes.append(args[-1]))
+
+        self.store['a'] = (2, 'x')
+        analytic.process_change('a', '2-x', False)
+        analytic.process_change('a', '1-y', False)
+        analytic.process_change('a', '3-y', False)
+        self.assertEqual([True, True, False], changes)
+
+        # once evicted the change is considered as made by someone else
+        self.now = 100
+        self.store['b'] = (1, 'b')
+        analytic.process_change('a', '2-x', False)
+        self.assertEqual([True, True, False, False], changes)
@@ -0,0 +1,389 @@
+# F3AT - Flumotion Asynchronous Autonomous Agent Toolkit
+# Copyright (C) 2010,2011 Flumotion Services, S.A.
+# All rights reserved.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# See "LICENSE.GPL" in the source distribution for more information.
+
+# Headers in this file shall remain intact.
+from twisted.internet import defer
+from twisted.python import failure
+
+from feat.database import driver
+from feat.database.interface import DatabaseError
+from feat.test import common
+
+
+class DummyResponse(object):
+
+    def __init__(self, body, status=200, etag=None):
+        self.body = body
+        self.status = status
+        self.headers = dict()
+        if etag:
+            self.headers['etag'] = etag
+
+
+def parser(response, tag):
+    return response.body
+
+
+class TestEvictionPolicies(common.TestCase):
+
+    def testLRU(self):
+        policy = driver.LRUPolicy()
+        policy.set_capacity(100)
+        self.assertIs(None, policy.victim())
+        for key in 'abc':
+            policy.insert(key, 10)
+        policy.touch('a')
+        self.assertEqual('b', policy.victim())
+        policy.remove('c')
+        self.assertEqual('a', policy.victim())
+        self.assertIs(None, policy.victim())
+
+    def testARC(self):
+        policy = driver.ARCPolicy()
+        policy.set_capacity(30)
+        for key in 'abc':
+            policy.insert(key, 10)
+        # a is hit again, so it moves to the frequent list
+        policy.touch('a')
+        self.assertEqual(3, len(policy))
+        self.assertEqual('b', policy.victim())
+        self.assertEqual('c', policy.victim())
+        self.assertEqual('a', policy.victim())
+        self.assertEqual(0, len(policy))
+
+        # b was evicted from the recent list, seeing it again makes the
+        # recent list grow and puts b in the frequent list
+        policy.insert('b', 10)
+        self.assertEqual(10, policy.target)
+        policy.insert('d', 10)
+        self.assertEqual('b', policy.victim())
+
+    def testCreate(self):
+        self.assertIsInstance(driver.create_eviction_policy('lru'),
+                              driver.LRUPolicy)
+        self.assertIsInstance(driver.create_eviction_policy('arc'),
+                              driver.ARCPolicy)
+        self.assertRaises(ValueError, driver.create_eviction_policy, 'spam')
+
+
+class TestCache(common.TestCase):
+
+    def setUp(self):
+        self.cache = driver.Cache(desired_size=25)
+
+    def testAccounting(self):
+        a = self._add('a', 'x' * 10, etag='1')
+        self.assertEqual(10, self.cache.size)
+        self.assertIs(a, self.cache.get_url('a'))
+        self.assertIs(None, self.cache.get_url('b'))
+
+        self._add('b', 'x' * 10, etag='2')
+        self.assertEqual(20, self.cache.size)
+        # touch a, so that b is the least recently used entry
+        self.cache.get_url('a')
+
+        self._add('c', 'x' * 10, etag='3')
+        self.assertEqual(20, self.cache.size)
+        self.assertEqual(set(['a', 'c']), set(self.cache.keys()))
+
+        stats = self.cache.get_stats()
+        self.assertEqual('lru', stats['policy'])
+        self.assertEqual(2, stats['entries'])
+        self.assertEqual(20, stats['size'])
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['evictions'])
+
+        del self.cache['a']
+        self.assertEqual(10, self.cache.size)
+
+    def testInvalidEntriesAreRemoved(self):
+        # response without etag cannot be cached
+        self._add('a', 'x' * 10)
+        self.assertEqual(0, self.cache.size)
+        self.assertNotIn('a', self.cache)
+
+    def testFreshenEntries(self):
+        a = self._add('a', 'x', etag='1')
+        b = self._add('b', 'x', etag='2')
+        fresh_a, fresh_b = a.fresh_at, b.fresh_at
+        self.cache.freshen_entries(DummyResponse('', status=304, etag='1'))
+        self.assertTrue(a.fresh_at >= fresh_a)
+        self.assertEqual(fresh_b, b.fresh_at)
+
+    def testEvictedWhileWaiting(self):
+        entry = driver.CacheEntry('tag', parser)
+        self.cache['a'] = entry
+        del self.cache['a']
+        entry.got_response(DummyResponse('x' * 10, etag='1'))
+        self.cache.account('a', entry)
+        self.assertEqual(0, self.cache.size)
+        self.assertNotIn('a', self.cache)
+
+    def testClear(self):
+        self._add('a', 'x' * 10, etag='1')
+        self._add('b', 'x' * 10, etag='2')
+        self.cache.clear()
+        self.assertEqual(0, self.cache.size)
+        self.assertEqual(0, self.cache.get_stats()['entries'])
+        self.assertEqual(0, len(self.cache.policy))
+        # the etag of the removed entry is not known anymore
+        self.cache.freshen_entries(DummyResponse('', status=304, etag='1'))
+
+        a = self._add('a', 'x' * 10, etag='1')
+        self.assertEqual(10, self.cache.size)
+        self.assertIs(a, self.cache.pop('a'))
+        self.assertEqual(0, self.cache.size)
+        self.assertIs(None, self.cache.pop('a', None))
+        self.assertRaises(KeyError, self.cache.pop, 'a')
+
+        self._add('b', 'x' * 10, etag='2')
+        self.cache.popitem()
+        self.assertEqual(0, self.cache.size)
+        self.cache.freshen_entries(DummyResponse('', status=304, etag='2'))
+
+    def testChangingDesiredSize(self):
+        self._add('a', 'x' * 10, etag='1')
+        self._add('b', 'x' * 10, etag='2')
+        self.cache.desired_size = 15
+        self.assertEqual(15, self.cache.policy.capacity)
+        self.assertEqual(10, self.cache.size)
+        self.assertEqual(['b'], self.cache.keys())
+        self.assertEqual(1, self.cache.get_stats()['evictions'])
+
+    def _add(self, ident, body, etag=None):
+        entry = driver.CacheEntry('tag', parser)
+        self.cache[ident] = entry
+        entry.got_response(DummyResponse(body, etag=etag))
+        self.cache.account(ident, entry)
+        return entry
+
+
+class DummyBulkDatabase(object):
+
+    def __init__(self):
+        self.requests = list()
+        self.pending = list()
+
+    def bulk_save_docs(self, docs):
+        self.requests.append(docs)
+        d = defer.Deferred()
+        self.pending.append(d)
+        return d
+
+
+class TestWriteCoalescer(common.TestCase):
+
+    def setUp(self):
+        self.database = DummyBulkDatabase()
+        self.coalescer = driver.WriteCoalescer(self.database, max_size=3,
+                                               max_delay=0.01)
+
+    @defer.inlineCallbacks
+    def testFlushOnDelay(self):
+        d1 = self.coalescer.save('doc1')
+        d2 = self.coalescer.save('doc2')
+        self.assertEqual(2, len(self.coalescer))
+        self.assertEqual([], self.database.requests)
+
+        yield common.delay(None, 0.02)
+        self.assertEqual([['doc1', 'doc2']], self.database.requests)
+        self.assertEqual(0, len(self.coalescer))
+
+        self.database.pending[0].callback(
+            [dict(id='1', rev='1-a'), driver.ConflictError('conflict')])
+        r = yield d1
+        self.assertEqual(dict(id='1', rev='1-a'), r)
+        self.assertFailure(d2, driver.ConflictError)
+        yield d2
+
+    @defer.inlineCallbacks
+    def testFlushOnSize(self):
+        defers = [self.coalescer.save('doc%d' % x) for x in range(4)]
+        self.assertEqual([['doc0', 'doc1', 'doc2']], self.database.requests)
+        self.assertEqual(1, len(self.coalescer))
+
+        self.database.pending[0].errback(driver.DatabaseError('boom'))
+        for d in defers[:3]:
+            self.assertFailure(d, driver.DatabaseError)
+            yield d
+
+        self.coalescer.flush()
+        self.assertEqual(['doc3'], self.database.requests[1])
+        self.database.pending[1].callback([dict(id='3', rev='1-b')])
+        r = yield defers[3]
+        self.assertEqual('3', r['id'])
+
+    def testParseDocId(self):
+        self.assertEqual(u'doc1', driver.parse_doc_id('{"_id": "doc1"}'))
+        self.assertIs(None, driver.parse_doc_id('{"field": 1}'))
+        self.assertIs(None, driver.parse_doc_id('[1, 2]'))
+        self.assertIs(None, driver.parse_doc_id('not json'))
+
+    def testParseBulkSaveResponse(self):
+        rows = [dict(id='a', rev='1-a'),
+                dict(id='b', error='conflict', reason='Document conflict'),
+                dict(id='c', error='forbidden', reason='No way')]
+        result = driver.parse_bulk_save_response(rows)
+        self.assertEqual(dict(ok=True, id='a', rev='1-a'), result[0])
+        self.assertIsInstance(result[1], driver.ConflictError)
+        self.assertIsInstance(result[2], driver.DatabaseError)
+        self.assertNotIsInstance(result[2], driver.ConflictError)
+
+
+class TestViewRowsDecoder(common.TestCase):
+
+    body = ('{"total_rows":3,"offset":1,"rows":[\r\n'
+            '{"id":"a","key":["x",1],"value":null},\r\n'
+            '{"id":"b","key":["x",2],"value":{"v":"]"}},\r\n'
+            '{"id":"c","key":["y",1],"value":3,"doc":{"_id":"c"}}\r\n'
+            ']}\n')
+
+    rows = [(["x", 1], None, "a"),
+            (["x", 2], {"v": "]"}, "b"),
+            (["y", 1], 3, "c", {"_id": "c"})]
+
+    def decode(self, chunk_size, decoder=None):
+        decoder = decoder or driver.ViewRowsDecoder()
+        decoder.status = 200
+        for index in range(0, len(self.body), chunk_size):
+            decoder.dataReceived(self.body[index:index + chunk_size])
+        decoder.connectionLost()
+        return decoder.get_result().result
+
+    def testParsingInChunks(self):
+        for chunk_size in (1, 2, 7, 30, len(self.body)):
+            response = self.decode(chunk_size)
+            self.assertEqual(self.rows, list(response.rows))
+            self.assertEqual(dict(total_rows=3, offset=1), response.rows.meta)
+            self.assertEqual(len(self.body), response.size)
+            self.assertIs(None, response.body)
+            self.assertEqual(self.rows,
+                             driver.parse_view_response(response, 'tag'))
+
+    def testConsumer(self):
+        consumed = list()
+        decoder = driver.ViewRowsDecoder(consumed.append, skip=1)
+        response = self.decode(5, decoder)
+        self.assertEqual(self.rows[1:], consumed)
+        self.assertEqual([], response.rows)
+
+    def testErrorResponse(self):
+        decoder = driver.ViewRowsDecoder()
+        decoder.status = 404
+        decoder.dataReceived('{"error":"not_found",')
+        decoder.dataReceived('"reason":"missing"}')
+        decoder.connectionLost()
+        response = decoder.get_result().result
+        self.assertIs(None, response.rows)
+        self.assertEqual('{"error":"not_found","reason":"missing"}',
+                         response.body)
+
+    def testTruncatedBody(self):
+        decoder = driver.ViewRowsDecoder()
+        decoder.status = 200
+        decoder.headers['content-type'] = 'application/json'
+        decoder.dataReceived(self.body[:60])
+        decoder.connectionLost()
+        response = decoder.get_result().result
+        # the response is left for the regular parser to fail
+        self.assertIs(None, response.rows)
+        result = driver.parse_view_response(response, 'tag')
+        self.assertIsInstance(result, failure.Failure)
+        self.assertTrue(result.check(DatabaseError))
+
+
+class DummyCouchDB(object):
+
+    def __init__(self):
+        self.requests = list()
+
+    def get(self, url, **kwargs):
+        self.requests.append(url)
+        if '_changes' in url:
+            return defer.Deferred()
+        return defer.succeed(dict(update_seq=10))
+
+
+class DummyChangesDatabase(object):
+
+    db_name = 'test'
+
+    def __init__(self):
+        self.couchdb = DummyCouchDB()
+        self.lost = list()
+
+    def wait_connected(self):
+        return defer.succeed(self)
+
+    def couchdb_call(self, method, *args):
+        return method(*args)
+
+    def connectionLost(self, reason):
+        self.lost.append(reason)
+
+
+class DummyFilter(object):
+
+    name = 'doc_ids'
+
+    def __init__(self):
+        self.notifications = list()
+
+    def extract_params(self):
+        return dict()
+
+    def notified(self, doc_id, rev, deleted):
+        self.notifications.append((doc_id, rev, deleted))
+
+
+class TestNotifier(common.TestCase):
+
+    def setUp(self):
+        self.db = DummyChangesDatabase()
+        self.filter = DummyFilter()
+        self.notifier = driver.Notifier(self.db, self.filter)
+
+    def testResumesFromLastSeq(self):
+        self.notifier.setup()
+        requests = self.db.couchdb.requests
+        self.assertEqual(2, len(requests))
+        self.assertEqual('/test/', requests[0])
+        self.assertIn('since=10', requests[1])
+
+        # same parameters, the feed is not restarted
+        self.notifier.setup()
+        self.assertEqual(2, len(requests))
+
+        self.notifier.changed(dict(seq=12, id='a', changes=[dict(rev='1-x')]))
+        self.assertEqual([('a', '1-x', False)], self.filter.notifications)
+
+        # the feed is lost, the new one starts after the last change
+        self.notifier.connectionLost(failure.Failure(DatabaseError()))
+        self.notifier.setup()
+        self.assertEqual(3, len(requests))
+        self.assertIn('since=12', requests[2])
+
+        stats = self.notifier.get_stats(update_seq=15)
+        self.assertEqual(12, stats['last_seq'])
+        self.assertEqual(3, stats['lag'])
+        self.assertEqual(1, stats['received'])
+        self.assertEqual(1, stats['restarts'])
+        self.assertTrue(stats['active'])
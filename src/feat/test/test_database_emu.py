@@ -23,12 +23,22 @@ import json
 
 from twisted.internet import defer
 
-from feat.database import emu
+from feat.database import emu, tools, view
 from feat.database.interface import ConflictError, NotFoundError
 
 from . import common
 
 
+class GroupView(view.BaseView):
+
+    name = 'group_view'
+
+    def map(doc):
+        # every document emits its key twice
+        yield doc['group'], doc['_id']
+        yield doc['group'], doc['_id']
+
+
 class TestDatabase(common.TestCase):
 
     def setUp(self):
@@ -117,6 +127,45 @@ class TestDatabase(common.TestCase):
         self.assertEqual(1, len(self.database._documents))
         self.assertTrue(resp['id'] in self.database._documents)
 
+    @defer.inlineCallbacks
+    def testStartkeyDocid(self):
+        for doc_id, group in [('a', 1), ('b', 1), ('c', 2), ('d', 1)]:
+            content = dict(_id=doc_id, group=group)
+            yield self.database.save_doc(json.dumps(content))
+
+        rows = yield self.database.query_view(GroupView, limit=3)
+        self.assertEqual([(1, 'a', 'a'), (1, 'a', 'a'), (1, 'b', 'b')], rows)
+        rows = yield self.database.query_view(GroupView, startkey=1,
+                                              startkey_docid='b', skip=2)
+        self.assertEqual(['d', 'd', 'c', 'c'], [x[2] for x in rows])
+        rows = yield self.database.query_view(
+            GroupView, startkey=2, endkey=1, endkey_docid='d',
+            descending=True)
+        self.assertEqual(['c', 'c', 'd', 'd'], [x[2] for x in rows])
+
+    @defer.inlineCallbacks
+    def testViewAterator(self):
+        expected = list()
+        for index in range(7):
+            doc_id = 'doc%d' % (index, )
+            content = dict(_id=doc_id, group=index % 3)
+            yield self.database.save_doc(json.dumps(content))
+            expected.extend([(index % 3, doc_id)] * 2)
+        expected.sort()
+        expected = [x[1] for x in expected]
+
+        result = list()
+
+        def callback(connection, row):
+            result.append(row)
+
+        connection = self.database.get_connection()
+        for per_page in (1, 2, 3, 20):
+            del result[:]
+            yield tools.view_aterator(connection, callback, GroupView,
+                                      per_page=per_page)
+            self.assertEqual(expected, result)
+
     def _generate_content(self, text):
         return dict(text=text)
 
@@ -198,6 +247,23 @@ class TestDatabaseIntegration(common.TestCase):
         yield self.database.delete_doc(doc_id, rev)
         self.assertEqual(1, len(self.calls))
 
+    @defer.inlineCallbacks
+    def testCancelingOneOfManyListeners(self):
+        self.calls = list()
+        others = list()
+
+        first = yield self.database.listen_changes(
+            ('a', 'b'), self.change_cb)
+        yield self.database.listen_changes(
+            ('b', 'c'), lambda *args: others.append(args))
+        yield self.database.cancel_listener(first)
+
+        yield self.database.save_doc(self._gen_doc('a'))
+        yield self.database.save_doc(self._gen_doc('b'))
+        yield common.delay(None, 0.01)
+        self.assertEqual([], self.calls)
+        self.assertEqual(['b'], [doc_id for doc_id, _, _ in others])
+
     def change_cb(self, doc_id, rev, deleted):
         self.calls.append((doc_id, rev, deleted))
 
@@ -71,3 +71,72 @@ class TestQueryObject(common.TestCase):
                                           query.Evaluator.equals, 1))
         self.assertRaises(ValueError, DummyQuery,
                           aggregation=[['unknown handler', 'field1']])
+
+
+class TestQueryEngine(common.TestCase):
+
+    def testIntersect(self):
+        self.assertEqual([], query._intersect([], [1, 2, 3]))
+        self.assertEqual([2, 3], query._intersect([1, 2, 3], [2, 3, 4]))
+        self.assertEqual([5], query._intersect(range(100), [5, 150]))
+        self.assertEqual([5], query._intersect([5, 150], range(100)))
+        left = range(0, 1000, 3)
+        right = range(0, 1000, 7)
+        self.assertEqual(sorted(set(left) & set(right)),
+                         query._intersect(left, right))
+        self.assertEqual(sorted(set(left) & set(right)),
+                         query._intersect(right, left))
+
+    def testUnion(self):
+        self.assertEqual([], query._union([[], []]))
+        self.assertEqual([1, 2, 3, 4],
+                         query._union([[1, 3], [2, 3, 4], [1]]))
+
+    def testParsedIndex(self):
+        index = query.ParsedIndex(['c', 'a', 'b', 'a'])
+        self.assertEqual(['a', 'b', 'c'], index.get_sorted_ids())
+        self.assertEqual({'c': 0, 'a': 1, 'b': 2},
+                         index.get_rank(query.Direction.ASC))
+        self.assertEqual({'a': 0, 'b': 1, 'c': 3},
+                         index.get_rank(query.Direction.DESC))
+        # structures are cached
+        self.assertIs(index.get_sorted_ids(), index.get_sorted_ids())
+
+        index = query.ParsedIndex([('a', 1), ('b', 2)], keep_value=True)
+        self.assertEqual(['a', 'b'], index.get_sorted_ids())
+        self.assertEqual(2, index.get_value('b'))
+
+    def testSortedSlice(self):
+        ASC, DESC = query.Direction.ASC, query.Direction.DESC
+        index = query.ParsedIndex(['e', 'd', 'c', 'b', 'a'])
+        rows = ['a', 'b', 'd', 'y', 'z']
+
+        f = query._get_sorted_slice
+        self.assertEqual(['d', 'b', 'a', 'y', 'z'],
+                         f(index, rows, ASC, 0, None))
+        self.assertEqual(['b', 'a'], f(index, rows, ASC, 1, 3))
+        self.assertEqual(['a', 'b', 'd', 'y', 'z'],
+                         f(index, rows, DESC, 0, None))
+        self.assertEqual(['a'], f(index, rows, DESC, 0, 1))
+        self.assertEqual(['y', 'z'], f(index, rows, DESC, 3, 10))
+
+    def testCalculateQueryResponse(self):
+        C = query.Condition
+        E = query.Evaluator
+        O = query.Operator
+        c1 = C('field1', E.equals, 1)
+        c2 = C('field2', E.equals, 2)
+        c3 = C('field3', E.equals, 3)
+        responses = {c1: query.ParsedIndex([('a', 1), ('b', 1), ('c', 1)],
+                                           keep_value=True),
+                     c2: query.ParsedIndex(['c', 'b', 'd']),
+                     c3: query.ParsedIndex(['x', 'a'])}
+
+        f = query._calculate_query_response
+        self.assertEqual(['b', 'c'], f(responses, DummyQuery(c1, O.AND, c2)))
+        self.assertEqual(['a', 'b', 'c', 'd'],
+                         f(responses, DummyQuery(c1, O.OR, c2)))
+        q = DummyQuery(DummyQuery(c1, O.AND, c2), O.OR, c3)
+        self.assertEqual(['a', 'b', 'c', 'x'], f(responses, q))
+        q = DummyQuery(c1, O.AND, c2, O.AND, c3)
+        self.assertEqual([], f(responses, q))
@@ -24,7 +24,7 @@ from feat.agents.common import host
 from feat.agents.base import descriptor, agent
 from feat.agencies import recipient
 from feat.database import emu as database
-from feat.utils.locate import locate
+from feat.utils.locate import locate, LocationCache
 from feat.common import defer
 
 
@@ -55,3 +55,150 @@ class TestLocating(common.TestCase):
         self.assertEqual('host1', host1)
         none = yield locate(self.connection, self.agent2.doc_id)
         self.assertIs(None, none)
+
+
+class TestLocationCache(common.TestCase):
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield common.TestCase.setUp(self)
+        self.database = database.Database()
+        self.connection = self.database.get_connection()
+
+        host1 = host.Descriptor(doc_id=u'host1')
+        host2 = host.Descriptor(doc_id=u'host2')
+        self.host1 = yield self.connection.save_document(host1)
+        self.host2 = yield self.connection.save_document(host2)
+        part1 = agent.BasePartner(recipient.IRecipient(host1),
+                                  role=u'host')
+        agent1 = descriptor.Descriptor(partners=[part1])
+        self.agent1 = yield self.connection.save_document(agent1)
+        self.store = dict()
+        self.cache = LocationCache(self, self.connection, store=self.store,
+                                   negative_ttl=0.1)
+
+    @defer.inlineCallbacks
+    def testCaching(self):
+        d1 = self.cache.locate(self.agent1.doc_id)
+        d2 = self.cache.locate(self.agent1.doc_id)
+        res = yield defer.DeferredList([d1, d2])
+        self.assertEqual([(True, u'host1'), (True, u'host1')], res)
+        self.assertEqual(1, self.cache.get_stats()['misses'])
+        self.assertEqual(2, self.cache.get_stats()['watched'])
+
+        res = yield self.cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host1', res)
+        stats = self.cache.get_stats()
+        self.assertEqual(3, stats['hits'] + stats['misses'])
+        self.assertEqual(1, stats['misses'])
+
+        self.cache.invalidate(self.agent1.doc_id)
+        self.assertEqual({}, self.store)
+        res = yield self.cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host1', res)
+        self.assertEqual(2, self.cache.get_stats()['misses'])
+
+        self.cache.clear()
+        self.assertEqual({}, self.store)
+        self.assertEqual(0, self.cache.get_stats()['watched'])
+
+    @defer.inlineCallbacks
+    def testDescriptorChanged(self):
+        res = yield self.cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host1', res)
+
+        self.agent1.partners[0].recipient = recipient.IRecipient(self.host2)
+        yield self.connection.save_document(self.agent1)
+        yield self.wait_for(lambda: not self.store, 5, freq=0.01)
+
+        res = yield self.cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host2', res)
+
+    @defer.inlineCallbacks
+    def testNegativeCaching(self):
+        res = yield self.cache.locate(u'missing')
+        self.assertIs(None, res)
+        res = yield self.cache.locate(u'missing')
+        self.assertIs(None, res)
+        self.assertEqual(1, self.cache.get_stats()['misses'])
+
+        # missing entries expire
+        yield common.delay(None, 0.1)
+        res = yield self.cache.locate(u'missing')
+        self.assertIs(None, res)
+        self.assertEqual(2, self.cache.get_stats()['misses'])
+
+        # or are forgotten when the document gets created
+        desc = descriptor.Descriptor(doc_id=u'missing')
+        yield self.connection.save_document(desc)
+        yield self.wait_for(lambda: not self.store, 5, freq=0.01)
+
+    @defer.inlineCallbacks
+    def testExpiration(self):
+        cache = LocationCache(self, self.connection, store=self.store,
+                              negative_ttl=0.1, ttl=0.5)
+        res = yield cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host1', res)
+        yield cache.locate(self.agent1.doc_id)
+        self.assertEqual(1, cache.get_stats()['misses'])
+
+        # located agents expire as well
+        yield common.delay(None, 0.5)
+        res = yield cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host1', res)
+        self.assertEqual(2, cache.get_stats()['misses'])
+
+        # the expired entries are removed from the store
+        self.store[('location', u'gone')] = (u'host2', 0, 'other')
+        self.store['unrelated'] = 'value'
+        yield common.delay(None, 0.1)
+        yield cache.locate(u'missing')
+        self.assertEqual(set([('location', self.agent1.doc_id),
+                              ('location', u'missing'), 'unrelated']),
+                         set(self.store))
+
+    @defer.inlineCallbacks
+    def testForgettingOwners(self):
+        cache1 = LocationCache(self, self.connection, store=self.store,
+                               owner='agency1')
+        cache2 = LocationCache(self, self.connection, store=self.store,
+                               owner='agency2')
+        yield cache1.locate(self.agent1.doc_id)
+        yield cache2.locate(u'missing')
+        self.assertEqual(2, len(self.store))
+
+        cache1.forget_owner('agency2')
+        self.assertEqual([('location', self.agent1.doc_id)],
+                         self.store.keys())
+
+        yield cache2.locate(u'missing')
+        cache2.forget_other_owners()
+        self.assertEqual([('location', u'missing')], self.store.keys())
+
+    @defer.inlineCallbacks
+    def testForgettingWhileRegistering(self):
+        registering = []
+        changes_listener = self.connection.changes_listener
+
+        def delayed_changes_listener(filter_, callback, **kwargs):
+            d = defer.Deferred()
+            registering.append((d, filter_, callback))
+            return d
+
+        self.connection.changes_listener = delayed_changes_listener
+        res = yield self.cache.locate(self.agent1.doc_id)
+        self.assertEqual(u'host1', res)
+        self.assertEqual(2, len(registering))
+
+        # located again before the listeners got registered
+        self.cache.clear()
+        res = yield self.cache.locate(self.agent1.doc_id)
+        self.assertEqual(2, len(registering))
+        self.cache.clear()
+
+        for d, filter_, callback in registering:
+            d2 = changes_listener(filter_, callback)
+            d2.chainDeferred(d)
+            yield d
+        self.assertEqual({}, self.connection._listeners)
+        self.assertEqual(0, self.cache.get_stats()['watched'])
@@ -64,6 +64,10 @@ class Av2(Av1):
         return snapshot
 
 
+class Bv1(Versioned):
+    type_name = "B"
+
+
 @common.attr(timescale=0.1)
 class TestHTTPTunnel(common.TestCase):
 
@@ -71,6 +75,7 @@ class TestHTTPTunnel(common.TestCase):
         port_range = range(4000, 4100)
         r1 = serialization.get_registry().clone()
         r1.register(Av1)
+        r1.register(Bv1)
         self.d1 = DummyDispatcher()
         self.t1 = tunnel.Tunnel(self, port_range, self.d1, "localhost",
                                 version=1, registry=r1, max_delay=10)
@@ -142,6 +147,60 @@ class TestHTTPTunnel(common.TestCase):
 
         yield self.wait_for_idle(20)
 
+    @defer.inlineCallbacks
+    def testBatching(self):
+        yield self.t1.start_listening()
+        yield self.t2.start_listening()
+
+        url2a = http.append_location(self.t2.uri, "spam")
+        url2b = http.append_location(self.t2.uri, "beans")
+
+        # connect before counting the batches
+        yield self.t1.post(url2a, 0)
+        self.d2.reset()
+
+        batches = []
+        post_batch = tunnel.Peer.post_batch
+
+        def spy(peer, messages):
+            batches.append(len(messages))
+            return post_batch(peer, messages)
+
+        self.patch(tunnel.Peer, "post_batch", spy)
+
+        urls = [url2a, url2b]
+        defers = [self.t1.post(urls[i % 2], i) for i in range(120)]
+        results = yield defer.DeferredList(defers)
+
+        self.assertEqual([50, 50, 20], batches)
+        self.assertEqual([(True, True)] * 120, results)
+        self.assertEqual([(urls[i % 2], i) for i in range(120)],
+                         self.d2.messages)
+
+        yield self.wait_for_idle(20)
+
+    @defer.inlineCallbacks
+    def testBatchAcknowledgements(self):
+        yield self.t1.start_listening()
+        yield self.t2.start_listening()
+
+        url = http.append_location(self.t2.uri, "spam")
+
+        # the second tunnel doesn't know how to unserialize Bv1
+        d1 = self.t1.post(url, 1)
+        d2 = self.t1.post(url, Bv1())
+        d3 = self.t1.post(url, 3)
+
+        result = yield d1
+        self.assertTrue(result)
+        result = yield d2
+        self.assertFalse(result)
+        result = yield d3
+        self.assertTrue(result)
+        self.assertEqual([(url, 1), (url, 3)], self.d2.messages)
+
+        yield self.wait_for_idle(20)
+
     @defer.inlineCallbacks
     def testSerialization(self):
         yield self.t1.start_listening()
@@ -19,7 +19,9 @@
 # See "LICENSE.GPL" in the source distribution for more information.
 
 # Headers in this file shall remain intact.
-from feat.common import defer, log, first
+from twisted.python import failure
+
+from feat.common import defer, error, log, first, time
 from feat.agents.base import descriptor
 from feat.agents.common import host
 from feat.database import tools
@@ -27,13 +29,20 @@ from feat.database import tools
 from feat.database.interface import IDatabaseClient, NotFoundError
 
 
-@defer.inlineCallbacks
 def locate(connection, agent_id):
     '''
     Return the hostname of the agency where given agent runs or None.
     '''
     connection = IDatabaseClient(connection)
     log.log('locate', 'Locate called for agent_id: %r', agent_id)
+    return _locate(connection, agent_id, [])
+
+
+@defer.inlineCallbacks
+def _locate(connection, agent_id, doc_ids):
+    # Fills doc_ids with the identifiers of the documents the result
+    # depends on, the ones not found included.
+    doc_ids.append(agent_id)
     try:
         desc = yield connection.get_document(agent_id)
         log.log('locate', 'Got document %r', desc)
@@ -45,7 +54,7 @@ def locate(connection, agent_id):
                 log.log('locate',
                         'No host partner found in descriptor.')
                 defer.returnValue(None)
-            res = yield locate(connection, host_part.recipient.key)
+            res = yield _locate(connection, host_part.recipient.key, doc_ids)
             defer.returnValue(res)
     except NotFoundError:
         log.log('locate',
@@ -53,6 +62,174 @@ def locate(connection, agent_id):
         defer.returnValue(None)
 
 
+class LocationCache(log.Logger):
+    '''
+    Caches the result of locate() by agent id. An entry is dropped when
+    any of the documents it was resolved from changes, or when invalidate()
+    is called for the agent. The agents not located are remembered for
+    negative_ttl seconds, the others for ttl seconds at most.
+
+    The entries are kept in the given store, using the broker shared state
+    all the agencies of a host share them. The change listeners are only
+    registered by the agency which resolved the entry, the owner recorded
+    with it. When an owner goes away its entries can be dropped with
+    forget_owner(), the ttl is a backstop for the ones left behind.
+    '''
+
+    ttl = 600
+    negative_ttl = 30
+
+    def __init__(self, logger, connection, store=None, negative_ttl=None,
+                 ttl=None, owner=None):
+        log.Logger.__init__(self, logger)
+        self._connection = IDatabaseClient(connection)
+        # ('location', agent_id) -> (hostname, expiration time, owner)
+        self._store = store if store is not None else dict()
+        self.negative_ttl = negative_ttl or type(self).negative_ttl
+        self.ttl = ttl or type(self).ttl
+        self.owner = owner
+        # expired entries are removed from the store at most once per
+        # negative_ttl, when resolving a location
+        self._next_prune = time.time() + self.negative_ttl
+
+        # doc_id -> set([agent_id]), entries resolved by us depending on it
+        self._dependencies = dict()
+        # doc_ids of the change listeners being registered
+        self._registering = set()
+        # agent_id -> [Deferred], callers waiting for an ongoing lookup
+        self._pending = dict()
+
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def locate(self, agent_id):
+        entry = self._store.get(self._key(agent_id))
+        if entry is not None:
+            hostname, expires, _owner = entry
+            if time.time() < expires:
+                self._hits += 1
+                return defer.succeed(hostname)
+
+        d = defer.Deferred()
+        if agent_id in self._pending:
+            self._pending[agent_id].append(d)
+            return d
+
+        self._misses += 1
+        self._pending[agent_id] = [d]
+        doc_ids = []
+        d2 = _locate(self._connection, agent_id, doc_ids)
+        d2.addBoth(self._located, agent_id, doc_ids)
+        return d
+
+    def invalidate(self, agent_id):
+        key = self._key(agent_id)
+        if key in self._store:
+            self._invalidations += 1
+            self.log("Forgetting the location of the agent %s", agent_id)
+            del self._store[key]
+
+    def forget_owner(self, owner):
+        '''Drops the entries resolved by the specified owner.'''
+        self._forget_entries(lambda entry_owner: entry_owner == owner)
+
+    def forget_other_owners(self):
+        '''Drops the entries resolved by the other owners.'''
+        self._forget_entries(lambda entry_owner: entry_owner != self.owner)
+
+    def clear(self):
+        '''Drops the entries resolved by us and stops listening
+        for the changes of their documents.'''
+        for doc_id in self._dependencies.keys():
+            for agent_id in self._forget(doc_id):
+                self.invalidate(agent_id)
+
+    def get_stats(self):
+        return dict(hits=self._hits, misses=self._misses,
+                    invalidations=self._invalidations,
+                    watched=len(self._dependencies))
+
+    ### private ###
+
+    def _key(self, agent_id):
+        return ('location', agent_id)
+
+    def _located(self, result, agent_id, doc_ids):
+        waiting = self._pending.pop(agent_id, [])
+        if not isinstance(result, failure.Failure):
+            now = time.time()
+            ttl = self.negative_ttl if result is None else self.ttl
+            self._store[self._key(agent_id)] = (result, now + ttl,
+                                                self.owner)
+            for doc_id in doc_ids:
+                self._watch(doc_id, agent_id)
+            if now >= self._next_prune:
+                self._next_prune = now + self.negative_ttl
+                self._prune(now)
+        for d in waiting:
+            if isinstance(result, failure.Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+    def _iter_entries(self):
+        for key, entry in self._store.items():
+            if isinstance(key, tuple) and key[0] == 'location':
+                yield key, entry
+
+    def _forget_entries(self, predicate):
+        for key, (_hostname, _expires, owner) in self._iter_entries():
+            if predicate(owner):
+                self.log("Forgetting the location of the agent %s resolved "
+                         "by %s", key[1], owner)
+                del self._store[key]
+
+    def _prune(self, now):
+        for key, (_hostname, expires, _owner) in self._iter_entries():
+            if expires <= now:
+                del self._store[key]
+
+    def _watch(self, doc_id, agent_id):
+        if doc_id not in self._dependencies:
+            self._dependencies[doc_id] = set()
+            # the listener still being registered will do
+            if doc_id not in self._registering:
+                self._registering.add(doc_id)
+                d = self._connection.changes_listener(
+                    (doc_id, ), self._document_changed)
+                d.addCallbacks(self._listening, self._listening_failed,
+                               callbackArgs=(doc_id, ),
+                               errbackArgs=(doc_id, ))
+        self._dependencies[doc_id].add(agent_id)
+
+    def _listening(self, _listener_id, doc_id):
+        self._registering.discard(doc_id)
+        if doc_id not in self._dependencies:
+            # forgotten before the listener got registered, cancelling
+            # it then did nothing
+            self._connection.cancel_listener(doc_id)
+
+    def _listening_failed(self, fail, doc_id):
+        self._registering.discard(doc_id)
+        # without the listener the entries could become stale
+        for agent_id in self._forget(doc_id):
+            self.invalidate(agent_id)
+        error.handle_failure(self, fail, "Failed listening to the changes "
+                           "of document %s", doc_id)
+
+    def _document_changed(self, doc_id, rev, deleted, own_change):
+        self.log("Document %s changed, invalidating the locations "
+                 "depending on it", doc_id)
+        for agent_id in self._forget(doc_id):
+            self.invalidate(agent_id)
+
+    def _forget(self, doc_id):
+        agent_ids = self._dependencies.pop(doc_id, set())
+        self._connection.cancel_listener(doc_id)
+        return agent_ids
+
+
 def script():
     with tools.dbscript() as (d, args):
 
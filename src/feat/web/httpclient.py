@@ -2,7 +2,7 @@ from zope.interface import Interface, Attribute, implements
 
 from twisted.internet import reactor as treactor, error as terror, ssl
 from twisted.internet.protocol import ClientFactory, Protocol
-from twisted.internet.interfaces import ISSLTransport
+from twisted.internet.interfaces import ISSLTransport, IProtocol
 from twisted.python import failure
 
 from feat.common import defer, error, log, time, first
@@ -170,6 +170,10 @@ class Protocol(http.BaseProtocol):
 
             if decoder is None:
                 decoder = ResponseDecoder()
+            elif not IProtocol.providedBy(decoder):
+                # decoder factory, it is passed instead of the instance by
+                # the callers which might retry the request
+                decoder = decoder()
             # The parameters below are used to format a nice error message
             # shall this request fail in any way
             scheme, host, port = self._get_target()
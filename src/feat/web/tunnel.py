@@ -20,13 +20,15 @@
 
 # Headers in this file shall remain intact.
 
+import json
 import random
 
+from twisted.python.failure import Failure
 from zope.interface import Interface, implements
 
 import feat
 from feat.common import defer, error, time
-from feat.common.serialization import json
+from feat.common.serialization import json as feat_json
 from feat.web import http, security, base, httpserver, httpclient
 
 DEFAULT_REQUEST_TIMEOUT = 5*60
@@ -34,6 +36,10 @@ DEFAULT_RESPONSE_TIMEOUT = 5*60+1
 
 FEAT_IDENT = "FeatTunnel"
 
+# Content type of the POST requests carrying multiple messages, the servers
+# supporting it announce it in the accept-post header of HEAD responses.
+FEAT_BATCH_TYPE = "application/vnd.feat-batch+json"
+
 
 class TunnelError(error.FeatError):
     pass
@@ -61,6 +67,11 @@ class Tunnel(base.RangeServer):
     factor = 2.7182818284590451
     jitter = 0.11962656472
 
+    # Messages for the same peer are queued and posted together,
+    # at most batch_size of them after waiting batch_delay seconds
+    batch_size = 50
+    batch_delay = 0
+
     def __init__(self, log_keeper, port_range, dispatcher,
                  public_host=None, version=None, registry=None,
                  server_security_policy=None,
@@ -85,6 +96,8 @@ class Tunnel(base.RangeServer):
         self._delays = {} # {PEER_KEY: DELAY}
         self._quarantined = set([]) # set([PEER_KEY])
         self._pendings = {} # {PEER_KEY: [(DEFERRED, PATH, DATA, EXPIRATION)]}
+        self._outbox = {} # {PEER_KEY: [(DEFERRED, PATH, DATA, EXPIRATION)]}
+        self._flushes = {} # {PEER_KEY: IDelayedCall}
         self._peers = {} # {KEY: Peer}
 
         self._max_delay = max_delay or type(self).max_delay
@@ -102,6 +115,8 @@ class Tunnel(base.RangeServer):
             return False
         if self._pendings:
             return False
+        if self._outbox:
+            return False
         if self.factory is not None and not self.factory.is_idle():
             return False
         for peer in self._peers.itervalues():
@@ -122,19 +137,20 @@ class Tunnel(base.RangeServer):
         exp = expiration + now if expiration is not None else None
 
         if key in self._quarantined:
-            return self._add_pending(key, path, data, exp)
+            return self._add_pending(key, location, data, exp)
 
         if key not in self._peers:
-            d = self._add_pending(key, path, data, exp)
+            d = self._add_pending(key, location, data, exp)
             self._connect(key)
             return d
 
         d = defer.Deferred()
-        self._post(key, location, data, exp, now, d)
+        self._enqueue(key, location, data, exp, d)
         return d
 
     def disconnect(self):
         self._cancel_retries()
+        self._cancel_flushes()
         for peer in self._peers.values():
             peer.disconnect()
         base.RangeServer.disconnect(self)
@@ -205,24 +221,71 @@ class Tunnel(base.RangeServer):
                              " %s:" % self._key2url(key))
         self._schedule_retry(key)
 
-    def _post(self, key, location, data, expiration, curr_time, deferred):
-        if expiration and expiration <= curr_time:
-            deferred.callback(False)
+    def _enqueue(self, key, location, data, expiration, deferred):
+        if key not in self._outbox:
+            self._outbox[key] = []
+        records = self._outbox[key]
+        records.append((deferred, location, data, expiration))
+        if len(records) >= self.batch_size:
+            self._flush(key)
+        elif key not in self._flushes:
+            callid = time.call_later(self.batch_delay, self._flush, key)
+            self._flushes[key] = callid
+
+    def _flush(self, key):
+        callid = self._flushes.pop(key, None)
+        if callid is not None and callid.active():
+            callid.cancel()
+
+        records = self._outbox.pop(key, None)
+        if not records:
             return
 
-        d = self._peers[key].post(location, data)
-        args = (key, location, data, expiration, deferred)
+        if key in self._quarantined or key not in self._peers:
+            # The peer failed or has been disconnected since the messages
+            # were queued, they will be posted once connected again
+            for d, loc, data, exp in records:
+                self._add_pending(key, loc, data, exp, d)
+            if key not in self._quarantined and key not in self._retries:
+                self._connect(key)
+            return
+
+        self._post(key, records, time.time())
+
+    def _post(self, key, records, curr_time):
+        not_expired = []
+        for record in records:
+            d, _loc, _data, exp = record
+            if exp and exp <= curr_time:
+                d.callback(False)
+            else:
+                not_expired.append(record)
+
+        if not not_expired:
+            return
+
+        messages = [(loc, data) for _d, loc, data, _exp in not_expired]
+        d = self._peers[key].post_batch(messages)
+        args = (key, not_expired)
         d.addCallbacks(self._post_succeed, self._post_failed,
                        callbackArgs=args, errbackArgs=args)
         return d
 
-    def _post_succeed(self, response, key, _loc, _data, _exp, d):
-        d.callback(True)
-
-    def _post_failed(self, failure, key, loc, data, exp, d):
-        self.debug("failed to post message to %s, putting it in quarantine",
-                   self._key2url(key))
-        self._add_pending(key, loc, data, exp, d)
+    def _post_succeed(self, acks, key, records):
+        failed = []
+        for record, ack in zip(records, acks):
+            if isinstance(ack, Failure):
+                failed.append(record)
+            else:
+                record[0].callback(ack)
+        if failed:
+            self._post_failed(None, key, failed)
+
+    def _post_failed(self, _failure, key, records):
+        self.debug("failed to post %d message(s) to %s, putting them "
+                   "in quarantine", len(records), self._key2url(key))
+        for d, loc, data, exp in records:
+            self._add_pending(key, loc, data, exp, d)
         self._quarantined.add(key)
         self._schedule_retry(key)
 
@@ -243,9 +306,9 @@ class Tunnel(base.RangeServer):
 
     def _post_pendings(self, key, now=None):
         now = now if now is not None else time.time()
-        for d, loc, data, exp in self._pendings[key]:
-            self._post(key, loc, data, exp, now, d)
-        del self._pendings[key]
+        pendings = self._pendings.pop(key)
+        for index in xrange(0, len(pendings), self.batch_size):
+            self._post(key, pendings[index:index + self.batch_size], now)
 
     def _reset_retry(self, key):
         if key in self._delays:
@@ -281,6 +344,17 @@ class Tunnel(base.RangeServer):
                 callid.cancel()
         self._retries.clear()
 
+    def _cancel_flushes(self):
+        for callid in self._flushes.itervalues():
+            if callid.active():
+                callid.cancel()
+        self._flushes.clear()
+        # The queued messages wait for the next connection
+        for key, records in self._outbox.items():
+            for d, loc, data, exp in records:
+                self._add_pending(key, loc, data, exp, d)
+        self._outbox.clear()
+
     def _next_retry_delay(self, key):
         delay = self._delays.get(key, self.initial_delay)
 
@@ -326,6 +400,7 @@ class Peer(httpclient.Connection):
         self._key = key
         self._peer_version = None
         self._target_version = None
+        self._batching = False
         self._headers = {}
 
         self._headers["host"] = "%s:%d" % (host, port)
@@ -344,6 +419,30 @@ class Peer(httpclient.Connection):
         body = self._serialize(data)
         return self.request(http.Methods.POST, location, self._headers, body)
 
+    def post_batch(self, messages):
+        """Posts a list of (location, data) in a single request.
+        Fires with the list of the acknowledgements of the messages,
+        a failure instead of an acknowledgement means the message has
+        to be posted again, the same as if the whole request fails."""
+        if not self._batching:
+            # The server only knows about single messages,
+            # they are pipelined on the connection
+            defers = [self.post(location, data)
+                      for location, data in messages]
+            d = defer.DeferredList(defers, consumeErrors=True)
+            d.addCallback(self._check_responses)
+            return d
+
+        serializer = self._create_serializer()
+        body = "[%s]" % ",".join("[%s,%s]" % (json.dumps(location),
+                                              serializer.convert(data))
+                                 for location, data in messages)
+        headers = dict(self._headers)
+        headers["content-type"] = FEAT_BATCH_TYPE
+        d = self.request(http.Methods.POST, "/", headers, body)
+        d.addCallback(self._parse_acknowledgements, len(messages))
+        return d
+
     ### overridden ###
 
     def onClientConnectionFailed(self, reason):
@@ -370,6 +469,9 @@ class Peer(httpclient.Connection):
                 raise TunnelError("Unsupported server %r" % server_header)
             vser = server_ver[0]
 
+        accepted = response.headers.get("accept-post", "")
+        self._batching = FEAT_BATCH_TYPE in accepted
+
         vin = self._tunnel._version
         vout = vser if vser is not None and vser < vin else vin
         self._peer_version = vser
@@ -379,14 +481,29 @@ class Peer(httpclient.Connection):
 
         return response
 
+    def _check_responses(self, results):
+        return [response.status == http.Status.OK if success else response
+                for success, response in results]
+
+    def _parse_acknowledgements(self, response, count):
+        if response.status != http.Status.OK:
+            # The server refused the whole request
+            return [False] * count
+        acks = json.loads(response.body)
+        if not isinstance(acks, list) or len(acks) != count:
+            raise TunnelError("Invalid acknowledgements: %r" % (acks, ))
+        return [bool(ack) for ack in acks]
+
     def _serialize(self, data):
+        return self._create_serializer().convert(data)
+
+    def _create_serializer(self):
         vin = self._tunnel._version
         vtar = self._target_version
         vout = vtar if vtar is not None else vin
-        serializer = json.Serializer(indent=2, force_unicode=True,
-                                     source_ver=vin, target_ver=vout)
         self._headers["user-agent"] = http.compose_user_agent(FEAT_IDENT, vout)
-        return serializer.convert(data)
+        return feat_json.Serializer(indent=2, force_unicode=True,
+                                    source_ver=vin, target_ver=vout)
 
 
 class Request(httpserver.Request):
@@ -403,7 +520,7 @@ class Request(httpserver.Request):
         vout = self.channel.owner._version
 
         ctype = self.get_received_header("content-type")
-        if ctype != "application/json":
+        if ctype not in ("application/json", FEAT_BATCH_TYPE):
             self._error(http.Status.UNSUPPORTED_MEDIA_TYPE,
                         "Message content type not supported, "
                         "only application/json is.")
@@ -427,6 +544,7 @@ class Request(httpserver.Request):
             vin = vcli if vcli is not None and vcli < vout else vout
             server_header = http.compose_user_agent(FEAT_IDENT, vin)
             self.set_header("server", server_header)
+            self.set_header("accept-post", FEAT_BATCH_TYPE)
             self.set_length(0)
             self.finish()
             return
@@ -449,9 +567,15 @@ class Request(httpserver.Request):
             uri = http.compose(self.uri, host=host, port=port, scheme=scheme)
 
             vin = vcli if vcli is not None else vout
-            unserializer = json.Unserializer(registry=self._registry,
-                                             source_ver=vin, target_ver=vout)
             body = "".join(self._buffer)
+
+            if ctype == FEAT_BATCH_TYPE:
+                self._dispatch_batch(body, host, port, scheme, vin, vout)
+                return
+
+            unserializer = feat_json.Unserializer(registry=self._registry,
+                                                  source_ver=vin,
+                                                  target_ver=vout)
             try:
                 data = unserializer.convert(body)
             except Exception as e:
@@ -475,6 +599,39 @@ class Request(httpserver.Request):
         self.write("Method not allowed, only POST and HEAD.")
         self.finish()
 
+    def _dispatch_batch(self, body, host, port, scheme, vin, vout):
+        try:
+            messages = json.loads(body)
+        except ValueError as e:
+            error.handle_exception(self, e, "Error while parsing tunnel batch")
+            self._error(http.Status.BAD_REQUEST,
+                        "Invalid batch, parsing failed.")
+            return
+
+        unserializer = BatchUnserializer(registry=self._registry,
+                                         source_ver=vin, target_ver=vout)
+        acks = []
+        for location, snapshot in messages:
+            uri = http.compose(location, host=host, port=port, scheme=scheme)
+            try:
+                data = unserializer.convert(snapshot)
+            except Exception as e:
+                msg = "Error while unserializing tunnel message"
+                error.handle_exception(self, e, msg)
+                acks.append(False)
+                continue
+            self.channel.owner._dispatch(uri, data)
+            acks.append(True)
+
+        result = json.dumps(acks)
+        self.set_response_code(http.Status.OK)
+        server_header = http.compose_user_agent(FEAT_IDENT, vin)
+        self.set_header("server", server_header)
+        self.set_header("content-type", "application/json")
+        self.set_length(len(result))
+        self.write(result)
+        self.finish()
+
     def _error(self, status, message=None):
         if not self.writing:
             self.clear_headers()
@@ -487,5 +644,12 @@ class Request(httpserver.Request):
         self.finish()
 
 
+class BatchUnserializer(feat_json.Unserializer):
+    """Unserializes the messages of a batch, already parsed as a whole."""
+
+    def pre_convertion(self, data):
+        return data
+
+
 class RequestFactory(httpserver.RequestFactory):
     request_class = Request